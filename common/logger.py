@@ -1,47 +1,206 @@
+"""
+日志模块
+
+所有模块日志统一经由 QueueHandler 写入进程内队列，由后台 QueueListener 线程负责格式化并写入
+控制台和按模块划分的日志文件（log/<模块名>.log，每天轮转，保留7天），回测循环中的日志调用不再直接做磁盘/控制台I/O。
+
+日志级别可按模块配置（settings.LOG_LEVELS），也可运行时调用 set_log_level 修改。
+静默回测模式（quiet_backtest）下，回测循环中的高频日志（settings.LOG_HOT_LOGGERS）只按比例采样输出，
+其余聚合计数，退出时输出一条汇总；批量回测默认开启（settings.LOG_QUIET_BATCH）。
+静默状态按线程记录，只影响进入quiet_backtest的线程（日志过滤在调用日志的线程中执行）。
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
 import uuid
-from logging.handlers import TimedRotatingFileHandler
+from contextlib import contextmanager
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
+
+import settings
 from settings import log_root
-import logging
 
 # 在模块级别生成全局唯一ID
 RUN_UUID = str(uuid.uuid4())
 
-def create_log(name):
-    # 确保日志目录存在
-    log_root.mkdir(parents=True, exist_ok=True)
+_formatter = logging.Formatter(
+    f'%(asctime)s - {RUN_UUID} - %(name)s - %(levelname)s - %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+
+class _RoutingHandler(logging.Handler):
+    """
+    后台线程中的实际输出：控制台共用一个处理器，文件按logger名称分别写入（保持原有的每模块一个日志文件）
+    """
+
+    def __init__(self):
+        super().__init__(logging.NOTSET)
+        self.console_handler = logging.StreamHandler()
+        self.console_handler.setFormatter(_formatter)
+        self.file_handlers = {}
+
+    def _file_handler(self, name):
+        handler = self.file_handlers.get(name)
+        if handler is None:
+            log_root.mkdir(parents=True, exist_ok=True)
+            # 按日期轮转，保留7天日志
+            handler = TimedRotatingFileHandler(
+                filename=log_root / f'{name}.log',
+                when='midnight',  # 在每天午夜轮转
+                interval=1,  # 每天一个文件
+                backupCount=7,  # 保留7天的日志
+                encoding='utf-8'
+            )
+            handler.setFormatter(_formatter)
+            self.file_handlers[name] = handler
+        return handler
+
+    def emit(self, record):
+        self.console_handler.handle(record)
+        self._file_handler(record.name).handle(record)
+
+    def close(self):
+        self.console_handler.close()
+        for handler in self.file_handlers.values():
+            handler.close()
+        super().close()
+
+
+class _QuietFilter(logging.Filter):
+    """
+    静默回测模式下对高频logger的INFO及以下日志采样：每 LOG_QUIET_SAMPLE_EVERY 条放行1条，其余只计数；
+    只检查当前线程的静默状态
+    """
+
+    def filter(self, record):
+        state = getattr(_quiet, 'counts', None)
+        if state is None or record.levelno >= logging.WARNING or record.name not in _hot_loggers:
+            return True
+        count = state.get(record.name, 0) + 1
+        state[record.name] = count
+        every = settings.LOG_QUIET_SAMPLE_EVERY
+        return every <= 1 or count % every == 1
+
+
+class _State:
+    def __init__(self):
+        self.queue = queue.Queue(-1)
+        self.listener = None
+
+
+_lock = threading.RLock()
+_state = _State()
+# 当前线程的静默状态：counts在静默模式下为 {logger名称: 日志条数}，depth为quiet_backtest的嵌套层数
+_quiet = threading.local()
+_queue_handlers = []
+_hot_loggers = frozenset(getattr(settings, 'LOG_HOT_LOGGERS', ()))
+_quiet_filter = _QuietFilter()
+
 
-    # 创建logger对象
+def _ensure_listener():
+    if _state.listener is None:
+        with _lock:
+            if _state.listener is None:
+                _state.listener = QueueListener(_state.queue, _RoutingHandler())
+                _state.listener.start()
+
+
+def _level_for(name):
+    levels = getattr(settings, 'LOG_LEVELS', {})
+    return levels.get(name, levels.get('default', 'INFO'))
+
+
+def create_log(name):
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
+    logger.setLevel(_level_for(name))
+    logger.propagate = False
 
     # 清除已有的处理器
     if logger.handlers:
-        for handler in logger.handlers:
-            handler.close()
+        with _lock:
+            for handler in logger.handlers:
+                handler.close()
+                if handler in _queue_handlers:
+                    _queue_handlers.remove(handler)
         logger.handlers.clear()
 
-    # 创建格式化器
-    formatter = logging.Formatter(
-        f'%(asctime)s - {RUN_UUID} - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-
-    # 创建控制台处理器
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # 创建文件处理器 - 按日期轮转，保留7天日志
-    log_file = log_root / f'{name}.log'
-    file_handler = TimedRotatingFileHandler(
-        filename=log_file,
-        when='midnight',  # 在每天午夜轮转
-        interval=1,  # 每天一个文件
-        backupCount=7,  # 保留7天的日志
-        encoding='utf-8'
-    )
-    file_handler.setLevel(logging.INFO)
-    file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
-    return logger
\ No newline at end of file
+    # 日志调用方只负责入队，格式化与I/O由后台监听线程完成
+    handler = QueueHandler(_state.queue)
+    handler.addFilter(_quiet_filter)
+    logger.addHandler(handler)
+    with _lock:
+        _queue_handlers.append(handler)
+    _ensure_listener()
+    return logger
+
+
+def set_log_level(name, level):
+    """运行时修改指定模块的日志级别，如 set_log_level('trade_strategy_volume', 'WARNING')"""
+    logging.getLogger(name).setLevel(level)
+
+
+def flush_logs():
+    """等待队列中的日志全部写出（进程退出前或测试中使用）"""
+    with _lock:
+        listener = _state.listener
+        if listener is not None:
+            listener.stop()
+            _state.listener = None
+    _ensure_listener()
+
+
+@contextmanager
+def quiet_backtest(enabled=True):
+    """
+    静默回测模式：代码块内当前线程中高频logger的INFO日志只采样输出，退出时输出被聚合的日志条数
+
+    用法:
+        with quiet_backtest():
+            for csv_path in csv_paths:
+                run_backtest_enhanced_volume_strategy(csv_path, ...)
+    """
+    if not enabled:
+        yield
+        return
+    _quiet.depth = getattr(_quiet, 'depth', 0) + 1
+    if _quiet.depth == 1:
+        _quiet.counts = {}
+    try:
+        yield
+    finally:
+        _quiet.depth -= 1
+        counts = _quiet.counts if _quiet.depth == 0 else None
+        if counts is not None:
+            _quiet.counts = None
+        if counts:
+            detail = ', '.join(f"{name}={count}" for name, count in sorted(counts.items()))
+            logger.info(f"静默回测模式：高频日志按1/{settings.LOG_QUIET_SAMPLE_EVERY}采样输出，"
+                        f"共产生 {sum(counts.values())} 条（{detail}）")
+
+
+def _after_fork_in_child():
+    global _quiet
+    # 子进程中没有父进程的后台线程，且队列锁可能处于被持有状态，需重新创建队列并重启监听线程
+    _state.queue = queue.Queue(-1)
+    _state.listener = None
+    # 静默模式的计数与汇总由父进程负责，子进程从非静默状态开始
+    _quiet = threading.local()
+    for handler in _queue_handlers:
+        handler.queue = _state.queue
+    _ensure_listener()
+
+
+def _stop_listener():
+    listener = _state.listener
+    if listener is not None:
+        listener.stop()
+        _state.listener = None
+
+
+logger = create_log("logger")
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(_stop_listener)
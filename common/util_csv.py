@@ -49,6 +49,36 @@ def read_data(csv_path):
     )
     return df
 
+def load_signal_data(csv_path, signal_types=None, start_date=None, end_date=None):
+    """
+    读取信号数据，date列解析为datetime类型，并在读取后立即按信号类型/日期范围过滤
+
+    参数:
+        csv_path: 信号数据CSV文件路径
+        signal_types: 信号类型集合（可选）
+        start_date: 起始日期，pd.Timestamp（可选，包含）
+        end_date: 结束日期，pd.Timestamp（可选，包含）
+
+    返回:
+        过滤后的DataFrame
+    """
+    df = pd.read_csv(
+        csv_path,
+        parse_dates=['date'],  # 解析date列为datetime类型，只解析一次
+    )
+    mask = None
+    if signal_types:
+        mask = df['signal_type'].isin(signal_types)
+    if start_date is not None:
+        cond = df['date'] >= start_date
+        mask = cond if mask is None else mask & cond
+    if end_date is not None:
+        cond = df['date'] <= end_date
+        mask = cond if mask is None else mask & cond
+    if mask is not None:
+        df = df[mask]
+    return df
+
 def combine_data(data_list, ignore_index=True):
     combined_df = pd.concat(data_list, ignore_index=ignore_index)
     return combined_df
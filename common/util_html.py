@@ -1,7 +1,7 @@
 from common.logger import create_log
+import copy
 import datetime
-from weasyprint import HTML
-from weasyprint.css import CSS
+import settings
 import os
 from bs4 import BeautifulSoup
 
@@ -304,124 +304,185 @@ def save_clean_html(html_content, task_id):
 
 
 
-def html_to_pdf(html_content, output_pdf_path):
+# html_to_pdf使用的固定样式：背景宽度≥表格最小宽度，同步滚动，精确控制边距
+_PDF_CSS = """
+    /* 1. 全局重置：确保无默认边距和填充 */
+    * {
+        margin: 0 !important;
+        padding: 0 !important;
+        box-sizing: border-box;
+    }
+
+    html, body {
+        width: 100%;
+        background-color: #2a2a2a;
+        font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
+        overflow-x: hidden;
+    }
+
+    /* 2. 背景容器：完全填充页面，无偏移 */
+    .bg-wrapper {
+        width: 100%;
+        min-width: 600px;
+        background-color: #2a2a2a;
+        margin: 0 !important;
+        padding: 0 !important;
+    }
+
+    /* 3. 内容容器：精确控制内边距，避免偏移 */
+    .content-wrapper {
+        width: 100%;
+        padding: 15px !important;
+        box-sizing: border-box;
+        color: #e0e0e0;
+        margin: 0 !important;
+    }
+
+    /* 4. 表格滚动容器：确保无额外边距 */
+    .table-wrapper {
+        width: 100%;
+        overflow-x: auto;
+        margin: 15px 0 !important;
+        padding: 0 !important;
+    }
+
+    /* 5. 表格：精确控制宽度和边距 */
+    table {
+        min-width: 600px;
+        width: 100%;  /* 改为100%以完全填充容器 */
+        border-collapse: collapse;
+        word-wrap: break-word;
+        margin: 0 !important;
+        padding: 0 !important;
+    }
+
+    /* 6. 列宽精确控制 */
+    th:nth-child(1), td:nth-child(1) { width: 13%; }
+    th:nth-child(2), td:nth-child(2) { width: 13%; }
+    th:nth-child(3), td:nth-child(3) { width: 8%; }
+    th:nth-child(4), td:nth-child(4) { width: 32%; }
+    th:nth-child(5), td:nth-child(5) { width: 10%; }
+    th:nth-child(6), td:nth-child(6) { width: 24%; }
+
+    /* 其他样式调整 */
+    h1, h2, h3 {
+        text-align: center;
+        margin: 18px 0 !important;
+        color: #fff;
+        font-size: 1.4rem;
+    }
+
+    .stats-container {
+        display: flex;
+        flex-wrap: wrap;
+        gap: 10px;
+        justify-content: center;
+        margin: 20px 0 !important;
+        padding: 0 !important;
+    }
+
+    .stat-box {
+        min-width: 45%;
+        text-align: center;
+        padding: 10px !important;
+        background: #3a3a3a;
+        border-radius: 8px;
+        margin: 0 !important;
+    }
+
+    .stat-value {
+        font-size: 1.5rem;
+        font-weight: bold;
+        color: #fff;
+    }
+
+    th, td {
+        border: 1px solid #888;
+        padding: 8px 6px !important;
+        font-size: 13px;
+        text-align: left;
+        vertical-align: middle;
+    }
+
+    th {
+        background-color: #4a4a4a;
+        color: #fff;
+    }
+
+    /* 确保没有默认边距和缩进 */
+    tbody, thead, tr {
+        margin: 0 !important;
+        padding: 0 !important;
+    }
+
+    /* 超长表格分段后的提示 */
+    .table-note {
+        color: #999;
+        font-size: 12px;
+        margin: 8px 0 !important;
+    }
+"""
+
+_fixed_css = None
+
+
+def get_fixed_css():
+    """解析后的PDF固定样式，每个进程只解析一次"""
+    global _fixed_css
+    if _fixed_css is None:
+        # weasyprint导入较慢且依赖系统库，只在生成PDF时导入
+        from weasyprint.css import CSS
+        _fixed_css = CSS(string=_PDF_CSS)
+    return _fixed_css
+
+
+def _paginate_tables(soup, container, max_rows, page_rows):
+    """
+    限制超大表格的行数并分段：超过max_rows的行丢弃并附加说明，其余行每page_rows行拆成一个表格（各自带表头），
+    避免WeasyPrint对上万行的单个表格整体排版时耗时和内存过高
+    """
+    for table in container.find_all('table'):
+        tbody = table.find('tbody')
+        if tbody is None:
+            continue
+        rows = tbody.find_all('tr', recursive=False)
+        total = len(rows)
+        if max_rows and total > max_rows:
+            for row in rows[max_rows:]:
+                row.decompose()
+            rows = rows[:max_rows]
+            note = soup.new_tag('p', attrs={'class': 'table-note'})
+            note.string = f"共 {total} 行，PDF中仅显示前 {max_rows} 行，完整数据请在页面中查看"
+            table.insert_after(note)
+        if not page_rows or len(rows) <= page_rows:
+            continue
+        thead = table.find('thead')
+        anchor = table
+        for start in range(page_rows, len(rows), page_rows):
+            part = soup.new_tag('table', attrs=table.attrs)
+            if thead is not None:
+                part.append(copy.copy(thead))
+            part_body = soup.new_tag('tbody')
+            for row in rows[start:start + page_rows]:
+                part_body.append(row.extract())
+            part.append(part_body)
+            anchor.insert_after(part)
+            anchor = part
+
+
+def html_to_pdf(html_content, output_pdf_path, max_rows=None, page_rows=None):
     """
     背景加宽适配表格！同步滚动无错位，视觉100%对齐
+    定时任务等后台场景请使用 common.util_pdf.pdf_renderer（独立渲染进程、按内容缓存）
     :param html_content: 输入HTML内容字符串
     :param output_pdf_path: 输出PDF路径
+    :param max_rows: 单个表格最多保留的行数，默认settings.PDF_TABLE_MAX_ROWS
+    :param page_rows: 超长表格每段的行数，默认settings.PDF_TABLE_PAGE_ROWS
     """
+    max_rows = settings.PDF_TABLE_MAX_ROWS if max_rows is None else max_rows
+    page_rows = settings.PDF_TABLE_PAGE_ROWS if page_rows is None else page_rows
     try:
-        # 核心调整：背景宽度≥表格最小宽度，同步滚动，精确控制边距
-        fixed_css = CSS(string="""
-            /* 1. 全局重置：确保无默认边距和填充 */
-            * {
-                margin: 0 !important;
-                padding: 0 !important;
-                box-sizing: border-box;
-            }
-
-            html, body {
-                width: 100%;
-                background-color: #2a2a2a;
-                font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-                overflow-x: hidden;
-            }
-
-            /* 2. 背景容器：完全填充页面，无偏移 */
-            .bg-wrapper {
-                width: 100%;
-                min-width: 600px;
-                background-color: #2a2a2a;
-                margin: 0 !important;
-                padding: 0 !important;
-            }
-
-            /* 3. 内容容器：精确控制内边距，避免偏移 */
-            .content-wrapper {
-                width: 100%;
-                padding: 15px !important;
-                box-sizing: border-box;
-                color: #e0e0e0;
-                margin: 0 !important;
-            }
-
-            /* 4. 表格滚动容器：确保无额外边距 */
-            .table-wrapper {
-                width: 100%;
-                overflow-x: auto;
-                margin: 15px 0 !important;
-                padding: 0 !important;
-            }
-
-            /* 5. 表格：精确控制宽度和边距 */
-            table {
-                min-width: 600px;
-                width: 100%;  /* 改为100%以完全填充容器 */
-                border-collapse: collapse;
-                word-wrap: break-word;
-                margin: 0 !important;
-                padding: 0 !important;
-            }
-
-            /* 6. 列宽精确控制 */
-            th:nth-child(1), td:nth-child(1) { width: 13%; }
-            th:nth-child(2), td:nth-child(2) { width: 13%; }
-            th:nth-child(3), td:nth-child(3) { width: 8%; }
-            th:nth-child(4), td:nth-child(4) { width: 32%; }
-            th:nth-child(5), td:nth-child(5) { width: 10%; }
-            th:nth-child(6), td:nth-child(6) { width: 24%; }
-
-            /* 其他样式调整 */
-            h1, h2, h3 {
-                text-align: center;
-                margin: 18px 0 !important;
-                color: #fff;
-                font-size: 1.4rem;
-            }
-
-            .stats-container {
-                display: flex;
-                flex-wrap: wrap;
-                gap: 10px;
-                justify-content: center;
-                margin: 20px 0 !important;
-                padding: 0 !important;
-            }
-
-            .stat-box {
-                min-width: 45%;
-                text-align: center;
-                padding: 10px !important;
-                background: #3a3a3a;
-                border-radius: 8px;
-                margin: 0 !important;
-            }
-
-            .stat-value {
-                font-size: 1.5rem;
-                font-weight: bold;
-                color: #fff;
-            }
-
-            th, td {
-                border: 1px solid #888;
-                padding: 8px 6px !important;
-                font-size: 13px;
-                text-align: left;
-                vertical-align: middle;
-            }
-
-            th {
-                background-color: #4a4a4a;
-                color: #fff;
-            }
-
-            /* 确保没有默认边距和缩进 */
-            tbody, thead, tr {
-                margin: 0 !important;
-                padding: 0 !important;
-            }
-        """)
+        fixed_css = get_fixed_css()
 
         # 重构结构：给所有内容套「加宽背景容器」
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -447,7 +508,10 @@ def html_to_pdf(html_content, output_pdf_path):
             table_wrapper = soup.new_tag('div', attrs={'class': 'table-wrapper'})
             table.wrap(table_wrapper)
 
-        # 6. 替换原body
+        # 6. 超大表格限制行数并分段
+        _paginate_tables(soup, content_wrapper, max_rows, page_rows)
+
+        # 7. 替换原body
         soup.body.replace_with(new_body)
 
         # 转换为字符串
@@ -455,6 +519,7 @@ def html_to_pdf(html_content, output_pdf_path):
 
         # 转换PDF：使用更精确的页面设置
         # 由于直接使用内容而非文件路径，base_url设置为当前目录
+        from weasyprint import HTML
         html_obj = HTML(string=modified_html, base_url=os.getcwd())
         html_obj.write_pdf(
             output_pdf_path,
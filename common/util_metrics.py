@@ -0,0 +1,428 @@
+"""
+进程内指标注册表，以Prometheus文本格式输出（/metrics）
+
+支持 Counter / Gauge / Histogram 三种指标，均可带标签。
+生产环境Web由多个gunicorn进程提供服务、回测在独立工作进程中执行，各进程的指标会定期写入
+settings.metrics_dir/<pid>.json 快照（进程退出时再写入一次），/metrics 渲染时汇总所有存活进程的快照，输出整个服务的指标。
+已退出进程的Counter/Histogram快照累加到 totals.json 后删除，汇总值不会因进程退出而减少；Gauge只反映存活进程。
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+import settings
+from common.logger import create_log
+from common.util_process import pid_alive, file_lock
+
+logger = create_log("util_metrics")
+
+# 默认直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 回测/数据获取等较慢操作的分桶（秒）
+SLOW_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# 进程快照写入间隔（秒）
+SNAPSHOT_INTERVAL = 5.0
+# 已退出进程累计值的快照文件名（与<pid>.json位于同一目录）及其文件锁
+TOTALS_FILE = 'totals.json'
+_TOTALS_LOCK_FILE = 'totals.lock'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.extend(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value if not isinstance(value, list) else list(value)]
+                    for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    type_name = 'counter'
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        self.registry.maybe_flush()
+
+
+class Gauge(_Metric):
+    """可增可减的瞬时值"""
+    type_name = 'gauge'
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        self.registry.maybe_flush()
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+        self.registry.maybe_flush()
+
+
+class Histogram(_Metric):
+    """
+    直方图，值为 [各分桶计数..., +Inf计数, 总和]
+    """
+    type_name = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            values[index] += 1
+            values[-1] += value
+        self.registry.maybe_flush()
+
+    def time(self, **labels):
+        """上下文管理器：记录代码块耗时"""
+        return _Timer(self, labels)
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    """
+
+    def __init__(self, snapshot_dir=None):
+        self.snapshot_dir = str(snapshot_dir or settings.metrics_dir)
+        self._metrics = {}
+        self._collectors = []
+        self._last_flush = 0.0
+        self._flush_lock = threading.Lock()
+
+    def reset(self):
+        """清空本进程的指标值（fork出的子进程不应继承父进程的计数）"""
+        for metric in self._metrics.values():
+            metric._lock = threading.Lock()
+            metric._values = {}
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            return self._metrics[metric.name]
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """
+        注册渲染时调用的采集函数，返回 [(name, type, help, [(labels_dict, value), ...]), ...]
+        用于从共享存储（如回测任务库）中实时计算的指标
+        """
+        self._collectors.append(collector)
+
+    # ---------- 多进程快照 ----------
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.snapshot_dir, f"{pid}.json")
+
+    def flush(self):
+        """将本进程指标写入快照文件"""
+        data = {name: metric.snapshot() for name, metric in self._metrics.items()}
+        try:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+            path = self._snapshot_path(os.getpid())
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"写入指标快照失败: {str(e)}")
+
+    def maybe_flush(self):
+        now = time.time()
+        if now - self._last_flush < SNAPSHOT_INTERVAL:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = now
+            self.flush()
+        finally:
+            self._flush_lock.release()
+
+    def _load_snapshots(self):
+        """读取其他存活进程的快照与已退出进程的累计值，已退出进程的快照先累加到累计值"""
+        snapshots = []
+        if not os.path.isdir(self.snapshot_dir):
+            return snapshots
+        dead = []
+        for file_name in os.listdir(self.snapshot_dir):
+            if not file_name.endswith('.json'):
+                continue
+            pid = file_name[:-len('.json')]
+            if not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            path = os.path.join(self.snapshot_dir, file_name)
+            if not pid_alive(int(pid)):
+                dead.append(path)
+                continue
+            snapshot = _read_json(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        if dead:
+            self._fold_totals(dead)
+        totals = _read_json(os.path.join(self.snapshot_dir, TOTALS_FILE))
+        if totals:
+            snapshots.append(totals)
+        return snapshots
+
+    def _fold_totals(self, paths):
+        """将已退出进程的快照累加到totals.json并删除快照（文件锁保证多个进程同时汇总时每个快照只累加一次）"""
+        totals_path = os.path.join(self.snapshot_dir, TOTALS_FILE)
+        with file_lock(os.path.join(self.snapshot_dir, _TOTALS_LOCK_FILE)):
+            try:
+                totals = {name: {tuple(key): value for key, value in series}
+                          for name, series in (_read_json(totals_path) or {}).items()}
+                folded = []
+                for path in paths:
+                    # 其他进程已累加并删除时为None
+                    snapshot = _read_json(path)
+                    if snapshot is None:
+                        continue
+                    for name, series in snapshot.items():
+                        metric = self._metrics.get(name)
+                        # 进程退出后其Gauge（如正在处理的请求数）不再有意义
+                        if metric is None or metric.type_name == 'gauge':
+                            continue
+                        _merge_series(totals.setdefault(name, {}), series)
+                    folded.append(path)
+                if not folded:
+                    return
+                tmp_path = f"{totals_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({name: [[list(key), value] for key, value in series.items()]
+                               for name, series in totals.items()}, f)
+                os.replace(tmp_path, totals_path)
+                for path in folded:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+            except OSError as e:
+                logger.warning(f"累加已退出进程的指标快照失败: {str(e)}")
+
+    # ---------- 输出 ----------
+
+    def render(self):
+        """
+        汇总所有进程的指标，输出Prometheus文本格式
+
+        返回:
+            str
+        """
+        merged = {name: {tuple(key): value for key, value in metric.snapshot()}
+                  for name, metric in self._metrics.items()}
+        for snapshot in self._load_snapshots():
+            for name, series in snapshot.items():
+                if name in merged:
+                    _merge_series(merged[name], series)
+
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.type_name}")
+            for key, value in sorted(merged[name].items()):
+                if metric.type_name == 'histogram':
+                    cumulative = 0.0
+                    for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                        cumulative += count
+                        labels = _format_labels(metric.labelnames, key, [('le', _format_value(bound))])
+                        lines.append(f"{name}_bucket{labels} {_format_value(cumulative)}")
+                    labels = _format_labels(metric.labelnames, key)
+                    lines.append(f"{name}_sum{labels} {_format_value(value[-1])}")
+                    lines.append(f"{name}_count{labels} {_format_value(cumulative)}")
+                else:
+                    lines.append(f"{name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.warning(f"指标采集失败: {str(e)}")
+                continue
+            for name, type_name, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {type_name}")
+                for labels, value in samples:
+                    label_text = _format_labels(list(labels), list(labels.values()))
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _read_json(path):
+    """读取快照文件，不存在或内容不完整时返回None"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge_series(target, series):
+    """将快照中的 [(标签值, 值), ...] 累加到 {标签值元组: 值}（直方图的值为各分桶计数与总和的列表）"""
+    for key, value in series:
+        key = tuple(key)
+        if isinstance(value, list):
+            current = target.get(key)
+            target[key] = value if current is None else [a + b for a, b in zip(current, value)]
+        else:
+            target[key] = target.get(key, 0.0) + value
+
+
+# 全局指标注册表
+metrics_registry = MetricsRegistry()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=metrics_registry.reset)
+# 进程退出前写入最后一次快照，两次定期写入之间的更新不会丢失
+atexit.register(metrics_registry.flush)
+
+# HTTP请求
+http_request_duration = metrics_registry.histogram(
+    'quant_http_request_duration_seconds', 'HTTP请求处理耗时', ('route', 'method'))
+http_requests_total = metrics_registry.counter(
+    'quant_http_requests_total', 'HTTP请求数', ('route', 'method', 'status'))
+http_request_errors = metrics_registry.counter(
+    'quant_http_request_errors_total', 'HTTP请求错误数（5xx或未捕获异常）', ('route', 'method'))
+http_requests_in_flight = metrics_registry.gauge(
+    'quant_http_requests_in_flight', '正在处理的HTTP请求数', ('route',))
+
+# 回测任务
+backtest_job_duration = metrics_registry.histogram(
+    'quant_backtest_job_duration_seconds', '回测任务执行耗时', ('job_type', 'status'), SLOW_BUCKETS)
+backtest_phase_duration = metrics_registry.histogram(
+    'quant_backtest_phase_duration_seconds', '单只股票回测各阶段耗时（含plot.*子阶段）', ('phase',))
+
+# 数据获取
+data_fetch_duration = metrics_registry.histogram(
+    'quant_data_fetch_duration_seconds', '行情数据获取耗时', ('source',), SLOW_BUCKETS)
+data_fetch_errors = metrics_registry.counter(
+    'quant_data_fetch_errors_total', '行情数据获取失败次数', ('source',))
+
+# 插件模块首次导入耗时
+plugin_import_seconds = metrics_registry.gauge(
+    'quant_plugin_import_seconds', '策略/指标插件模块首次导入耗时', ('kind', 'module'))
+
+# 缓存命中
+cache_requests = metrics_registry.counter(
+    'quant_cache_requests_total', '缓存访问次数', ('cache', 'result'))
+
+
+def record_cache(cache, hit):
+    """记录一次缓存访问（hit为True表示命中）"""
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _cache_hit_ratio():
+    """根据缓存访问计数计算各缓存命中率（已汇总各进程）"""
+    totals = {}
+    merged = {tuple(key): value for key, value in cache_requests.snapshot()}
+    for snapshot in metrics_registry._load_snapshots():
+        for key, value in snapshot.get(cache_requests.name, []):
+            merged[tuple(key)] = merged.get(tuple(key), 0.0) + value
+    for (cache, result), value in merged.items():
+        hits, total = totals.get(cache, (0.0, 0.0))
+        totals[cache] = (hits + (value if result == 'hit' else 0.0), total + value)
+    samples = [({'cache': cache}, hits / total) for cache, (hits, total) in sorted(totals.items()) if total]
+    return [('quant_cache_hit_ratio', 'gauge', '缓存命中率', samples)]
+
+
+metrics_registry.add_collector(_cache_hit_ratio)
+
+
+def observe_fetch(source):
+    """
+    数据获取函数装饰器：记录耗时，返回(False, ...)或抛出异常时计为失败
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            failed = True
+            try:
+                result = func(*args, **kwargs)
+                failed = result is False or (isinstance(result, tuple) and bool(result) and result[0] is False)
+                return result
+            finally:
+                data_fetch_duration.observe(time.perf_counter() - start, source=source)
+                if failed:
+                    data_fetch_errors.inc(source=source)
+        return wrapper
+    return decorator
@@ -0,0 +1,190 @@
+"""
+后台PDF渲染服务
+
+WeasyPrint渲染大型信号表需要数秒并占用大量内存，且在调用线程内渲染会长时间持有GIL、阻塞调度进程中的其他任务。
+渲染任务通过队列提交给独立的渲染进程（进程启动时预先解析固定样式，之后每个任务复用），
+渲染结果按HTML内容与渲染设置（表格行数限制、分段行数、固定样式）的哈希缓存在settings.pdf_cache_root，
+相同内容的报告直接复制缓存的PDF；
+同一内容正在渲染时，重复提交的任务等待同一结果。超大表格的行数限制与分段见 util_html.html_to_pdf。
+"""
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import settings
+from common.logger import create_log
+from common.util_metrics import record_cache
+from common.util_process import pool_context
+
+logger = create_log("util_pdf")
+
+
+def _init_worker():
+    """渲染进程初始化：预先导入WeasyPrint并解析固定样式"""
+    from common.util_html import get_fixed_css
+    get_fixed_css()
+
+
+def _render(html_content, pdf_path):
+    """在渲染进程中执行：先写入临时文件，成功后再替换，避免缓存中出现不完整的PDF"""
+    from common.util_html import html_to_pdf
+    tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+    try:
+        if not html_to_pdf(html_content, tmp_path):
+            return False
+        os.replace(tmp_path, pdf_path)
+        return True
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class PdfRenderer:
+    """
+    用法:
+        future = pdf_renderer.submit(html_content, pdf_path)   # 不等待渲染完成
+        success = pdf_renderer.render(html_content, pdf_path)  # 等待渲染完成
+    """
+
+    def __init__(self, workers=None, cache_root=None):
+        self.workers = settings.PDF_RENDER_WORKERS if workers is None else workers
+        self.cache_root = str(cache_root or settings.pdf_cache_root)
+        self._pool = None
+        self._inflight = {}  # 内容哈希 -> Future
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(),
+                                                 initializer=_init_worker)
+            return self._pool
+
+    def cache_path(self, html_content):
+        # 渲染设置变化后不能复用按旧设置生成的PDF
+        from common.util_html import _PDF_CSS
+        options = f"{settings.PDF_TABLE_MAX_ROWS}:{settings.PDF_TABLE_PAGE_ROWS}:{_PDF_CSS}"
+        digest = hashlib.sha256(options.encode('utf-8'))
+        digest.update(html_content.encode('utf-8'))
+        key = digest.hexdigest()[:32]
+        return key, os.path.join(self.cache_root, f"{key}.pdf")
+
+    def submit(self, html_content, output_pdf_path):
+        """
+        提交渲染任务
+
+        返回:
+            Future: 结果为是否成功生成output_pdf_path
+        """
+        key, cache_path = self.cache_path(html_content)
+        result = Future()
+        if os.path.exists(cache_path):
+            record_cache('pdf_render', True)
+            result.set_result(self._copy(cache_path, output_pdf_path))
+            return result
+
+        with self._lock:
+            render_future = self._inflight.get(key)
+            owner = render_future is None
+            if owner:
+                render_future = self._inflight[key] = Future()
+        record_cache('pdf_render', not owner)
+
+        def done(future):
+            try:
+                success = future.result()
+            except Exception as e:
+                logger.error(f"PDF渲染失败: {output_pdf_path}, {str(e)}")
+                success = False
+            result.set_result(success and self._copy(cache_path, output_pdf_path))
+
+        render_future.add_done_callback(done)
+        if owner:
+            self._start(key, html_content, cache_path, render_future)
+        return result
+
+    def render(self, html_content, output_pdf_path, timeout=None):
+        """渲染并等待完成（最长timeout秒，默认settings.PDF_RENDER_TIMEOUT），返回是否成功"""
+        timeout = settings.PDF_RENDER_TIMEOUT if timeout is None else timeout
+        try:
+            return self.submit(html_content, output_pdf_path).result(timeout=timeout)
+        except FutureTimeoutError:
+            logger.error(f"PDF渲染超时（{timeout}秒）: {output_pdf_path}")
+            return False
+
+    def _start(self, key, html_content, cache_path, render_future):
+        os.makedirs(self.cache_root, exist_ok=True)
+
+        def finish(future):
+            with self._lock:
+                self._inflight.pop(key, None)
+            try:
+                success = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    # 渲染进程异常退出（如被OOM杀死），下一次提交时重建进程池
+                    with self._lock:
+                        self._pool = None
+                render_future.set_exception(e)
+                return
+            if success:
+                self._evict()
+            render_future.set_result(success)
+
+        if self.workers <= 0:
+            _init_worker()
+            inline = Future()
+            try:
+                inline.set_result(_render(html_content, cache_path))
+            except Exception as e:
+                inline.set_exception(e)
+            finish(inline)
+            return
+        try:
+            self._executor().submit(_render, html_content, cache_path).add_done_callback(finish)
+        except Exception as e:
+            with self._lock:
+                self._pool = None
+            failed = Future()
+            failed.set_exception(e)
+            finish(failed)
+
+    @staticmethod
+    def _copy(cache_path, output_pdf_path):
+        if os.path.abspath(cache_path) == os.path.abspath(output_pdf_path):
+            return True
+        try:
+            folder = os.path.dirname(os.path.abspath(output_pdf_path))
+            os.makedirs(folder, exist_ok=True)
+            shutil.copyfile(cache_path, output_pdf_path)
+            return True
+        except OSError as e:
+            logger.error(f"复制PDF失败: {output_pdf_path}, {str(e)}")
+            return False
+
+    def _evict(self):
+        """缓存文件超过上限时删除最早生成的文件"""
+        try:
+            entries = [entry for entry in os.scandir(self.cache_root) if entry.name.endswith('.pdf')]
+        except OSError:
+            return
+        excess = len(entries) - settings.PDF_CACHE_MAX_FILES
+        if excess <= 0:
+            return
+        for entry in sorted(entries, key=lambda e: e.stat().st_mtime)[:excess]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+pdf_renderer = PdfRenderer()
@@ -0,0 +1,89 @@
+"""
+进程相关的公共函数：进程池的启动方式、进程存活探测、跨进程文件锁
+
+调度进程与Web进程中同时运行多个线程（任务线程、日志监听、通知发送等），fork时其他线程持有的锁
+（日志队列、SQLite连接等）会以被持有的状态复制到子进程，子进程可能因此死锁。
+进程池统一使用settings.PROCESS_POOL_START_METHOD（默认forkserver）启动工作进程，平台不支持时使用spawn；
+工作进程不继承父进程的模块，需要的模块在进程池的initializer中预先导入。
+
+任务队列、通知队列按 "主机名:pid" 记录领取者，指标按pid保存快照，均通过pid_alive判断领取/写入的进程是否已退出。
+"""
+import multiprocessing
+import os
+from contextlib import contextmanager
+
+import settings
+
+
+def pool_context():
+    """
+    返回创建进程池使用的multiprocessing上下文
+
+    用法:
+        ProcessPoolExecutor(max_workers=4, mp_context=pool_context(), initializer=_init_worker)
+    """
+    method = settings.PROCESS_POOL_START_METHOD
+    if method not in multiprocessing.get_all_start_methods():
+        method = 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def pid_alive(pid):
+    """
+    本机上的进程是否仍在运行
+
+    POSIX使用os.kill(pid, 0)探测（无权限向其发送信号的进程视为存活）；
+    Windows下os.kill会结束目标进程，改为查询进程的退出码
+    """
+    if os.name == 'nt':
+        import ctypes
+        kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            # ERROR_ACCESS_DENIED：进程存在但无权查询
+            return ctypes.get_last_error() == 5
+        try:
+            exit_code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+                return True
+            # STILL_ACTIVE
+            return exit_code.value == 259
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+@contextmanager
+def file_lock(lock_path):
+    """
+    跨进程互斥的文件锁（阻塞等待），代码块结束或进程退出时释放
+
+    用法:
+        with file_lock(os.path.join(folder, 'totals.lock')):
+            ...
+    """
+    with open(lock_path, 'a+') as f:
+        if os.name == 'nt':
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == 'nt':
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,92 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+from contextlib import contextmanager
+
+from common.logger import create_log
+
+logger = create_log("util_profile")
+
+
+class PhaseTimer:
+    """
+    分阶段计时器（计圈方式）：每个阶段结束时调用 lap(阶段名)，记录距上一次计圈的耗时
+
+    用法:
+        timer = PhaseTimer()
+        load()
+        timer.lap('csv_load')
+        run()
+        timer.lap('cerebro_run')
+        timer.as_dict()  # {'csv_load': 0.12, 'cerebro_run': 1.53, 'total': 1.65}
+
+    子阶段可用 child(前缀) 记录到同一结果中，如 plot.holdings
+    """
+
+    def __init__(self, prefix='', phases=None):
+        self.prefix = prefix
+        self.phases = phases if phases is not None else {}
+        self.start_time = time.perf_counter()
+        self._last = self.start_time
+
+    def lap(self, name):
+        """记录一个阶段的耗时（秒），返回该耗时"""
+        now = time.perf_counter()
+        elapsed = now - self._last
+        key = f"{self.prefix}{name}"
+        self.phases[key] = self.phases.get(key, 0.0) + elapsed
+        self._last = now
+        return elapsed
+
+    def skip(self):
+        """丢弃自上一次计圈以来的时间（不计入任何阶段）"""
+        self._last = time.perf_counter()
+
+    def child(self, prefix):
+        """创建记录到同一结果中的子阶段计时器"""
+        return PhaseTimer(prefix=f"{self.prefix}{prefix}.", phases=self.phases)
+
+    def total(self):
+        return time.perf_counter() - self.start_time
+
+    def as_dict(self, digits=4):
+        result = {name: round(seconds, digits) for name, seconds in self.phases.items()}
+        result['total'] = round(self.total(), digits)
+        return result
+
+    def summary(self):
+        """单行文本摘要，用于日志"""
+        return ' | '.join(f"{name}={seconds:.3f}s" for name, seconds in self.as_dict().items())
+
+
+@contextmanager
+def profile_to_file(profile_path, enabled=True, top=40):
+    """
+    使用cProfile分析代码块，保存 .prof 文件（可用 snakeviz / pstats 查看）及按累计耗时排序的文本摘要 .prof.txt
+
+    参数:
+        profile_path: .prof 输出路径
+        enabled: 为False时不做任何处理
+        top: 文本摘要中输出的函数数量
+    """
+    if not enabled:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(os.path.dirname(str(profile_path)), exist_ok=True)
+            profiler.dump_stats(str(profile_path))
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+            with open(f"{profile_path}.txt", 'w', encoding='utf-8') as f:
+                f.write(stream.getvalue())
+            logger.info(f"性能分析结果已保存至：{profile_path}")
+        except OSError as e:
+            logger.warning(f"性能分析结果保存失败：{str(e)}")
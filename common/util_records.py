@@ -0,0 +1,108 @@
+"""
+列式记录缓冲区
+
+回测中的信号/交易记录按列追加到预分配的NumPy数组中（容量不足时翻倍扩容），日期按自1970-01-01起的天数（int64）保存，
+不再为每条记录创建一个Python对象和pd.Timestamp；转换为DataFrame时数值列与日期列直接引用缓冲区，不逐条复制。
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+_SECONDS_PER_DAY = 86400
+# 由pd.Timestamp(date)组成的列的dtype（随pandas版本不同为datetime64[s]/[us]/[ns]），日期列转换为相同的dtype
+_DATE_DTYPE = pd.Series([pd.Timestamp(datetime.date(1970, 1, 1))]).dtype
+
+
+def to_epoch_days(date):
+    """
+    datetime.date或日期字符串 -> 自1970-01-01起的天数
+
+    异常:
+        ValueError: date不是datetime.date或字符串
+    """
+    if type(date) is datetime.date:
+        return date.toordinal() - _EPOCH_ORDINAL
+    if type(date) is str:
+        try:
+            return datetime.date.fromisoformat(date).toordinal() - _EPOCH_ORDINAL
+        except ValueError:
+            # 非ISO格式的日期字符串（如2024/01/15）
+            return pd.Timestamp(date).toordinal() - _EPOCH_ORDINAL
+    raise ValueError('date must be datetime.date or str')
+
+
+def from_epoch_days(days):
+    """自1970-01-01起的天数 -> datetime.date"""
+    return datetime.date.fromordinal(int(days) + _EPOCH_ORDINAL)
+
+
+class ColumnarRecords:
+    """
+    用法:
+        records = ColumnarRecords((('date', 'date'), ('price', np.float64), ('action', object)))
+        records.append(datetime.date(2024, 1, 15), 10.5, 'B')
+        df = records.to_dataframe()  # date列与pd.Timestamp(date)组成的列dtype相同
+
+    列类型为'date'时按天数保存，其余为NumPy dtype（字符串等使用object）
+    """
+    __slots__ = ('names', '_is_date', '_arrays', '_size', '_capacity')
+
+    def __init__(self, columns, capacity=64):
+        self.names = tuple(name for name, _ in columns)
+        self._is_date = tuple(isinstance(dtype, str) and dtype == 'date' for _, dtype in columns)
+        self._arrays = [np.empty(capacity, dtype=np.int64 if is_date else dtype)
+                        for is_date, (_, dtype) in zip(self._is_date, columns)]
+        self._size = 0
+        self._capacity = capacity
+
+    def __len__(self):
+        return self._size
+
+    def append(self, *values):
+        """按列顺序追加一条记录（日期转换失败时抛出ValueError，不会留下半条记录）"""
+        size = self._size
+        if size == self._capacity:
+            self._grow()
+        for array, is_date, value in zip(self._arrays, self._is_date, values):
+            array[size] = to_epoch_days(value) if is_date else value
+        self._size = size + 1
+
+    def _grow(self):
+        self._capacity *= 2
+        arrays = []
+        for array in self._arrays:
+            grown = np.empty(self._capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            arrays.append(grown)
+        self._arrays = arrays
+
+    def column(self, name):
+        """某一列已追加部分的视图（日期列为天数）"""
+        return self._arrays[self.names.index(name)][:self._size]
+
+    def rows(self):
+        """逐条返回记录（日期列转换为datetime.date），兼容按对象访问记录的旧代码"""
+        for i in range(self._size):
+            yield tuple(from_epoch_days(array[i]) if is_date else array[i].item() if array.dtype != object
+                        else array[i] for array, is_date in zip(self._arrays, self._is_date))
+
+    def to_dataframe(self):
+        """
+        转换为DataFrame（没有记录时返回只有列名的空DataFrame）
+
+        数值列（及pandas使用datetime64[s]时的日期列）引用缓冲区而不复制，之后追加的记录不会出现在已返回的DataFrame中；
+        调用方不应原地修改返回的DataFrame
+        """
+        size = self._size
+        data = {}
+        for name, is_date, array in zip(self.names, self._is_date, self._arrays):
+            values = array[:size]
+            if is_date:
+                # 天数 -> 秒数，再转换为与pd.Timestamp(date)组成的列相同的精度
+                values = (values * _SECONDS_PER_DAY).view('datetime64[s]')
+                if values.dtype != _DATE_DTYPE:
+                    values = values.astype(_DATE_DTYPE)
+            data[name] = values
+        return pd.DataFrame(data, columns=list(self.names), copy=False)
@@ -0,0 +1,98 @@
+import datetime
+import decimal
+import gzip
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+from flask import Response, request
+
+from common.logger import create_log
+from common.util_metrics import record_cache
+
+logger = create_log("util_response")
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，未安装时使用标准库json
+    orjson = None
+
+# 响应体超过该大小（字节）且客户端支持时进行gzip压缩
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 5
+
+
+def _default(obj):
+    """序列化json/orjson不直接支持的类型（numpy、pandas、日期、Decimal、集合）"""
+    if isinstance(obj, (pd.Timestamp, datetime.datetime, datetime.date)):
+        return None if pd.isna(obj) else obj.isoformat()
+    if isinstance(obj, np.integer):
+        return int(obj)
+    if isinstance(obj, np.floating):
+        return None if np.isnan(obj) else float(obj)
+    if isinstance(obj, np.bool_):
+        return bool(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, pd.DataFrame):
+        return obj.to_dict('records')
+    if isinstance(obj, pd.Series):
+        return obj.tolist()
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data):
+    """
+    将数据序列化为UTF-8编码的JSON字节串，原生支持numpy/pandas类型
+
+    参数:
+        data: 待序列化数据
+
+    返回:
+        bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, default=_default).encode('utf-8')
+
+
+def json_response(data, status=200):
+    """
+    构建JSON响应：快速序列化；GET/HEAD请求带ETag，内容未变化时返回304；较大的响应体按需gzip压缩
+
+    参数:
+        data: 响应数据（通常为 {'success', 'message', 'data'}）
+        status: HTTP状态码
+
+    返回:
+        flask Response
+    """
+    body = dumps(data)
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Content-Type'] = 'application/json; charset=utf-8'
+    response.headers['Vary'] = 'Accept-Encoding'
+
+    if request.method in ('GET', 'HEAD') and status == 200:
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        # 弱ETag：同一内容的gzip与未压缩表示共用一个校验值
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        not_modified = request.if_none_match.contains_weak(etag)
+        record_cache('json_etag', not_modified)
+        if not_modified:
+            return Response(status=304, headers={'ETag': response.headers['ETag'],
+                                                 'Cache-Control': 'no-cache',
+                                                 'Vary': 'Accept-Encoding'})
+
+    if len(body) >= GZIP_MIN_SIZE and 'gzip' in request.headers.get('Accept-Encoding', '').lower():
+        response.set_data(gzip.compress(body, GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,63 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from common.logger import create_log
+
+logger = create_log("util_sqlite")
+
+_local = threading.local()
+
+
+def connect(db_path):
+    """
+    获取当前线程的SQLite连接（WAL模式），同一线程内同一数据库复用连接
+
+    参数:
+        db_path: 数据库文件路径
+
+    返回:
+        sqlite3.Connection
+    """
+    db_path = str(db_path)
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    # 进程fork后不能复用父进程的连接
+    key = (os.getpid(), db_path)
+    conn = connections.get(key)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        connections[key] = conn
+    return conn
+
+
+@contextmanager
+def transaction(db_path):
+    """
+    开启写事务（BEGIN IMMEDIATE），多进程并发写入时串行化，异常自动回滚
+    """
+    conn = connect(db_path)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    else:
+        conn.execute('COMMIT')
+
+
+def init_schema(db_path, schema_sql):
+    """
+    初始化表结构（建表语句需使用IF NOT EXISTS）
+    """
+    conn = connect(db_path)
+    conn.executescript(schema_sql)
+    return conn
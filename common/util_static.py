@@ -0,0 +1,134 @@
+import gzip
+import mimetypes
+import os
+
+from flask import send_file
+
+from common.logger import create_log
+from common.util_metrics import record_cache
+
+logger = create_log("util_static")
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只生成gzip
+    brotli = None
+
+# 编码优先级（压缩率从高到低）及对应的预压缩文件后缀
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+# 生成并发送预压缩版本的文件类型（回测报告），其余文件（如性能分析结果）原样发送
+PRECOMPRESS_EXTENSIONS = ('.html',)
+
+
+def is_precompressed_copy(file_path):
+    """是否为预压缩生成的文件（file.gz/file.br），这类文件不单独提供访问，也不再次压缩"""
+    return str(file_path).endswith(tuple(suffix for _, suffix in _ENCODINGS))
+
+
+def precompress_file(file_path):
+    """
+    为静态文件生成预压缩版本（file.gz，已安装brotli时另生成file.br），已是最新的版本不重复生成
+
+    参数:
+        file_path: 原始文件路径
+
+    返回:
+        list: 生成或已存在的预压缩文件路径
+    """
+    file_path = str(file_path)
+    if is_precompressed_copy(file_path):
+        return []
+    source_mtime = os.path.getmtime(file_path)
+    outputs = []
+    data = None
+    for encoding, suffix in _ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        target = file_path + suffix
+        outputs.append(target)
+        if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+            record_cache('report_precompressed', True)
+            continue
+        record_cache('report_precompressed', False)
+        if data is None:
+            with open(file_path, 'rb') as f:
+                data = f.read()
+        compressed = brotli.compress(data, quality=9) if encoding == 'br' else gzip.compress(data, 9, mtime=0)
+        # 先写临时文件再替换，避免并发请求读到写了一半的文件
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, target)
+    return outputs
+
+
+def _accepted_encodings(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        token, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        try:
+            quality = float(params[2:]) if params.startswith('q=') else 1.0
+        except ValueError:
+            quality = 1.0
+        if token and quality > 0:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def send_precompressed(file_path, accept_encoding, mimetype='text/html', max_age=3600):
+    """
+    发送静态文件：按Accept-Encoding选择预压缩版本，分块流式发送，
+    带ETag/Last-Modified并支持条件请求（未修改时返回304）
+
+    参数:
+        file_path: 原始文件路径
+        accept_encoding: 请求头Accept-Encoding
+        mimetype: 原始文件的MIME类型
+        max_age: 浏览器缓存时间（秒），过期后通过条件请求校验
+
+    返回:
+        flask Response
+    """
+    file_path = str(file_path)
+    try:
+        precompress_file(file_path)
+    except OSError as e:
+        logger.warning(f"生成预压缩文件失败，发送原始文件: {file_path}, {str(e)}")
+
+    accepted = _accepted_encodings(accept_encoding)
+    send_path, encoding = file_path, None
+    for candidate, suffix in _ENCODINGS:
+        if candidate in accepted and os.path.exists(file_path + suffix):
+            send_path, encoding = file_path + suffix, candidate
+            break
+
+    stat = os.stat(send_path)
+    # 不同编码的内容不同，ETag需要区分编码
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}" + (f"-{encoding}" if encoding else "")
+    response = send_file(send_path, mimetype=mimetype, conditional=True, etag=etag,
+                         last_modified=stat.st_mtime, max_age=max_age)
+    record_cache('report_etag', response.status_code == 304)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def send_static(file_path, accept_encoding, max_age=3600):
+    """
+    发送结果目录中的文件：报告HTML按send_precompressed发送，其余文件按扩展名确定MIME类型原样发送（支持条件请求）
+
+    参数:
+        file_path: 文件路径（调用方需确认不是预压缩文件，见is_precompressed_copy）
+        accept_encoding: 请求头Accept-Encoding
+        max_age: 浏览器缓存时间（秒）
+
+    返回:
+        flask Response
+    """
+    file_path = str(file_path)
+    if file_path.lower().endswith(PRECOMPRESS_EXTENSIONS):
+        return send_precompressed(file_path, accept_encoding, max_age=max_age)
+    mimetype = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    return send_file(file_path, mimetype=mimetype, conditional=True, max_age=max_age)
@@ -0,0 +1,351 @@
+"""
+企业微信通知发送队列
+
+消息先写入SQLite发送队列（settings.notify_outbox_db）再由后台线程发送，进程重启后未发送的消息继续发送：
+    - 复用WechatNotifier的连接池（requests.Session）
+    - 按webhook频率限制（settings.NOTIFY_RATE_LIMIT 条/分钟）控制发送速度，收到频率限制错误码时暂停一分钟
+    - 可合并的Markdown消息（如任务完成说明）入队后等待settings.NOTIFY_BATCH_WINDOW秒，
+      期间到达的同类消息合并为一条发送，多个任务同时完成时只占用一次发送额度
+    - 发送失败按指数退避重试，超过settings.NOTIFY_MAX_ATTEMPTS次后标记为失败
+    - 消息可指定after（另一条消息的id），该消息发送完成（或最终失败）后才发送，如PDF附件在报告说明之后发送
+
+多个进程可同时运行发送线程，消息通过数据库事务领取，不会重复发送。
+"""
+import json
+import os
+import socket
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import settings
+from common.logger import create_log
+from common.util_process import pid_alive
+from common.util_sqlite import connect, transaction, init_schema
+from core.notification.wechat_notifier import wechat_notifier
+
+logger = create_log('notify_dispatcher')
+
+MESSAGE_PENDING = 'pending'
+MESSAGE_SENDING = 'sending'
+MESSAGE_SENT = 'sent'
+MESSAGE_FAILED = 'failed'
+
+# 企业微信markdown消息内容上限（字节）
+MARKDOWN_MAX_BYTES = 4096
+# 企业微信频率限制错误码
+ERRCODE_RATE_LIMITED = 45009
+# 合并消息之间的分隔
+BATCH_SEPARATOR = '\n\n'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS notify_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    batchable INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    worker TEXT,
+    error TEXT,
+    create_time TEXT NOT NULL,
+    sent_time TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_notify_outbox_due ON notify_outbox (status, next_attempt);
+"""
+
+_initialized = set()
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class NotifyDispatcher:
+    """
+    用法:
+        ids = notify_dispatcher.send_pdf_report(pdf_path, title, description)  # 入队后立即返回
+        notify_dispatcher.wait(ids, timeout=60)                                # 需要确认送达时等待
+    """
+
+    def __init__(self, notifier=None, db_path=None):
+        self.notifier = notifier or wechat_notifier
+        self.db_path = str(db_path or settings.notify_outbox_db)
+        self._thread = None
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._sent_times = deque()  # 最近一分钟内的发送时间
+        self._paused_until = 0.0
+
+    def _db(self):
+        key = (os.getpid(), self.db_path)
+        if key not in _initialized:
+            init_schema(self.db_path, _SCHEMA)
+            _initialized.add(key)
+        return self.db_path
+
+    @staticmethod
+    def _worker_name():
+        # 进程fork后pid变化，每次领取时重新计算
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def enqueue(self, kind, payload, batchable=False, after=None):
+        """
+        消息入队
+
+        参数:
+            kind: markdown、text、file
+            payload: markdown/text为 {'content': ...}（text可带mentioned_list等），file为 {'file_path': ...}
+            batchable: 是否可与其他Markdown消息合并发送
+            after: 先发送的消息id，该消息发送完成或最终失败后才发送本消息
+
+        返回:
+            int: 消息id
+        """
+        delay = settings.NOTIFY_BATCH_WINDOW if batchable else 0
+        next_attempt = time.time() + delay
+        if after is not None:
+            payload = dict(payload, after=after)
+        with transaction(self._db()) as conn:
+            if after is not None:
+                row = conn.execute("SELECT next_attempt FROM notify_outbox WHERE id = ?", (after,)).fetchone()
+                if row is not None:
+                    next_attempt = max(next_attempt, row['next_attempt'])
+            message_id = conn.execute(
+                "INSERT INTO notify_outbox (kind, payload, batchable, status, next_attempt, create_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), int(bool(batchable)), MESSAGE_PENDING,
+                 next_attempt, _now())).lastrowid
+        self.start()
+        self._wakeup.set()
+        return message_id
+
+    def send_markdown(self, content, batchable=True):
+        return self.enqueue('markdown', {'content': content}, batchable=batchable)
+
+    def send_text(self, content, mentioned_list=None, mentioned_mobile_list=None):
+        return self.enqueue('text', {'content': content, 'mentioned_list': mentioned_list or [],
+                                     'mentioned_mobile_list': mentioned_mobile_list or []})
+
+    def send_file(self, file_path, after=None):
+        return self.enqueue('file', {'file_path': os.path.abspath(file_path)}, after=after)
+
+    def send_pdf_report(self, pdf_file_path, title="回测报告", description=""):
+        """报告说明（可合并，等待合并窗口）与PDF附件入队，附件在说明发送后才发送，返回消息id列表"""
+        summary_id = self.send_markdown(self.notifier.report_markdown(title, description, 'PDF'))
+        return [summary_id, self.send_file(pdf_file_path, after=summary_id)]
+
+    def get(self, message_id):
+        row = connect(self._db()).execute("SELECT * FROM notify_outbox WHERE id = ?", (message_id,)).fetchone()
+        return dict(row) if row else None
+
+    def wait(self, message_ids, timeout=None, poll_interval=0.2):
+        """
+        等待消息发送完成
+
+        返回:
+            bool: 是否全部发送成功（超时或有消息最终失败时返回False）
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        ids = list(message_ids)
+        if not ids:
+            return True
+        while True:
+            rows = connect(self._db()).execute(
+                f"SELECT status FROM notify_outbox WHERE id IN ({', '.join('?' * len(ids))})", ids).fetchall()
+            statuses = [row['status'] for row in rows]
+            if all(status in (MESSAGE_SENT, MESSAGE_FAILED) for status in statuses):
+                return len(statuses) == len(ids) and all(status == MESSAGE_SENT for status in statuses)
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(poll_interval)
+
+    def start(self):
+        """启动当前进程的后台发送线程（已启动时不重复启动）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self.recover_interrupted()
+            self._thread = threading.Thread(target=self._run, name='notify-dispatcher', daemon=True)
+            self._thread.start()
+
+    def recover_interrupted(self):
+        """本机上已退出的进程领取但未发送完的消息重新入队"""
+        hostname = socket.gethostname()
+        recovered = 0
+        with transaction(self._db()) as conn:
+            rows = conn.execute("SELECT id, worker FROM notify_outbox WHERE status = ?", (MESSAGE_SENDING,)).fetchall()
+            for row in rows:
+                host, _, pid = (row['worker'] or '').rpartition(':')
+                if host != hostname or (pid.isdigit() and pid_alive(int(pid))):
+                    continue
+                conn.execute("UPDATE notify_outbox SET status = ?, worker = NULL WHERE id = ?",
+                             (MESSAGE_PENDING, row['id']))
+                recovered += 1
+        if recovered:
+            logger.warning(f"{recovered} 条通知因发送进程退出重新入队")
+        return recovered
+
+    def _run(self):
+        while True:
+            try:
+                if self.dispatch_once():
+                    continue
+            except Exception as e:
+                logger.error(f"通知发送线程异常: {str(e)}")
+            self._wakeup.wait(timeout=self._idle_timeout())
+            self._wakeup.clear()
+
+    def _idle_timeout(self):
+        row = connect(self._db()).execute(
+            "SELECT MIN(next_attempt) AS next_attempt FROM notify_outbox WHERE status = ?",
+            (MESSAGE_PENDING,)).fetchone()
+        if row is None or row['next_attempt'] is None:
+            return 60
+        return min(60, max(0.1, row['next_attempt'] - time.time()))
+
+    @staticmethod
+    def _blocked_until(conn, row, now):
+        """消息的after消息尚未发送完成时返回本消息的下次检查时间，否则返回None"""
+        after = json.loads(row['payload']).get('after')
+        if after is None:
+            return None
+        dependency = conn.execute("SELECT status, next_attempt FROM notify_outbox WHERE id = ?", (after,)).fetchone()
+        if dependency is None or dependency['status'] in (MESSAGE_SENT, MESSAGE_FAILED):
+            return None
+        # after消息正在被其他线程发送时，稍后再检查
+        return dependency['next_attempt'] if dependency['status'] == MESSAGE_PENDING else now + 1
+
+    def _claim(self, now):
+        """
+        领取最早到期的消息；若为可合并的Markdown，同时领取其他已到期的可合并消息。
+        after消息未发送完成的消息不领取，其下次尝试时间推迟到after消息的下次尝试时间
+        """
+        with transaction(self._db()) as conn:
+            due = conn.execute(
+                "SELECT * FROM notify_outbox WHERE status = ? AND next_attempt <= ? ORDER BY id LIMIT ?",
+                (MESSAGE_PENDING, now, max(1, settings.NOTIFY_BATCH_MAX) * 4)).fetchall()
+            rows = []
+            for row in due:
+                blocked_until = self._blocked_until(conn, row, now)
+                if blocked_until is None:
+                    rows.append(row)
+                else:
+                    conn.execute("UPDATE notify_outbox SET next_attempt = ? WHERE id = ?", (blocked_until, row['id']))
+            if not rows:
+                return []
+            claimed = [rows[0]]
+            if rows[0]['batchable'] and rows[0]['kind'] == 'markdown':
+                size = len(json.loads(rows[0]['payload'])['content'].encode('utf-8'))
+                for row in rows[1:]:
+                    if len(claimed) >= settings.NOTIFY_BATCH_MAX:
+                        break
+                    if not row['batchable'] or row['kind'] != 'markdown':
+                        continue
+                    row_size = len(json.loads(row['payload'])['content'].encode('utf-8')) + len(BATCH_SEPARATOR)
+                    if size + row_size > MARKDOWN_MAX_BYTES:
+                        break
+                    claimed.append(row)
+                    size += row_size
+            conn.execute(
+                f"UPDATE notify_outbox SET status = ?, worker = ? WHERE id IN ({', '.join('?' * len(claimed))})",
+                [MESSAGE_SENDING, self._worker_name()] + [row['id'] for row in claimed])
+        return claimed
+
+    def dispatch_once(self, now=None):
+        """
+        发送一条（或一批合并后的）到期消息
+
+        返回:
+            bool: 是否有消息被处理
+        """
+        now = now or time.time()
+        if now < self._paused_until:
+            return False
+        rows = self._claim(now)
+        if not rows:
+            return False
+        self._acquire_slot()
+        success, result = self._deliver(rows)
+        if success:
+            with transaction(self._db()) as conn:
+                conn.execute(
+                    f"UPDATE notify_outbox SET status = ?, attempts = attempts + 1, sent_time = ?, error = NULL "
+                    f"WHERE id IN ({', '.join('?' * len(rows))})", [MESSAGE_SENT, _now()] + [row['id'] for row in rows])
+            if len(rows) > 1:
+                logger.info(f"合并发送 {len(rows)} 条通知")
+            return True
+
+        error = result.get('errmsg') or str(result)
+        if result.get('errcode') == ERRCODE_RATE_LIMITED:
+            # 被限流时不计入失败次数，暂停一分钟后再发送
+            self._paused_until = time.time() + 60
+            logger.warning(f"通知发送被限流，暂停60秒: {error}")
+            self._release(rows, attempts=0, delay=60, error=error)
+            return True
+        self._release(rows, attempts=1, delay=None, error=error)
+        return True
+
+    def _release(self, rows, attempts, delay, error):
+        with transaction(self._db()) as conn:
+            for row in rows:
+                row_attempts = row['attempts'] + attempts
+                if row_attempts >= settings.NOTIFY_MAX_ATTEMPTS:
+                    conn.execute("UPDATE notify_outbox SET status = ?, attempts = ?, error = ? WHERE id = ?",
+                                 (MESSAGE_FAILED, row_attempts, error, row['id']))
+                    logger.error(f"通知发送失败，已达到最大尝试次数: {row['id']}, {error}")
+                    continue
+                row_delay = delay if delay is not None else \
+                    settings.NOTIFY_RETRY_BACKOFF * (2 ** max(0, row_attempts - 1))
+                conn.execute(
+                    "UPDATE notify_outbox SET status = ?, attempts = ?, next_attempt = ?, worker = NULL, error = ? "
+                    "WHERE id = ?", (MESSAGE_PENDING, row_attempts, time.time() + row_delay, error, row['id']))
+                logger.warning(f"通知发送失败，{row_delay}秒后重试: {row['id']}, {error}")
+
+    def _acquire_slot(self):
+        """按webhook频率限制等待发送额度"""
+        window = 60
+        while True:
+            now = time.time()
+            while self._sent_times and self._sent_times[0] <= now - window:
+                self._sent_times.popleft()
+            if len(self._sent_times) < settings.NOTIFY_RATE_LIMIT:
+                self._sent_times.append(now)
+                return
+            time.sleep(self._sent_times[0] + window - now)
+
+    def _deliver(self, rows):
+        """发送领取的消息，返回 (是否成功, 企业微信返回结果)"""
+        if not self.notifier.webhook_url:
+            return False, {'errcode': None, 'errmsg': '企业微信webhook URL未在环境变量WECHAT_WEBHOOK_QUANT中配置'}
+        kind = rows[0]['kind']
+        payload = json.loads(rows[0]['payload'])
+        if kind == 'markdown':
+            content = BATCH_SEPARATOR.join(json.loads(row['payload'])['content'] for row in rows)
+            return self.notifier.post({'msgtype': 'markdown', 'markdown': {'content': content}})
+        if kind == 'text':
+            return self.notifier.post({'msgtype': 'text', 'text': payload})
+        if kind == 'file':
+            if not os.path.exists(payload['file_path']):
+                return False, {'errcode': None, 'errmsg': f"文件不存在: {payload['file_path']}"}
+            success, media_id = self.notifier.upload_media(payload['file_path'])
+            if not success:
+                return False, {'errcode': None, 'errmsg': f"上传文件失败: {media_id}"}
+            return self.notifier.post({'msgtype': 'file', 'file': {'media_id': media_id}})
+        return False, {'errcode': None, 'errmsg': f"未知的消息类型: {kind}"}
+
+    def delete_old(self, days=None):
+        """删除超过保留天数的已发送/失败消息，返回删除数量"""
+        days = settings.TASK_EXECUTION_RETENTION_DAYS if days is None else days
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        with transaction(self._db()) as conn:
+            count = conn.execute("DELETE FROM notify_outbox WHERE status IN (?, ?) AND create_time < ?",
+                                 (MESSAGE_SENT, MESSAGE_FAILED, cutoff)).rowcount
+        if count:
+            logger.info(f"删除了 {count} 条过期通知记录")
+        return count
+
+
+notify_dispatcher = NotifyDispatcher()
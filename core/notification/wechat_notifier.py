@@ -1,12 +1,17 @@
 import os
 import time
 import json
+from urllib.parse import urlsplit, urlunsplit, parse_qs, urlencode
 import requests
+from requests.adapters import HTTPAdapter
 from common.logger import create_log
-from common.util_html import html_to_pdf
+from common.util_pdf import pdf_renderer
 
 logger = create_log('wechat_notifier')
 
+# 连接池大小：同时完成的任务较多时复用连接，避免每条消息新建TLS连接
+POOL_SIZE = 10
+
 
 class WechatNotifier:
     """企业微信webhook消息通知服务类（从环境变量读取配置）"""
@@ -15,6 +20,59 @@ class WechatNotifier:
         # 从环境变量读取企业微信webhook配置
         self.webhook_url = os.environ.get('WECHAT_WEBHOOK_QUANT', '')
         self.timeout = 10
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def post(self, data):
+        """
+        向webhook发送一条消息
+        :param data: 消息内容（msgtype及对应字段）
+        :return: (是否成功, 企业微信返回结果)，网络异常时返回结果为 {'errcode': None, 'errmsg': 异常信息}
+        """
+        try:
+            response = self.session.post(self.webhook_url, json=data, timeout=self.timeout)
+            result = response.json()
+        except Exception as e:
+            return False, {'errcode': None, 'errmsg': str(e)}
+        return result.get('errcode') == 0, result
+
+    def upload_url(self):
+        """根据webhook地址生成文件上传地址（.../webhook/send?key=xxx -> .../webhook/upload_media?key=xxx&type=file）"""
+        parts = urlsplit(self.webhook_url)
+        key = parse_qs(parts.query).get('key', [''])[0]
+        if not key:
+            return None
+        path = parts.path.rsplit('/', 1)[0] + '/upload_media'
+        return urlunsplit((parts.scheme, parts.netloc, path, urlencode({'key': key, 'type': 'file'}), ''))
+
+    def upload_media(self, file_path):
+        """
+        上传文件
+        :param file_path: 文件路径
+        :return: (是否成功, media_id或错误信息)
+        """
+        upload_url = self.upload_url()
+        if not upload_url:
+            return False, "webhook URL格式不正确，缺少key参数"
+        try:
+            with open(file_path, 'rb') as f:
+                response = self.session.post(upload_url, files={'media': f}, timeout=self.timeout)
+            result = response.json()
+        except Exception as e:
+            return False, str(e)
+        if result.get('errcode') != 0:
+            return False, result.get('errmsg')
+        return True, result.get('media_id')
+
+    @staticmethod
+    def report_markdown(title, description, attachment='PDF'):
+        """报告说明消息（Markdown）"""
+        return (f"# {title}\n\n"
+                f"## 描述\n{description}\n\n"
+                f"## 时间\n{time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+                f"{attachment}报告已作为附件发送，请查收。")
 
     def send_text_message(self, content, mentioned_list=None, mentioned_mobile_list=None):
         """
@@ -40,22 +98,12 @@ class WechatNotifier:
             }
         }
 
-        try:
-            response = requests.post(
-                self.webhook_url,
-                json=data,
-                timeout=self.timeout
-            )
-            result = response.json()
-            if result.get('errcode') == 0:
-                logger.info("发送文本消息成功")
-                return True
-            else:
-                logger.error(f"发送文本消息失败: {result.get('errmsg')}")
-                return False
-        except Exception as e:
-            logger.error(f"发送文本消息异常: {str(e)}")
-            return False
+        success, result = self.post(data)
+        if success:
+            logger.info("发送文本消息成功")
+        else:
+            logger.error(f"发送文本消息失败: {result.get('errmsg')}")
+        return success
 
     def send_markdown_message(self, content):
         """
@@ -74,22 +122,12 @@ class WechatNotifier:
             }
         }
 
-        try:
-            response = requests.post(
-                self.webhook_url,
-                json=data,
-                timeout=self.timeout
-            )
-            result = response.json()
-            if result.get('errcode') == 0:
-                logger.info("发送Markdown消息成功")
-                return True
-            else:
-                logger.error(f"发送Markdown消息失败: {result.get('errmsg')}")
-                return False
-        except Exception as e:
-            logger.error(f"发送Markdown消息异常: {str(e)}")
-            return False
+        success, result = self.post(data)
+        if success:
+            logger.info("发送Markdown消息成功")
+        else:
+            logger.error(f"发送Markdown消息失败: {result.get('errmsg')}")
+        return success
 
     def send_file_message(self, file_path):
         """
@@ -105,55 +143,24 @@ class WechatNotifier:
             logger.error(f"文件不存在: {file_path}")
             return False
 
-        try:
-            # 第一步：获取webhook key并构建上传URL
-            if 'key=' not in self.webhook_url:
-                logger.error("webhook URL格式不正确，缺少key参数")
-                return False
-
-            key = self.webhook_url.split('key=')[1].split('&')[0]
-            upload_url = f"https://qyapi.weixin.qq.com/cgi-bin/webhook/upload_media?key={key}&type=file"
-
-            # 上传文件
-            files = {'media': open(file_path, 'rb')}
-            response = requests.post(
-                upload_url,
-                files=files,
-                timeout=self.timeout
-            )
-            upload_result = response.json()
-
-            if upload_result.get('errcode') != 0:
-                logger.error(f"上传文件失败: {upload_result.get('errmsg')}")
-                return False
-
-            media_id = upload_result.get('media_id')
+        # 第一步：上传文件
+        success, media_id = self.upload_media(file_path)
+        if not success:
+            logger.error(f"上传文件失败: {media_id}")
+            return False
 
-            # 第二步：发送文件消息
-            send_data = {
-                "msgtype": "file",
-                "file": {
-                    "media_id": media_id
-                }
+        # 第二步：发送文件消息
+        success, result = self.post({
+            "msgtype": "file",
+            "file": {
+                "media_id": media_id
             }
-
-            send_response = requests.post(
-                self.webhook_url,
-                json=send_data,
-                timeout=self.timeout
-            )
-            send_result = send_response.json()
-
-            if send_result.get('errcode') == 0:
-                logger.info("发送文件消息成功")
-                return True
-            else:
-                logger.error(f"发送文件消息失败: {send_result.get('errmsg')}")
-                return False
-
-        except Exception as e:
-            logger.error(f"发送文件消息异常: {str(e)}")
-            return False
+        })
+        if success:
+            logger.info("发送文件消息成功")
+        else:
+            logger.error(f"发送文件消息失败: {result.get('errmsg')}")
+        return success
 
     def send_html_content_report(self, html_content, title="回测报告", description="", report_filename="report.pdf"):
         """
@@ -169,28 +176,32 @@ class WechatNotifier:
             return False
 
         try:
-
-            # 先发送一个Markdown格式的说明消息
-            markdown_content = f"""# {title}
-
-            ## 描述
-            {description}
-
-            ## 时间
-            {time.strftime('%Y-%m-%d %H:%M:%S')}
-
-            PDF报告已作为附件发送，请查收。"""
-
-            self.send_markdown_message(markdown_content)
-
-            # 然后发送HTML文件作为附件
-            html_to_pdf(html_content, report_filename)
-            return self.send_file_message(report_filename)
+            if not pdf_renderer.render(html_content, report_filename):
+                logger.error(f"生成PDF报告失败: {report_filename}")
+                return False
+            return self.send_pdf_report(report_filename, title, description)
 
         except Exception as e:
             logger.error(f"发送PDF内容报告异常: {str(e)}")
             return False
 
+    def send_pdf_report(self, pdf_file_path, title="回测报告", description=""):
+        """
+        发送已生成的PDF报告
+        :param pdf_file_path: PDF文件路径
+        :param title: 报告标题
+        :param description: 报告描述
+        :return: 是否发送成功
+        """
+        if not self.webhook_url:
+            logger.error("企业微信webhook URL未在环境变量WECHAT_WEBHOOK_QUANT中配置")
+            return False
+
+        # 先发送一个Markdown格式的说明消息
+        self.send_markdown_message(self.report_markdown(title, description, 'PDF'))
+
+        # 然后发送PDF文件作为附件
+        return self.send_file_message(pdf_file_path)
 
     def send_html_report(self, html_file_path, title="回测报告", description=""):
         """
@@ -204,17 +215,7 @@ class WechatNotifier:
             logger.error("企业微信webhook URL未在环境变量WECHAT_WEBHOOK_QUANT中配置")
             return False
         # 先发送一个Markdown格式的说明消息
-        markdown_content = f"""# {title}
-
-        ## 描述
-        {description}
-        
-        ## 时间
-        {time.strftime('%Y-%m-%d %H:%M:%S')}
-        
-        HTML报告已作为附件发送，请查收。"""
-
-        self.send_markdown_message(markdown_content)
+        self.send_markdown_message(self.report_markdown(title, description, 'HTML'))
 
         # 然后发送HTML文件作为附件
         return self.send_file_message(html_file_path)
@@ -239,6 +240,11 @@ def send_wechat_report_pdf(html_content, title="回测报告", description="", r
     return wechat_notifier.send_html_content_report(html_content, title, description, report_filename)
 
 
+def send_wechat_pdf(pdf_file_path, title="回测报告", description=""):
+    """发送已生成的PDF报告的便捷函数"""
+    return wechat_notifier.send_pdf_report(pdf_file_path, title, description)
+
+
 # if __name__ == '__main__':
 #
 #     # 导入微信通知模块
@@ -1,4 +1,3 @@
-import baostock as bs
 import requests
 import pandas as pd
 import json
@@ -0,0 +1,353 @@
+"""
+回测任务队列
+
+前端提交回测后立即返回任务ID，由后台工作进程从队列（SQLite）中领取并执行，
+执行过程中记录进度（已处理K线数、已完成股票数、预计剩余时间），支持取消。
+"""
+import json
+import multiprocessing
+import os
+import socket
+import time
+from datetime import datetime
+from pathlib import Path
+
+import settings
+from common.logger import create_log, quiet_backtest
+from common.util_metrics import metrics_registry, backtest_job_duration
+from common.util_process import pid_alive
+from common.util_sqlite import connect, transaction, init_schema
+
+logger = create_log('backtest_job')
+
+JOB_STATUS_QUEUED = 'queued'
+JOB_STATUS_RUNNING = 'running'
+JOB_STATUS_SUCCESS = 'success'
+JOB_STATUS_FAILED = 'failed'
+JOB_STATUS_CANCELLED = 'cancelled'
+FINISHED_STATUSES = (JOB_STATUS_SUCCESS, JOB_STATUS_FAILED, JOB_STATUS_CANCELLED)
+
+# 进度写入数据库的最小间隔（秒），避免每根K线都写库
+PROGRESS_FLUSH_INTERVAL = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backtest_jobs (
+    id TEXT PRIMARY KEY,
+    job_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    create_time TEXT NOT NULL,
+    start_time TEXT,
+    end_time TEXT,
+    start_ts REAL,
+    end_ts REAL
+);
+CREATE INDEX IF NOT EXISTS idx_backtest_jobs_status ON backtest_jobs (status, create_time);
+CREATE INDEX IF NOT EXISTS idx_backtest_jobs_create_time ON backtest_jobs (create_time);
+"""
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+class BacktestJobQueue:
+    """
+    回测任务队列，任务状态保存在SQLite中，Web进程和工作进程共享
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = str(db_path or settings.backtest_job_db)
+        self._initialized_pid = None
+
+    def _conn(self):
+        if self._initialized_pid != os.getpid():
+            init_schema(self.db_path, _SCHEMA)
+            self._initialized_pid = os.getpid()
+        return connect(self.db_path)
+
+    def submit(self, job_type, payload):
+        """
+        提交回测任务
+
+        Args:
+            job_type: 'single'（单只股票）或 'batch'（批量）
+            payload: 任务参数，包含source, stock_file, strategy, init_cash, profile（是否性能分析，None取默认配置）、
+                     low_memory（是否低内存回测，None按配置与CSV大小决定）等
+
+        Returns:
+            dict: 任务信息
+        """
+        self._conn()
+        job_id = f"job_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        progress = {'bars_done': 0, 'bars_total': 0, 'symbols_done': 0, 'symbols_total': 0, 'current_symbol': None}
+        with transaction(self.db_path) as conn:
+            conn.execute(
+                """INSERT INTO backtest_jobs (id, job_type, status, payload, progress, create_time)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (job_id, job_type, JOB_STATUS_QUEUED, json.dumps(payload, ensure_ascii=False),
+                 json.dumps(progress), _now()))
+        logger.info(f"提交回测任务: {job_id}, 类型: {job_type}")
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """获取任务信息（包含进度与预计剩余时间），不存在返回None"""
+        row = self._conn().execute("SELECT * FROM backtest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_jobs(self, limit=50, status=None):
+        """按创建时间倒序获取任务列表"""
+        sql = "SELECT * FROM backtest_jobs"
+        params = []
+        if status:
+            sql += " WHERE status = ?"
+            params.append(status)
+        sql += " ORDER BY create_time DESC, id DESC LIMIT ?"
+        params.append(limit)
+        return [self._to_dict(row) for row in self._conn().execute(sql, params).fetchall()]
+
+    def cancel(self, job_id):
+        """
+        取消任务：排队中的任务直接取消，运行中的任务由工作进程在下一次进度回调时中断
+
+        Returns:
+            dict: 任务信息，不存在返回None
+        """
+        self._conn()
+        with transaction(self.db_path) as conn:
+            conn.execute(
+                "UPDATE backtest_jobs SET status = ?, end_time = ?, end_ts = ? WHERE id = ? AND status = ?",
+                (JOB_STATUS_CANCELLED, _now(), time.time(), job_id, JOB_STATUS_QUEUED))
+            conn.execute(
+                "UPDATE backtest_jobs SET cancel_requested = 1 WHERE id = ? AND status = ?",
+                (job_id, JOB_STATUS_RUNNING))
+        logger.info(f"请求取消回测任务: {job_id}")
+        return self.get(job_id)
+
+    def claim_next(self, worker):
+        """工作进程领取最早的排队任务，没有任务返回None"""
+        self._conn()
+        with transaction(self.db_path) as conn:
+            row = conn.execute(
+                "SELECT id FROM backtest_jobs WHERE status = ? ORDER BY create_time, id LIMIT 1",
+                (JOB_STATUS_QUEUED,)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE backtest_jobs SET status = ?, worker = ?, start_time = ?, start_ts = ? WHERE id = ?",
+                (JOB_STATUS_RUNNING, worker, _now(), time.time(), row['id']))
+        return self.get(row['id'])
+
+    def update_progress(self, job_id, progress):
+        """
+        更新任务进度
+
+        Returns:
+            bool: 是否已请求取消
+        """
+        self._conn()
+        with transaction(self.db_path) as conn:
+            conn.execute("UPDATE backtest_jobs SET progress = ? WHERE id = ?",
+                         (json.dumps(progress, ensure_ascii=False), job_id))
+            row = conn.execute("SELECT cancel_requested FROM backtest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+
+    def finish(self, job_id, status, result=None, error=None):
+        """记录任务结束状态"""
+        self._conn()
+        with transaction(self.db_path) as conn:
+            conn.execute(
+                """UPDATE backtest_jobs SET status = ?, result = ?, error = ?, end_time = ?, end_ts = ?
+                   WHERE id = ?""",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, _now(), time.time(), job_id))
+        logger.info(f"回测任务结束: {job_id}, 状态: {status}")
+
+    def recover_interrupted(self):
+        """将本机上工作进程已退出、但仍处于运行中的任务标记为失败（其他存活工作进程的任务不受影响）"""
+        self._conn()
+        hostname = socket.gethostname()
+        recovered = 0
+        with transaction(self.db_path) as conn:
+            rows = conn.execute("SELECT id, worker FROM backtest_jobs WHERE status = ?",
+                                (JOB_STATUS_RUNNING,)).fetchall()
+            for row in rows:
+                host, _, pid = (row['worker'] or '').rpartition(':')
+                if host == hostname and pid.isdigit() and pid_alive(int(pid)):
+                    continue
+                if host and host != hostname:
+                    continue
+                conn.execute(
+                    "UPDATE backtest_jobs SET status = ?, error = ?, end_time = ?, end_ts = ? WHERE id = ?",
+                    (JOB_STATUS_FAILED, '工作进程退出，任务中断', _now(), time.time(), row['id']))
+                recovered += 1
+        if recovered:
+            logger.warning(f"{recovered} 个回测任务因工作进程退出被标记为失败")
+        return recovered
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+        job['progress'] = json.loads(job['progress']) if job['progress'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        job['elapsed'] = None
+        job['eta'] = None
+        start_ts = job.pop('start_ts')
+        end_ts = job.pop('end_ts')
+        if start_ts:
+            elapsed = (end_ts or time.time()) - start_ts
+            job['elapsed'] = round(elapsed, 1)
+            fraction = _progress_fraction(job['progress'])
+            if job['status'] == JOB_STATUS_RUNNING and fraction > 0:
+                job['eta'] = round(elapsed * (1 - fraction) / fraction, 1)
+        job['percent'] = 100.0 if job['status'] == JOB_STATUS_SUCCESS \
+            else round(_progress_fraction(job['progress']) * 100, 1)
+        return job
+
+
+def _progress_fraction(progress):
+    """根据已完成股票数和当前股票K线进度计算总进度（0~1）"""
+    symbols_total = progress.get('symbols_total') or 0
+    bars_total = progress.get('bars_total') or 0
+    bar_fraction = min(progress.get('bars_done', 0) / bars_total, 1.0) if bars_total else 0.0
+    if symbols_total <= 0:
+        return 0.0
+    done = progress.get('symbols_done', 0)
+    return min((done + (bar_fraction if done < symbols_total else 0)) / symbols_total, 1.0)
+
+
+# 全局任务队列实例
+backtest_job_queue = BacktestJobQueue()
+
+
+class _JobRunner:
+    """在工作进程中执行一个回测任务，负责进度上报与取消检查"""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.job = job
+        self.progress = dict(job['progress'])
+        self.last_flush = 0.0
+
+    def flush(self, force=False):
+        now = time.time()
+        if not force and now - self.last_flush < PROGRESS_FLUSH_INTERVAL:
+            return
+        self.last_flush = now
+        from core.quant.quant_manage import BacktestCancelled
+        if self.queue.update_progress(self.job['id'], self.progress):
+            raise BacktestCancelled(self.job['id'])
+
+    def on_bar(self, bars_done, bars_total):
+        self.progress['bars_done'] = bars_done
+        self.progress['bars_total'] = bars_total
+        self.flush()
+
+    def run(self):
+        from core.quant.quant_manage import run_backtest_enhanced_volume_strategy
+        from core.strategy.strategy_manager import global_strategy_manager
+
+        payload = self.job['payload']
+        strategy_class = global_strategy_manager.get_strategy(payload.get('strategy'))
+        if not strategy_class:
+            raise ValueError(f"Invalid strategy: {payload.get('strategy')}")
+        init_cash = float(payload.get('init_cash', settings.INIT_CASH))
+        source_path = Path(settings.stock_data_root) / payload['source']
+        if self.job['job_type'] == 'batch':
+            csv_paths = sorted(source_path.glob('*.csv'))
+        else:
+            csv_paths = [source_path / payload['stock_file']]
+
+        self.progress.update(symbols_total=len(csv_paths), symbols_done=0)
+        self.flush(force=True)
+        results = []
+        # 批量任务使用静默回测模式，策略循环日志只采样输出
+        quiet = self.job['job_type'] == 'batch' and settings.LOG_QUIET_BATCH
+        with quiet_backtest(quiet):
+            for csv_path in csv_paths:
+                self.progress.update(current_symbol=csv_path.name, bars_done=0, bars_total=0)
+                self.flush(force=True)
+                result = run_backtest_enhanced_volume_strategy(csv_path, strategy_class, init_cash,
+                                                               progress_callback=self.on_bar,
+                                                               profile=payload.get('profile'),
+                                                               force=bool(payload.get('force')),
+                                                               low_memory=payload.get('low_memory'))
+                if result:
+                    results.append(result)
+                self.progress['symbols_done'] += 1
+        self.progress['current_symbol'] = None
+        self.flush(force=True)
+
+        if self.job['job_type'] == 'batch':
+            return {'results': results, 'symbols_success': len(results), 'symbols_total': len(csv_paths),
+                    'symbols_cached': sum(1 for result in results if result.get('cached'))}
+        if not results:
+            raise RuntimeError('回测失败，未生成回测结果')
+        return results[0]
+
+
+def execute_job(queue, job):
+    """执行一个已领取的回测任务并记录结果"""
+    from core.quant.quant_manage import BacktestCancelled
+    start = time.perf_counter()
+    status = JOB_STATUS_FAILED
+    try:
+        result = _JobRunner(queue, job).run()
+        queue.finish(job['id'], JOB_STATUS_SUCCESS, result=result)
+        status = JOB_STATUS_SUCCESS
+    except BacktestCancelled:
+        queue.finish(job['id'], JOB_STATUS_CANCELLED, error='任务已取消')
+        status = JOB_STATUS_CANCELLED
+    except Exception as e:
+        logger.error(f"回测任务执行失败: {job['id']}, {str(e)}")
+        queue.finish(job['id'], JOB_STATUS_FAILED, error=str(e))
+    finally:
+        backtest_job_duration.observe(time.perf_counter() - start, job_type=job['job_type'], status=status)
+        # 工作进程任务间隔可能很长，任务结束后立即写出指标快照
+        metrics_registry.flush()
+
+
+def run_worker(poll_interval=1.0, db_path=None):
+    """
+    回测工作进程主循环：领取排队任务并执行
+    """
+    queue = BacktestJobQueue(db_path) if db_path else backtest_job_queue
+    # 工作进程名为 主机名:进程号，用于判断运行中任务的工作进程是否存活
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"回测工作进程启动: {worker_name}")
+    while True:
+        try:
+            job = queue.claim_next(worker_name)
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            logger.info(f"{worker_name} 领取回测任务: {job['id']}")
+            execute_job(queue, job)
+        except Exception as e:
+            logger.error(f"回测工作进程错误: {str(e)}")
+            time.sleep(poll_interval)
+
+
+def start_workers(count=None):
+    """
+    启动回测工作进程（守护进程），启动前将工作进程已退出的运行中任务标记为失败
+
+    Returns:
+        list: 工作进程列表
+    """
+    count = settings.BACKTEST_WORKERS if count is None else count
+    backtest_job_queue.recover_interrupted()
+    workers = []
+    for i in range(count):
+        process = multiprocessing.Process(target=run_worker, daemon=True)
+        process.start()
+        workers.append(process)
+    logger.info(f"启动 {count} 个回测工作进程")
+    return workers
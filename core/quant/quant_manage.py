@@ -3,8 +3,17 @@ import os
 import backtrader as bt
 import pandas as pd
 
-from common.logger import create_log
+from common.logger import create_log, quiet_backtest
 from common.time_key import get_current_time
+from common.util_static import precompress_file
+from common.util_metrics import backtest_phase_duration
+from common.util_profile import PhaseTimer, profile_to_file
+from common.util_records import ColumnarRecords
+from core.quant.result_catalog import register_backtest_result, register_run_data
+from core.quant import result_cache
+from core.quant.run_store import save_run
+from core.quant.stream_feed import StreamingCsvData
+from core.signal.signal_store import register_signal_file
 from core.strategy.trading.trading_commition import CommissionFactory
 from core.visualization.visual_tools_plotly import plotly_draw
 from pathlib import Path
@@ -13,20 +22,181 @@ import settings
 logger = create_log('quant_manage')
 
 
-def run_backtest_enhanced_volume_strategy_multi(kline_csv_folder_path, trading_strategy: bt.Strategy, init_cash=settings.INIT_CASH):
+class BacktestCancelled(Exception):
+    """回测被取消（由进度回调抛出，中断cerebro.run）"""
+
+
+class BacktestProgressAnalyzer(bt.Analyzer):
+    """
+    回测进度分析器，每处理一根K线调用一次进度回调：callback(bars_done, bars_total)
+    回调可以抛出BacktestCancelled中断回测
+    """
+    params = (
+        ('callback', None),
+        ('bars_total', 0),
+    )
+
+    def start(self):
+        self.bars_done = 0
+
+    def prenext(self):
+        self.next()
+
+    def next(self):
+        self.bars_done += 1
+        if self.p.callback:
+            self.p.callback(self.bars_done, self.p.bars_total)
+
+
+class EquityCurveAnalyzer(bt.Analyzer):
+    """
+    每日资产曲线：每个交易日记录一次总资产、现金与持仓数量（列式记录，见common.util_records）
+    分钟级K线只保留每天最后一根K线时的值，记录数与交易日数成正比而不是K线数
+    """
+
+    def start(self):
+        self.records = ColumnarRecords((('date', 'date'), ('value', 'float64'), ('cash', 'float64'),
+                                        ('position', 'float64')))
+        self._pending = None
+
+    def next(self):
+        broker = self.strategy.broker
+        date = self.data.datetime.date(0)
+        if self._pending is not None and self._pending[0] != date:
+            self.records.append(*self._pending)
+        self._pending = (date, broker.getvalue(), broker.getcash(), self.strategy.position.size)
+
+    def stop(self):
+        if self._pending is not None:
+            self.records.append(*self._pending)
+            self._pending = None
+
+    def get_analysis(self):
+        return self.records
+
+
+def run_backtest_enhanced_volume_strategy_multi(kline_csv_folder_path, trading_strategy: bt.Strategy, init_cash=settings.INIT_CASH,
+                                                force=False, low_memory=None):
     """
     批量运行增强成交量策略回测
     :param kline_csv_folder_path: 包含CSV文件的文件夹路径
     :param trading_strategy: 交易策略类
     :param init_cash: 初始资金
+    :param force: 忽略回测结果缓存强制重新回测
+    :param low_memory: 是否使用低内存回测模式，None时按配置与CSV大小决定（见use_low_memory）
     """
     folder = Path(kline_csv_folder_path)
-    for kline_csv_path in folder.glob("*.csv"):
-        run_backtest_enhanced_volume_strategy(kline_csv_path, trading_strategy, init_cash)
+    with quiet_backtest(settings.LOG_QUIET_BATCH):
+        for kline_csv_path in folder.glob("*.csv"):
+            run_backtest_enhanced_volume_strategy(kline_csv_path, trading_strategy, init_cash, force=force,
+                                                  low_memory=low_memory)
+
+def build_cerebro(data, trading_strategy, init_cash=settings.INIT_CASH, low_memory=False):
+    """
+    创建回测引擎：加载数据、按市场配置佣金与滑点、添加策略和分析器
+    :param data: 数据源（get_data_form_csv / dataframe_to_feed / get_data_stream 的返回值）
+    :param trading_strategy: 交易策略类
+    :param init_cash: 初始资金
+    :param low_memory: 低内存模式：exactbars只保留计算所需的最少K线，逐根K线计算指标（runonce=False），不添加观察器
+    :return: bt.Cerebro
+    """
+    if isinstance(data, StreamingCsvData):
+        market = data.market
+    else:
+        market_series = data.p.dataname.get('market', pd.Series(['HK']))
+        market = market_series.iloc[0] if not market_series.empty else None
+
+    if low_memory:
+        # 观察器（Broker/BuySell/Trades）只用于cerebro.plot，报告由plotly_draw生成，不需要
+        cerebro = bt.Cerebro(exactbars=settings.BACKTEST_EXACTBARS, runonce=False, stdstats=False)
+    else:
+        cerebro = bt.Cerebro()
+    cerebro.adddata(data)
+    cerebro.broker.set_cash(init_cash)  # 设置初始资金
+    commission = CommissionFactory.get_commission(market)   # 获取对应市场的佣金配置
+    cerebro.broker.addcommissioninfo(commission)
+    cerebro.broker.set_slippage_fixed(commission.p.slippage)  # 设置固定滑点
+    cerebro.broker.set_coc(True)    # 当设置为True时，Backtrader会使用当前交易日的收盘价来执行订单，而不是默认的下一个交易日的开盘价
+    logger.info(f"【资金配置】初始资金：{init_cash:,.2f} 港元 | 佣金率：{commission.p.commission:.2f}% | 滑点：{commission.p.slippage:.2f} 港元")
+    logger.info("=" * 60)
+
+    # 添加策略和分析器
+    cerebro.addstrategy(trading_strategy)
+    cerebro.addanalyzer(bt.analyzers.TimeReturn, _name="total_return", timeframe=bt.TimeFrame.NoTimeFrame)
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="trade_analyzer")
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe_ratio", timeframe=bt.TimeFrame.Days, riskfreerate=0.03)
+    if not low_memory:
+        # AnnualReturn在回测结束时回溯全部K线，exactbars只保留最近几根K线时无法使用（其结果未被读取）
+        cerebro.addanalyzer(bt.analyzers.AnnualReturn, _name="annual_return")
+    cerebro.addanalyzer(EquityCurveAnalyzer, _name="equity_curve")
+    return cerebro
+
+
+def use_low_memory(csv_path):
+    """是否使用低内存回测模式：settings.BACKTEST_LOW_MEMORY开启，或K线CSV超过BACKTEST_LOW_MEMORY_MIN_MB"""
+    if settings.BACKTEST_LOW_MEMORY:
+        return True
+    if not settings.BACKTEST_LOW_MEMORY_MIN_MB:
+        return False
+    try:
+        return os.path.getsize(csv_path) >= settings.BACKTEST_LOW_MEMORY_MIN_MB * 1024 * 1024
+    except OSError:
+        return False
+
 
-def run_backtest_enhanced_volume_strategy(csv_path, trading_strategy: bt.Strategy, init_cash=settings.INIT_CASH):
+def run_backtest_enhanced_volume_strategy(csv_path, trading_strategy: bt.Strategy, init_cash=settings.INIT_CASH,
+                                          progress_callback=None, profile=None, force=False, low_memory=None):
+    """
+    运行单只股票回测
+    :param csv_path: K线CSV文件路径
+    :param trading_strategy: 交易策略类
+    :param init_cash: 初始资金
+    :param progress_callback: 进度回调 callback(bars_done, bars_total)，可抛出BacktestCancelled取消回测
+    :param profile: 是否使用cProfile分析本次回测，默认取settings.BACKTEST_PROFILE；
+                    分析结果保存在报告旁（stock_with_trades_<time>.prof 及 .prof.txt）
+    :param force: 忽略回测结果缓存强制重新回测（默认输入未变化时复用上次结果，见result_cache）
+    :param low_memory: 是否使用低内存回测模式（分块读取CSV + exactbars），None时按配置与CSV大小决定（见use_low_memory）；
+                       两种模式的回测结果相同，缓存键不区分
+    :return: 回测结果字典（html_path, result_path, signal_path, run_data_path, bars, timings, profile_path, cached,
+             low_memory），失败返回None
+    """
+    profile = settings.BACKTEST_PROFILE if profile is None else profile
+    # 性能分析需要真实执行回测，不使用缓存
+    key = None
+    if settings.BACKTEST_CACHE_ENABLED and not profile:
+        try:
+            key = result_cache.cache_key(csv_path, trading_strategy, init_cash,
+                                         pipeline=run_backtest_enhanced_volume_strategy)
+        except Exception as e:
+            logger.warning(f"计算回测缓存键失败，不使用缓存：{str(e)}")
+        cached = result_cache.lookup(key) if key and not force else None
+        if cached is not None:
+            if progress_callback:
+                progress_callback(cached.get('bars', 0), cached.get('bars', 0))
+            return cached
+    low_memory = use_low_memory(csv_path) if low_memory is None else bool(low_memory)
     current_time = get_current_time()
     relative_path = str(csv_path).replace(str(settings.stock_data_root) + '/', '')
+    html_file_path = settings.html_root / relative_path.rsplit('.', 1)[0] / trading_strategy.__name__
+    profile_path = html_file_path / f"stock_with_trades_{current_time}.prof" if profile else None
+    with profile_to_file(profile_path, enabled=bool(profile)):
+        result = _run_backtest(csv_path, trading_strategy, init_cash, progress_callback, current_time, relative_path,
+                               low_memory)
+    if result is not None:
+        result['profile_path'] = str(profile_path) if profile_path else None
+        result['cached'] = False
+        if key:
+            try:
+                result_cache.store(key, result)
+            except Exception as e:
+                logger.warning(f"登记回测结果缓存失败：{str(e)}")
+    return result
+
+
+def _run_backtest(csv_path, trading_strategy, init_cash, progress_callback, current_time, relative_path,
+                  low_memory=False):
+    timer = PhaseTimer()
     logger.info("=" * 60)
     logger.info("【程序启动】VolumeIndicatorStrategy回测程序")
     logger.info(f"【目标文件】{csv_path}")
@@ -36,50 +206,41 @@ def run_backtest_enhanced_volume_strategy(csv_path, trading_strategy: bt.Strateg
     logger.info("【回测配置】开始初始化回测参数")
     # 加载数据
     try:
-        data = get_data_form_csv(csv_path)
+        data = get_data_stream(csv_path) if low_memory else get_data_form_csv(csv_path)
     except Exception as e:
         logger.warning(f"【回测终止】数据加载失败：{str(e)}")
         return
     # 检查数据量
-    data_length = len(data.p.dataname)
-    logger.info(f"【数据检查】有效数据量：{data_length} 天")
+    data_length, start_date, end_date = data_range(data)
+    logger.info(f"【数据检查】有效数据量：{data_length} 天{'（低内存模式）' if low_memory else ''}")
     if data_length < 50:
         logger.info(f"【风险提示】数据量较少，可能影响策略信号有效性！")
+    timer.lap('csv_load')
 
-    market_series = data.p.dataname.get('market', pd.Series(['HK']))
-    market = market_series.iloc[0] if not market_series.empty else None
-
-    cerebro = bt.Cerebro()
-    cerebro.adddata(data)
-    cerebro.broker.set_cash(init_cash)  # 设置初始资金
-    commission = CommissionFactory.get_commission(market)   # 获取对应市场的佣金配置
-    cerebro.broker.addcommissioninfo(commission)
-    cerebro.broker.set_slippage_fixed(commission.p.slippage)  # 设置固定滑点
-    cerebro.broker.set_coc(True)    # 当设置为True时，Backtrader会使用当前交易日的收盘价来执行订单，而不是默认的下一个交易日的开盘价
-    logger.info(f"【资金配置】初始资金：{init_cash:,.2f} 港元 | 佣金率：{commission.p.commission:.2f}% | 滑点：{commission.p.slippage:.2f} 港元")
-    logger.info("=" * 60)
-
-    # 添加策略和分析器
-    cerebro.addstrategy(trading_strategy)
-    cerebro.addanalyzer(bt.analyzers.TimeReturn, _name="total_return", timeframe=bt.TimeFrame.NoTimeFrame)
-    cerebro.addanalyzer(bt.analyzers.DrawDown, _name="drawdown")
-    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name="trade_analyzer")
-    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name="sharpe_ratio", timeframe=bt.TimeFrame.Days, riskfreerate=0.03)
-    cerebro.addanalyzer(bt.analyzers.AnnualReturn, _name="annual_return")
+    cerebro = build_cerebro(data, trading_strategy, init_cash, low_memory=low_memory)
+    if progress_callback:
+        cerebro.addanalyzer(BacktestProgressAnalyzer, _name="progress",
+                            callback=progress_callback, bars_total=data_length)
 
     # 启动回测
     logger.info(f"【回测启动】初始资金：{cerebro.broker.getcash():,.2f} 港元")
-    logger.info(f"【回测周期】：{data.p.dataname.index[0].date()} ~ {data.p.dataname.index[-1].date()}")
+    logger.info(f"【回测周期】：{start_date.date()} ~ {end_date.date()}")
     logger.info("=" * 60)
 
+    timer.lap('cerebro_setup')
+
     # 执行回测
     logger.info("【回测执行】正在运行回测...")
     try:
         results = cerebro.run()
+    except BacktestCancelled:
+        logger.warning("【回测取消】回测已被取消")
+        raise
     except Exception as e:
         logger.warning(f"【回测失败】执行出错：{str(e)}")
         return
     strategy = results[0]
+    timer.lap('cerebro_run')
 
     # 打印回测结果
     logger.info("【回测结果汇总】")
@@ -90,8 +251,6 @@ def run_backtest_enhanced_volume_strategy(csv_path, trading_strategy: bt.Strateg
         total_return = list(strategy.analyzers.total_return.get_analysis().values())[0] * 100
         final_cash = cerebro.broker.getvalue()
         # 计算年化收益
-        start_date = data.p.dataname.index[0]
-        end_date = data.p.dataname.index[-1]
         days = (end_date - start_date).days
         annual_return = (pow((1 + total_return/100), 365/days) - 1) * 100 if days > 0 else 0
         logger.info(f"1. 收益情况：总收益率={total_return:.2f}% | 年化收益={annual_return:.2f}% | 最终资金={final_cash:,.2f} 港元")
@@ -145,7 +304,10 @@ def run_backtest_enhanced_volume_strategy(csv_path, trading_strategy: bt.Strateg
     except Exception as e:
         logger.warning(f"5. 信号统计：无法计算 ({str(e)})")
 
+    timer.lap('analyzers')
+
     # 保存信号记录
+    signals_file_path = None
     try:
         if hasattr(strategy, 'indicator') and hasattr(strategy.indicator, 'signal_record_manager'):
             # 获取信号记录并转换为DataFrame
@@ -158,16 +320,53 @@ def run_backtest_enhanced_volume_strategy(csv_path, trading_strategy: bt.Strateg
                 signals_file_path = os.path.join(signal_file_folder, f"stock_signals_{current_time}.csv")
                 signals_df.to_csv(signals_file_path, index=False, encoding='utf-8-sig')
                 logger.info(f"6. 信号记录已保存至：{signals_file_path}")
+                # 登记到信号索引，刷新该股票+策略的最新信号视图
+                register_signal_file(os.path.relpath(signals_file_path, settings.signals_root), len(signals_df))
 
     except Exception as e:
         logger.warning(f"信号保存失败：{str(e)}")
 
+    timer.lap('signal_write')
+
     html_file_path = settings.html_root / relative_path.rsplit('.', 1)[0] / strategy.__class__.__name__
     html_file_name = f"stock_with_trades_{current_time}.html"
-    html_path = plotly_draw(csv_path, strategy, init_cash, html_file_name, html_file_path)
+    html_path = plotly_draw(csv_path, strategy, init_cash, html_file_name, html_file_path, timer=timer.child('plot'))
+    timer.lap('plot')
     logger.info(f"7. 回测可视化图表将保存至：{html_path}，对应股票数据：{csv_path}")
+    result_path = os.path.relpath(html_path, settings.html_root).replace(os.sep, '/')
+    # 登记到回测结果目录，供结果列表分页查询
+    register_backtest_result(result_path)
+    # 保存交易记录、资产曲线与运行元数据，之后的分析不需要重新回测
+    run_data_path = None
+    try:
+        run_meta = save_run(strategy, strategy.analyzers.equity_curve.get_analysis(), csv_path, result_path,
+                            init_cash)
+        register_run_data(run_meta)
+        run_data_path = run_meta['data_path']
+    except Exception as e:
+        logger.warning(f"运行数据保存失败：{str(e)}")
+    # 生成预压缩版本（gzip/brotli），查看报告时直接发送压缩文件
+    try:
+        precompress_file(html_path)
+    except OSError as e:
+        logger.warning(f"报告预压缩失败：{str(e)}")
+    timer.lap('publish')
+    timings = timer.as_dict()
+    for phase, seconds in timings.items():
+        if phase != 'total':
+            backtest_phase_duration.observe(seconds, phase=phase)
+    logger.info(f"8. 阶段耗时：{timer.summary()}")
     logger.info("=" * 60)
     logger.info("【回测结束】\n")
+    return {
+        'html_path': str(html_path),
+        'result_path': result_path,
+        'signal_path': signals_file_path,
+        'run_data_path': run_data_path,
+        'bars': data_length,
+        'timings': timings,
+        'low_memory': low_memory,
+    }
 
 
 
@@ -190,14 +389,39 @@ def get_data_form_csv(csv_path):
         parse_dates=['date'],  # 解析date列为datetime类型
         index_col='date'  # 将date列设为索引，方便按日期查询
     )
+    return dataframe_to_feed(df)
+
+
+def get_data_stream(csv_path):
+    """
+    分块读取K线CSV的数据源（低内存回测模式），不把整个文件读入内存，见core.quant.stream_feed
+    """
+    return StreamingCsvData(dataname=str(csv_path), timeframe=bt.TimeFrame.Days, compression=1)
+
+
+def data_range(data):
+    """
+    数据源的K线数量与首尾K线时间
+    :return: (K线数量, 首根K线时间, 最后一根K线时间)
+    """
+    if isinstance(data, StreamingCsvData):
+        return data.bars_total, data.first_date, data.last_date
+    df = data.p.dataname
+    return len(df), df.index[0], df.index[-1]
+
+
+class CustomPandasData(bt.feeds.PandasData):
+    params = (
+        ('datetime', None),
+        ('open', 'open'), ('high', 'high'), ('low', 'low'), ('close', 'close'), ('volume', 'volume'),('market', 'market'),
+        ('openinterest', -1)
+    )
 
-    class CustomPandasData(bt.feeds.PandasData):
-        params = (
-            ('datetime', None),
-            ('open', 'open'), ('high', 'high'), ('low', 'low'), ('close', 'close'), ('volume', 'volume'),('market', 'market'),
-            ('openinterest', -1)
-        )
 
+def dataframe_to_feed(df):
+    """
+    将以date为索引的K线DataFrame转换为回测数据源
+    """
     data_feed = CustomPandasData(dataname=df)
     data_feed.timeframe = bt.TimeFrame.Days
     data_feed.compression = 1
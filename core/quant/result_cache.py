@@ -0,0 +1,164 @@
+"""
+回测结果缓存
+
+前端、定时任务和批量回测经常重复执行输入完全相同的回测（同一CSV、同一策略代码、同一初始资金），
+每次都要完整回测并生成新的带时间戳的HTML报告和信号文件。回测结果按输入的内容键缓存：
+    K线CSV内容哈希 + 策略及回测流程源码哈希（含settings，见run_store.source_hash） + 策略参数 + 初始资金
+输入未变化时直接返回上次的回测结果（报告、信号、运行数据路径），可通过force强制重新回测。
+
+缓存登记在回测结果目录数据库中，按最近使用时间淘汰：条目数超过BACKTEST_CACHE_MAX_ENTRIES
+或其报告与运行数据总大小超过BACKTEST_CACHE_MAX_MB时，删除最久未使用的缓存登记。
+淘汰只影响是否复用，报告、运行数据仍保留在回测结果页面中（属于回测历史，不随缓存删除）；
+报告文件被删除后，对应的缓存条目在下次查找时失效。
+"""
+import datetime
+import hashlib
+import json
+import os
+import time
+
+import settings
+from common.logger import create_log
+from common.util_metrics import record_cache
+from common.util_sqlite import connect, transaction, init_schema
+from core.quant.run_store import file_hash, source_hash, run_data_path
+
+logger = create_log('result_cache')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backtest_result_cache (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    result TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_backtest_result_cache_used ON backtest_result_cache (last_used);
+"""
+
+_initialized = set()
+
+# 报告的预压缩文件（见util_static.precompress_file），计入条目大小
+_REPORT_SUFFIXES = ('', '.gz', '.br')
+_RUN_DATA_SUFFIXES = ('.npz', '.json')
+
+
+def _db():
+    db_path = str(settings.result_catalog_db)
+    if (os.getpid(), db_path) not in _initialized:
+        init_schema(db_path, _SCHEMA)
+        _initialized.add((os.getpid(), db_path))
+    return db_path
+
+
+def _artifact_paths(result_path):
+    """缓存条目占用的文件：HTML报告（含预压缩文件）与运行数据"""
+    report = os.path.join(str(settings.html_root), *str(result_path).split('/'))
+    run_data = run_data_path(result_path)
+    return [report + suffix for suffix in _REPORT_SUFFIXES] + [run_data + suffix for suffix in _RUN_DATA_SUFFIXES]
+
+
+def _size(paths):
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def cache_key(csv_path, strategy_class, init_cash, pipeline=None):
+    """
+    回测输入的内容键
+
+    参数:
+        csv_path: K线CSV文件路径
+        strategy_class: 策略类
+        init_cash: 初始资金
+        pipeline: 回测流程函数（其所在模块及引用的项目模块计入源码哈希，如报告生成代码变化后缓存失效）
+    """
+    # 类上的params为参数类（AutoInfoClass子类），_getpairs为类方法
+    params = dict(strategy_class.params._getpairs()) if hasattr(strategy_class, 'params') else {}
+    objects = [strategy_class] + ([pipeline] if pipeline is not None else [])
+    data = json.dumps([file_hash(csv_path), source_hash(*objects), strategy_class.__name__, params,
+                       float(init_cash)], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:32]
+
+
+def lookup(key):
+    """
+    查找缓存的回测结果，报告文件已不存在时视为未命中并移除条目
+
+    返回:
+        dict: 回测结果（cached为True），未命中返回None
+    """
+    conn = connect(_db())
+    row = conn.execute("SELECT path, result FROM backtest_result_cache WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        record_cache('backtest_result', False)
+        return None
+    result = json.loads(row['result'])
+    if not os.path.exists(result.get('html_path') or ''):
+        with transaction(_db()) as conn:
+            conn.execute("DELETE FROM backtest_result_cache WHERE key = ?", (key,))
+        record_cache('backtest_result', False)
+        return None
+    with transaction(_db()) as conn:
+        conn.execute("UPDATE backtest_result_cache SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                     (time.time(), key))
+    record_cache('backtest_result', True)
+    logger.info(f"回测输入未变化，复用上次回测结果: {row['path']}")
+    return dict(result, cached=True)
+
+
+def store(key, result):
+    """登记一次回测的结果并按需淘汰，返回淘汰的条目数"""
+    size = _size(_artifact_paths(result['result_path']))
+    with transaction(_db()) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO backtest_result_cache (key, path, result, size_bytes, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, result['result_path'], json.dumps(result, ensure_ascii=False, default=str), size,
+             datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'), time.time()))
+    return evict()
+
+
+def evict(max_entries=None, max_mb=None):
+    """
+    按最近使用时间淘汰超出上限的缓存条目（只删除缓存登记，不删除报告与运行数据）
+
+    返回:
+        int: 淘汰的条目数
+    """
+    max_entries = settings.BACKTEST_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    max_bytes = (settings.BACKTEST_CACHE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    conn = connect(_db())
+    rows = conn.execute(
+        "SELECT key, path, size_bytes FROM backtest_result_cache ORDER BY last_used DESC").fetchall()
+    kept_entries, kept_bytes = 0, 0
+    evicted = []
+    for row in rows:
+        # 从最近使用的条目开始保留，一旦超出上限，更早使用的条目全部淘汰
+        if not evicted and kept_entries < max_entries and kept_bytes + row['size_bytes'] <= max_bytes:
+            kept_entries += 1
+            kept_bytes += row['size_bytes']
+        else:
+            evicted.append(row)
+    if not evicted:
+        return 0
+    with transaction(_db()) as conn:
+        conn.executemany("DELETE FROM backtest_result_cache WHERE key = ?", [(row['key'],) for row in evicted])
+    logger.info(f"淘汰了 {len(evicted)} 个缓存的回测结果，保留 {kept_entries} 个，共 {kept_bytes / 1024 / 1024:.1f} MB")
+    return len(evicted)
+
+
+def stats():
+    """缓存条目数、总大小与命中次数"""
+    row = connect(_db()).execute(
+        "SELECT COUNT(*) AS entries, COALESCE(SUM(size_bytes), 0) AS size_bytes, COALESCE(SUM(hits), 0) AS hits "
+        "FROM backtest_result_cache").fetchone()
+    return {'entries': row['entries'], 'size_mb': round(row['size_bytes'] / 1024 / 1024, 2), 'hits': row['hits'],
+            'max_entries': settings.BACKTEST_CACHE_MAX_ENTRIES, 'max_mb': settings.BACKTEST_CACHE_MAX_MB}
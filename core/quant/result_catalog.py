@@ -0,0 +1,286 @@
+"""
+回测结果目录
+
+每次回测完成后将生成的HTML报告登记到SQLite目录表中，/get_backtest_results 直接按索引查询，
+不再在每次请求时遍历 html/<数据源>/<股票>/<策略>/ 目录。
+回测的运行数据（交易记录、资产曲线与元数据，见run_store）登记在backtest_run_data表中，与报告路径关联。
+分页支持两种方式：
+    page    传统页码（OFFSET），兼容旧前端
+    cursor  键集分页（run_time, path），翻页耗时与历史结果数量无关（不统计总数，总数只在第一页返回）
+股票筛选不区分大小写：带市场前缀的代码（如 HK.007）按stock_code前缀匹配，使用NOCASE排序规则的索引；
+其余输入（股票名称、不带市场前缀的代码）按股票目录名（代码_名称_日期范围）子串匹配。
+"""
+import datetime
+import os
+import re
+
+import settings
+from common.logger import create_log
+from common.util_sqlite import connect, transaction, init_schema
+
+logger = create_log('result_catalog')
+
+RESULT_FILE_PREFIX = 'stock_with_trades_'
+
+# 带市场前缀的股票代码（如 HK.00700、sh.600），可按stock_code索引前缀匹配
+_CODE_FILTER_PATTERN = re.compile(r'^[A-Za-z]+\.')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backtest_results (
+    path TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    stock TEXT NOT NULL,
+    stock_code TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    run_time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_backtest_results_time ON backtest_results (run_time, path);
+CREATE INDEX IF NOT EXISTS idx_backtest_results_source ON backtest_results (source, run_time, path);
+CREATE INDEX IF NOT EXISTS idx_backtest_results_strategy ON backtest_results (strategy, run_time, path);
+-- 股票代码前缀筛选（LIKE 'x%'）需要NOCASE排序规则的索引才能走索引
+DROP INDEX IF EXISTS idx_backtest_results_code;
+CREATE INDEX IF NOT EXISTS idx_backtest_results_code_nocase
+    ON backtest_results (stock_code COLLATE NOCASE, run_time, path);
+
+-- 回测运行数据（交易记录、资产曲线、元数据，见run_store），按HTML报告路径关联
+CREATE TABLE IF NOT EXISTS backtest_run_data (
+    path TEXT PRIMARY KEY,
+    data_path TEXT NOT NULL,
+    strategy_hash TEXT NOT NULL,
+    data_hash TEXT NOT NULL,
+    bars INTEGER NOT NULL,
+    trades INTEGER NOT NULL,
+    final_value REAL,
+    total_return REAL,
+    max_drawdown REAL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_backtest_run_data_inputs ON backtest_run_data (data_hash, strategy_hash);
+
+CREATE TABLE IF NOT EXISTS result_catalog_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_initialized = set()
+
+
+def _db():
+    db_path = str(settings.result_catalog_db)
+    if (os.getpid(), db_path) not in _initialized:
+        init_schema(db_path, _SCHEMA)
+        _initialized.add((os.getpid(), db_path))
+        row = connect(db_path).execute("SELECT value FROM result_catalog_meta WHERE key = 'synced'").fetchone()
+        if row is None:
+            sync_result_catalog()
+    return db_path
+
+
+def parse_result_path(relative_path):
+    """
+    从回测报告相对路径中解析元数据
+
+    参数:
+        relative_path: 相对html_root的路径，如 futu/HK.00700_腾讯控股_20220414_20260414/EnhancedVolumeStrategy/stock_with_trades_20260414_101010.html
+
+    返回:
+        元数据字典，路径格式不正确时返回None
+    """
+    parts = str(relative_path).replace('\\', '/').split('/')
+    if len(parts) != 4 or not parts[-1].endswith('.html'):
+        return None
+    return {
+        'path': '/'.join(parts),
+        'source': parts[0],
+        'stock': parts[1],
+        'stock_code': parts[1].split('_')[0],
+        'strategy': parts[2],
+        'run_time': _run_time(parts),
+    }
+
+
+def _run_time(parts):
+    """优先使用文件名中的回测时间，文件名不含时间时使用文件创建时间"""
+    file_name = parts[-1]
+    if file_name.startswith(RESULT_FILE_PREFIX):
+        try:
+            return datetime.datetime.strptime(file_name[len(RESULT_FILE_PREFIX):-len('.html')],
+                                              '%Y%m%d_%H%M%S').strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+    full_path = os.path.join(settings.html_root, *parts)
+    return datetime.datetime.fromtimestamp(os.path.getctime(full_path)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def register_backtest_result(relative_path):
+    """
+    登记一次回测生成的HTML报告
+
+    参数:
+        relative_path: 相对html_root的报告路径
+
+    返回:
+        bool: 是否登记成功
+    """
+    record = parse_result_path(relative_path)
+    if record is None:
+        logger.warning(f"回测报告路径格式不正确，跳过登记: {relative_path}")
+        return False
+    with transaction(_db()) as conn:
+        conn.execute(
+            """INSERT OR REPLACE INTO backtest_results (path, source, stock, stock_code, strategy, run_time)
+               VALUES (:path, :source, :stock, :stock_code, :strategy, :run_time)""",
+            record)
+    logger.info(f"登记回测报告: {record['path']}")
+    return True
+
+
+def register_run_data(meta):
+    """
+    登记一次回测的运行数据
+
+    参数:
+        meta: run_store.save_run 返回的元数据
+    """
+    summary = meta.get('summary') or {}
+    with transaction(_db()) as conn:
+        conn.execute(
+            """INSERT OR REPLACE INTO backtest_run_data
+               (path, data_path, strategy_hash, data_hash, bars, trades, final_value, total_return, max_drawdown,
+                created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (meta['result_path'], meta['data_path'], meta['strategy_hash'], meta['data_hash'], meta['bars'],
+             summary.get('trades', 0), summary.get('final_value'), summary.get('total_return'),
+             summary.get('max_drawdown'), meta['created_at']))
+
+
+def get_run_data(path):
+    """报告对应的运行数据登记，未登记时返回None"""
+    row = connect(_db()).execute("SELECT * FROM backtest_run_data WHERE path = ?", (path,)).fetchone()
+    return dict(row) if row else None
+
+
+def sync_result_catalog():
+    """
+    扫描html目录，补登记目录中缺失的报告、移除已不存在的报告
+
+    返回:
+        int: 目录中的报告数量
+    """
+    db_path = str(settings.result_catalog_db)
+    init_schema(db_path, _SCHEMA)
+    on_disk = set()
+    if os.path.exists(settings.html_root):
+        for root, dirs, files in os.walk(settings.html_root):
+            for file in files:
+                if file.endswith('.html'):
+                    on_disk.add(os.path.relpath(os.path.join(root, file), settings.html_root).replace(os.sep, '/'))
+
+    with transaction(db_path) as conn:
+        indexed = {row['path'] for row in conn.execute("SELECT path FROM backtest_results")}
+        conn.executemany("DELETE FROM backtest_results WHERE path = ?", [(p,) for p in indexed - on_disk])
+        conn.executemany("DELETE FROM backtest_run_data WHERE path = ?", [(p,) for p in indexed - on_disk])
+        for path in on_disk - indexed:
+            record = parse_result_path(path)
+            if record:
+                conn.execute(
+                    """INSERT OR REPLACE INTO backtest_results (path, source, stock, stock_code, strategy, run_time)
+                       VALUES (:path, :source, :stock, :stock_code, :strategy, :run_time)""",
+                    record)
+        conn.execute("INSERT OR REPLACE INTO result_catalog_meta (key, value) VALUES ('synced', ?)",
+                     (datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+        total = conn.execute("SELECT COUNT(*) FROM backtest_results").fetchone()[0]
+    logger.info(f"回测结果目录同步完成，共 {total} 个报告")
+    return total
+
+
+def encode_cursor(row):
+    return f"{row['run_time']}|{row['path']}"
+
+
+def decode_cursor(cursor):
+    run_time, _, path = str(cursor).partition('|')
+    return run_time, path
+
+
+def query_backtest_results(stock=None, source=None, strategy=None, date_start=None, date_end=None,
+                           page=1, page_size=20, cursor=None):
+    """
+    查询回测结果，按运行时间倒序
+
+    参数:
+        stock: 股票筛选（不区分大小写）：带市场前缀的代码按前缀匹配（如 HK.007），其余按股票名称/代码子串匹配
+        source: 数据源筛选
+        strategy: 策略筛选
+        date_start: 开始日期 YYYY-MM-DD（包含）
+        date_end: 结束日期 YYYY-MM-DD（包含）
+        page: 页码，未提供cursor时使用
+        page_size: 每页条数
+        cursor: 上一页返回的next_cursor，提供时使用键集分页
+
+    返回:
+        dict: results, page, total_pages, total, next_cursor；使用cursor时不统计总数，total与total_pages为None
+    """
+    conditions = []
+    params = []
+    if source:
+        conditions.append("source = ?")
+        params.append(source)
+    if strategy:
+        conditions.append("strategy = ?")
+        params.append(strategy)
+    if stock:
+        stock = stock.strip()
+        escaped = stock.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        if _CODE_FILTER_PATTERN.match(stock):
+            conditions.append("stock_code LIKE ? ESCAPE '\\'")
+            params.append(f"{escaped}%")
+        else:
+            conditions.append("stock LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+    if date_start:
+        conditions.append("run_time >= ?")
+        params.append(date_start)
+    if date_end:
+        conditions.append("run_time <= ?")
+        params.append(f"{date_end} 23:59:59")
+
+    conn = connect(_db())
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    # 键集翻页时不再统计总数（COUNT需要扫描全部匹配行），前端沿用第一页返回的总数
+    total = None if cursor else conn.execute(f"SELECT COUNT(*) FROM backtest_results{where}", params).fetchone()[0]
+
+    page_conditions = list(conditions)
+    page_params = list(params)
+    offset = 0
+    if cursor:
+        run_time, path = decode_cursor(cursor)
+        page_conditions.append("(run_time < ? OR (run_time = ? AND path < ?))")
+        page_params.extend([run_time, run_time, path])
+    else:
+        offset = (page - 1) * page_size
+    page_where = f" WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+    rows = conn.execute(
+        f"""SELECT path, source, stock, strategy, run_time,
+                   (SELECT data_path FROM backtest_run_data d WHERE d.path = backtest_results.path) AS data_path
+            FROM backtest_results{page_where}
+            ORDER BY run_time DESC, path DESC LIMIT ? OFFSET ?""",
+        page_params + [page_size, offset]).fetchall()
+
+    results = [{
+        'stock': row['stock'],
+        'source': row['source'],
+        'strategy': row['strategy'],
+        'run_time': row['run_time'],
+        'path': row['path'],
+        # 运行数据（交易记录、资产曲线）的路径，旧报告没有运行数据时为None
+        'run_data': row['data_path'],
+    } for row in rows]
+    return {
+        'results': results,
+        'page': page,
+        'total_pages': (total + page_size - 1) // page_size if total is not None else None,
+        'total': total,
+        'next_cursor': encode_cursor(rows[-1]) if len(rows) == page_size else None,
+    }
@@ -0,0 +1,213 @@
+"""
+回测运行数据
+
+每次回测除信号CSV和HTML报告外，另外保存交易记录、每日资产曲线（列式NumPy数组，.npz）与运行元数据（.json）：
+    <run_data_root>/<数据源>/<股票>/<策略>/stock_with_trades_<时间>.npz
+    <run_data_root>/<数据源>/<股票>/<策略>/stock_with_trades_<时间>.json
+路径与HTML报告一一对应，并登记到回测结果目录（result_catalog.backtest_run_data）。
+之后的分析（手续费假设、组合汇总、重新生成报告）直接读取这些数据，不需要重新回测。
+
+元数据包含策略/指标参数、策略源码哈希（策略、指标及其引用的项目模块的源码）与K线数据哈希，可判断两次回测的输入是否相同。
+"""
+import datetime
+import hashlib
+import inspect
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import settings
+from common.logger import create_log
+
+logger = create_log('run_store')
+
+# 运行数据格式变化时递增
+RUN_DATA_VERSION = 1
+
+# 保存到.npz中的列，数组名为 trade_<列名> 与 equity_<列名>；字符串列保存为定长Unicode数组（读取时不需要pickle）
+_TRADE_COLUMNS = ('date', 'trade_id', 'action', 'price', 'size', 'total_amount', 'commission', 'order_type', 'status')
+_EQUITY_COLUMNS = ('date', 'value', 'cash', 'position')
+
+
+def file_hash(path):
+    """文件内容的sha256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _project_modules(*objects):
+    """
+    对象（类取其所有基类）所在的项目模块，以及这些模块递归引用的项目模块（不含backtrader等第三方模块），按模块路径排序
+
+    策略模块引用的指标类、settings等都会包含在内，任何一处源码变化都会改变哈希
+    """
+    root = os.path.abspath(str(settings.project_root))
+    pending = []
+    for obj in objects:
+        pending.extend(klass.__module__ for klass in (inspect.getmro(obj) if inspect.isclass(obj) else [obj]))
+    modules = {}
+    while pending:
+        name = pending.pop()
+        if name in modules:
+            continue
+        module = sys.modules.get(name)
+        file_path = getattr(module, '__file__', None)
+        if not file_path or not os.path.abspath(file_path).startswith(root) or 'site-packages' in file_path:
+            continue
+        modules[name] = module
+        for value in vars(module).values():
+            if inspect.ismodule(value):
+                pending.append(value.__name__)
+            elif inspect.isclass(value) or inspect.isfunction(value):
+                pending.append(value.__module__)
+    return [modules[name] for name in sorted(modules)]
+
+
+def source_hash(*objects):
+    """对象所在项目模块及其引用的项目模块的源码哈希（见_project_modules）"""
+    digest = hashlib.sha256()
+    for module in _project_modules(*objects):
+        digest.update(module.__name__.encode('utf-8'))
+        try:
+            digest.update(inspect.getsource(module).encode('utf-8'))
+        except (OSError, TypeError):
+            pass
+    return digest.hexdigest()
+
+
+def strategy_source_hash(strategy):
+    """
+    策略源码哈希：策略类、指标类及它们引用的项目模块的源码
+
+    参数:
+        strategy: 策略实例（或策略类）
+    """
+    classes = [strategy if isinstance(strategy, type) else type(strategy)]
+    indicator = getattr(strategy, 'indicator', None)
+    if indicator is not None and not isinstance(strategy, type):
+        classes.append(type(indicator))
+    return source_hash(*classes)
+
+
+def _params(obj):
+    """backtrader对象的参数字典"""
+    params = getattr(obj, 'params', None)
+    return dict(params._getkwargs()) if params is not None and hasattr(params, '_getkwargs') else {}
+
+
+def _summary(equity, trades, init_cash):
+    """由资产曲线与交易记录计算的汇总指标（与分析器无关，分析器失败时也可用）"""
+    values = equity['value']
+    if not len(values):
+        return {}
+    peak = np.maximum.accumulate(values)
+    drawdown = (peak - values) / np.where(peak > 0, peak, 1)
+    return {
+        'final_value': float(values[-1]),
+        'total_return': float(values[-1] / init_cash - 1) if init_cash else None,
+        'max_drawdown': float(drawdown.max()),
+        'trades': int(len(trades['date'])),
+        'buys': int(np.count_nonzero(trades['action'] == 'B')),
+        'sells': int(np.count_nonzero(trades['action'] == 'S')),
+        'commission': float(trades['commission'].sum()),
+    }
+
+
+def run_data_path(result_path):
+    """HTML报告的相对路径 -> 运行数据路径（不含扩展名）"""
+    stem = str(result_path).replace('\\', '/').rsplit('.', 1)[0]
+    return os.path.join(str(settings.run_data_root), *stem.split('/'))
+
+
+def save_run(strategy, equity_records, csv_path, result_path, init_cash):
+    """
+    保存一次回测的交易记录、资产曲线与元数据
+
+    参数:
+        strategy: 回测完成后的策略实例
+        equity_records: 资产曲线记录（ColumnarRecords，列为date/value/cash/position）
+        csv_path: K线CSV文件路径
+        result_path: HTML报告相对html_root的路径（运行数据与之对应）
+        init_cash: 初始资金
+
+    返回:
+        dict: 元数据（含data_path：相对run_data_root的运行数据路径，不含扩展名）
+    """
+    base_path = run_data_path(result_path)
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+
+    trade_records = strategy.trade_record_manager.records
+    trades = {name: trade_records.column(name) for name in _TRADE_COLUMNS}
+    equity = {name: equity_records.column(name) for name in _EQUITY_COLUMNS}
+    arrays = {}
+    for prefix, columns in (('trade', trades), ('equity', equity)):
+        for name, values in columns.items():
+            # 字符串列（object）转为定长Unicode数组
+            arrays[f"{prefix}_{name}"] = values.astype(str) if values.dtype == object else values
+
+    indicator = getattr(strategy, 'indicator', None)
+    dates = equity['date']
+    meta = {
+        'version': RUN_DATA_VERSION,
+        'result_path': str(result_path).replace('\\', '/'),
+        'data_path': os.path.relpath(base_path, str(settings.run_data_root)).replace(os.sep, '/'),
+        'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'strategy': type(strategy).__name__,
+        'strategy_params': _params(strategy),
+        'indicator': type(indicator).__name__ if indicator is not None else None,
+        'indicator_params': _params(indicator) if indicator is not None else {},
+        'strategy_hash': strategy_source_hash(strategy),
+        'data_file': os.path.relpath(str(csv_path), str(settings.stock_data_root)).replace(os.sep, '/'),
+        'data_hash': file_hash(csv_path),
+        'init_cash': init_cash,
+        'bars': int(len(dates)),
+        'start_date': str(dates[0].astype('datetime64[D]')) if len(dates) else None,
+        'end_date': str(dates[-1].astype('datetime64[D]')) if len(dates) else None,
+        'summary': _summary(equity, trades, init_cash),
+    }
+
+    # 先写临时文件再替换，读取方不会看到不完整的文件；npz写入成功后才写入元数据
+    tmp_path = f"{base_path}.{os.getpid()}.tmp.npz"
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, f"{base_path}.npz")
+    tmp_path = f"{base_path}.{os.getpid()}.tmp.json"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=1, default=str)
+    os.replace(tmp_path, f"{base_path}.json")
+    return meta
+
+
+def _frame(data, prefix, columns):
+    frame = pd.DataFrame({name: data[f"{prefix}_{name}"] for name in columns})
+    # 日期按自1970-01-01起的天数保存，与transform_to_dataframe的date列相同（datetime64[s]）
+    frame['date'] = (frame['date'].to_numpy(dtype=np.int64) * 86400).view('datetime64[s]')
+    return frame
+
+
+def load_run(result_path):
+    """
+    读取一次回测的运行数据
+
+    参数:
+        result_path: HTML报告相对html_root的路径
+
+    返回:
+        dict: {'meta': 元数据, 'trades': 交易记录DataFrame, 'equity': 资产曲线DataFrame}，运行数据不存在时返回None
+    """
+    base_path = run_data_path(result_path)
+    try:
+        with open(f"{base_path}.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with np.load(f"{base_path}.npz", allow_pickle=False) as data:
+            trades = _frame(data, 'trade', _TRADE_COLUMNS)
+            equity = _frame(data, 'equity', _EQUITY_COLUMNS)
+    except FileNotFoundError:
+        return None
+    return {'meta': meta, 'trades': trades, 'equity': equity}
+
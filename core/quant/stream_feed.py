@@ -0,0 +1,103 @@
+"""
+分块读取的K线数据源（低内存回测模式）
+
+get_data_form_csv把整个CSV读入DataFrame再交给PandasData，分钟级或几十年的K线在多个回测进程中并行回测时，
+每个进程的内存都随K线数量线性增长。StreamingCsvData按块（BACKTEST_STREAM_CHUNK_ROWS行）读取CSV，
+每块只取出日期与价格、成交量几列后逐行交给backtrader，任一时刻只保留一块数据；配合cerebro的exactbars
+（见quant_manage.build_cerebro），数据与指标的线对象也只保留计算所需的最近几根K线，回测内存基本与K线总数无关。
+"""
+from array import array
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+from backtrader.utils import date2num
+
+import settings
+
+# 交给backtrader的价格/成交量列（其余列如amount、stock_name不读取）
+_PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def scan_csv(csv_path, chunksize=None):
+    """
+    分块扫描K线CSV的日期列，不加载整个文件
+
+    参数:
+        csv_path: K线CSV文件路径
+        chunksize: 每块行数，默认settings.BACKTEST_STREAM_CHUNK_ROWS
+
+    返回:
+        (K线数量, 首根K线时间, 最后一根K线时间, 市场)；没有K线时时间为None，
+        市场取首行的market列（没有该列时为HK，与build_cerebro读取DataFrame时一致）
+    """
+    chunksize = chunksize or settings.BACKTEST_STREAM_CHUNK_ROWS
+    bars, first, last = 0, None, None
+    with pd.read_csv(csv_path, usecols=['date'], parse_dates=['date'], chunksize=chunksize) as reader:
+        for chunk in reader:
+            if chunk.empty:
+                continue
+            if first is None:
+                first = chunk['date'].iloc[0]
+            last = chunk['date'].iloc[-1]
+            bars += len(chunk)
+    head = pd.read_csv(csv_path, nrows=1)
+    if 'market' not in head:
+        market = 'HK'
+    else:
+        market = head['market'].iloc[0] if not head.empty else None
+    return bars, first, last, market
+
+
+class StreamingCsvData(bt.feed.DataBase):
+    """
+    用法:
+        data = StreamingCsvData(dataname=csv_path, timeframe=bt.TimeFrame.Days, compression=1)
+        data.bars_total, data.first_date, data.last_date, data.market  # 创建时分块扫描得到
+
+    K线按CSV中的顺序逐行交给backtrader（数据获取模块保存的CSV已按日期升序排列），与PandasData加载同一文件的结果相同
+    """
+    params = (
+        ('chunksize', None),
+    )
+
+    def __init__(self):
+        self.bars_total, self.first_date, self.last_date, self.market = scan_csv(self.p.dataname, self.p.chunksize)
+        self._reader = None
+
+    def start(self):
+        super().start()
+        self._reader = pd.read_csv(self.p.dataname, usecols=['date', *_PRICE_COLUMNS], parse_dates=['date'],
+                                   chunksize=self.p.chunksize or settings.BACKTEST_STREAM_CHUNK_ROWS)
+        self._datetimes, self._columns = None, None
+        self._pos, self._size = 0, 0
+
+    def stop(self):
+        super().stop()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def _next_chunk(self):
+        """读取下一块，没有更多K线时返回False"""
+        for chunk in self._reader:
+            if chunk.empty:
+                continue
+            # 逐行使用backtrader的date2num，与PandasData的日期数值完全一致（含分钟级时间）
+            dates = chunk['date'].to_numpy().astype('datetime64[us]').tolist()
+            self._datetimes = array('d', [date2num(dt) for dt in dates])
+            # array('d')每个值8字节，取值时得到Python float（exactbars下线对象的缓冲区是deque，会原样保存NumPy标量）
+            self._columns = [array('d', chunk[name].to_numpy(dtype=np.float64).tobytes()) for name in _PRICE_COLUMNS]
+            self._pos, self._size = 0, len(chunk)
+            return True
+        return False
+
+    def _load(self):
+        if self._pos >= self._size and not self._next_chunk():
+            return False
+        pos = self._pos
+        self.lines.datetime[0] = self._datetimes[pos]
+        for name, values in zip(_PRICE_COLUMNS, self._columns):
+            getattr(self.lines, name)[0] = values[pos]
+        self._pos = pos + 1
+        return True
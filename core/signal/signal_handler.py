@@ -1,17 +1,28 @@
 import datetime
 import os
 
+import pandas as pd
+
 from common.logger import create_log
-from common.util_csv import read_data, combine_data
+from common.util_csv import load_signal_data, combine_data
+from core.signal.signal_store import get_latest_signal_files
 from settings import signals_root
 logger = create_log('signal_handler')
 
-def signal_get():
-    """获取所有信号文件信息"""
+def signal_get(latest_only=False):
+    """
+    获取信号文件信息
+
+    参数:
+        latest_only: 为True时只返回每个（数据源, 股票, 策略）最近一次回测的信号文件
+    """
     try:
         if not os.path.exists(signals_root):
             raise Exception('信号目录不存在')
 
+        if latest_only:
+            return get_latest_signal_files()
+
         signal_files = []
         # 遍历信号目录
         for root, dirs, files in os.walk(signals_root):
@@ -48,61 +59,171 @@ def signal_get():
 
 
 
-def signals_analyze(file_paths, filters):
-    """分析信号文件"""
+def _parse_filters(filters):
+    """将前端传入的筛选条件转换为类型化的筛选条件"""
+    filters = filters or {}
+    start_date = pd.Timestamp(filters['start_date']) if filters.get('start_date') else None
+    end_date = pd.Timestamp(filters['end_date']) if filters.get('end_date') else None
+    # 只有日期没有时间时，结束日期包含当天
+    if end_date is not None and end_date == end_date.normalize():
+        end_date = end_date + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1)
+    return {
+        'strategy_name': filters.get('strategy_name') or None,
+        'stock_code': filters.get('stock_code') or None,
+        'signal_types': {filters['signal_type']} if filters.get('signal_type') else None,
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+
+
+def _parse_signal_file_path(file_path):
+    """从信号文件路径中提取元数据"""
+    parts = file_path.replace('\\', '/').split('/')
+    return {
+        'data_source': parts[0] if len(parts) > 0 else 'unknown',
+        'stock_info': parts[1] if len(parts) > 1 else 'unknown',
+        'strategy_name': parts[2] if len(parts) > 2 else 'unknown',
+    }
+
+
+def signals_analyze(file_paths, filters, root=None):
+    """
+    分析信号文件
+
+    策略、股票筛选条件直接作用于文件路径，不匹配的文件不读取；
+    信号类型、日期范围筛选在每个文件读取后立即执行，最后再合并
+
+    参数:
+        file_paths: 信号文件相对路径列表
+        filters: 筛选条件
+        root: 信号文件根目录，默认settings.signals_root
+
+    返回:
+        按日期倒序排列的DataFrame，date列为datetime类型
+    """
     try:
+        typed_filters = _parse_filters(filters)
         all_signals = []
+        found_files = 0
 
         for file_path in file_paths:
-            full_path = os.path.join(signals_root, file_path)
+            full_path = os.path.join(root or signals_root, file_path)
 
             if not os.path.exists(full_path):
                 continue
+            found_files += 1
 
-            # 读取CSV文件
-            df = read_data(full_path)
+            # 从文件路径中提取元数据，先按路径过滤，避免读取无关文件
+            meta = _parse_signal_file_path(file_path)
+            if typed_filters['strategy_name'] and meta['strategy_name'] != typed_filters['strategy_name']:
+                continue
+            if typed_filters['stock_code'] and typed_filters['stock_code'] not in meta['stock_info']:
+                continue
 
-            # 从文件路径中提取元数据
-            parts = file_path.split(os.sep)
-            data_source = parts[0] if len(parts) > 0 else 'unknown'
-            stock_info = parts[1] if len(parts) > 1 else 'unknown'
-            strategy_name = parts[2] if len(parts) > 2 else 'unknown'
+            # 读取CSV文件并立即过滤
+            df = load_signal_data(full_path,
+                                  signal_types=typed_filters['signal_types'],
+                                  start_date=typed_filters['start_date'],
+                                  end_date=typed_filters['end_date'])
+            if df.empty:
+                continue
 
             # 添加元数据到DataFrame
-            df['data_source'] = data_source
-            df['stock_info'] = stock_info
-            df['strategy_name'] = strategy_name
-            df['file_path'] = file_path
-
+            df = df.assign(file_path=file_path, **meta)
             all_signals.append(df)
 
-        if not all_signals:
+        if not found_files:
             raise Exception('没有找到有效的信号文件')
 
-        # 合并所有信号数据
-        combined_df = combine_data(all_signals, True)
-
-        # 应用筛选条件
-        if filters:
-            if 'strategy_name' in filters and filters['strategy_name']:
-                combined_df = combined_df[combined_df['strategy_name'] == filters['strategy_name']]
-
-            if 'stock_code' in filters and filters['stock_code']:
-                combined_df = combined_df[combined_df['stock_info'].str.contains(filters['stock_code'])]
-
-            if 'signal_type' in filters and filters['signal_type']:
-                combined_df = combined_df[combined_df['signal_type'] == filters['signal_type']]
-
-            # 添加时间范围筛选
-            if 'start_date' in filters and filters['start_date']:
-                combined_df = combined_df[combined_df['date'] >= filters['start_date']]
-
-            if 'end_date' in filters and filters['end_date']:
-                combined_df = combined_df[combined_df['date'] <= filters['end_date']]
+        if not all_signals:
+            return pd.DataFrame(columns=['date', 'signal_type', 'signal_description',
+                                         'data_source', 'stock_info', 'strategy_name', 'file_path'])
 
-        # 按时间倒序排序
-        combined_df = combined_df.sort_values(by='date', ascending=False)
+        # 合并所有信号数据，按时间倒序排序
+        combined_df = combine_data(all_signals, True)
+        combined_df = combined_df.sort_values(by='date', ascending=False, kind='stable')
         return combined_df
     except Exception as e:
         logger.error(f"分析信号失败: {str(e)}")
         raise Exception(f"分析信号失败: {str(e)}")
+
+
+def summarize_signals(df):
+    """
+    一次分组统计计算信号汇总信息
+
+    参数:
+        df: signals_analyze返回的DataFrame
+
+    返回:
+        汇总信息字典
+    """
+    summary = {
+        'total_signals': int(len(df)),
+        'buy_signals': 0,
+        'sell_signals': 0,
+        'neutral_signals': 0,
+        'unique_stocks': 0,
+        'unique_strategies': 0,
+        'date_range': '',
+        'signal_type_counts': {}
+    }
+    if df.empty:
+        return summary
+
+    # 只做一次分组，其余统计都从分组结果中推导
+    grouped = df.groupby(['signal_type', 'stock_info', 'strategy_name'], sort=False).size()
+    type_counts = grouped.groupby(level='signal_type', sort=False).sum()
+    signal_type_counts = {str(k): int(v) for k, v in type_counts.items()}
+    summary['signal_type_counts'] = signal_type_counts
+    for signal_type, count in signal_type_counts.items():
+        for keyword in ('buy', 'sell', 'neutral'):
+            if keyword in signal_type:
+                summary[f'{keyword}_signals'] += count
+    summary['unique_stocks'] = int(grouped.index.get_level_values('stock_info').nunique())
+    summary['unique_strategies'] = int(grouped.index.get_level_values('strategy_name').nunique())
+    summary['date_range'] = f"{df['date'].min():%Y-%m-%d} 至 {df['date'].max():%Y-%m-%d}"
+    return summary
+
+
+def signals_to_records(df):
+    """将信号DataFrame转换为可JSON序列化的记录列表，日期格式为YYYY-MM-DD"""
+    if df.empty:
+        return []
+    df = df.assign(date=df['date'].dt.strftime('%Y-%m-%d'))
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def signals_query(file_paths, filters, page=1, page_size=0, root=None):
+    """
+    信号查询：过滤、汇总并分页
+
+    参数:
+        file_paths: 信号文件相对路径列表
+        filters: 筛选条件
+        page: 页码，从1开始
+        page_size: 每页条数，0表示不分页返回全部
+        root: 信号文件根目录，默认settings.signals_root
+
+    返回:
+        {'signals': 当前页记录, 'summary': 汇总信息, 'page', 'page_size', 'total', 'total_pages'}
+    """
+    combined_df = signals_analyze(file_paths, filters, root)
+    total = len(combined_df)
+    page = max(1, int(page or 1))
+    page_size = max(0, int(page_size or 0))
+    if page_size:
+        start_idx = (page - 1) * page_size
+        page_df = combined_df.iloc[start_idx:start_idx + page_size]
+        total_pages = (total + page_size - 1) // page_size
+    else:
+        page_df = combined_df
+        total_pages = 1 if total else 0
+    return {
+        'signals': signals_to_records(page_df),
+        'summary': summarize_signals(combined_df),
+        'page': page,
+        'page_size': page_size,
+        'total': total,
+        'total_pages': total_pages,
+    }
@@ -0,0 +1,273 @@
+"""
+信号文件索引
+
+每次回测都会在 signals/<数据源>/<股票>/<策略>/ 下生成一个带时间戳的 stock_signals_<time>.csv，
+本模块维护一份SQLite索引：
+    signal_files    所有信号文件的元数据
+    latest_signals  物化视图，每个（数据源, 股票代码, 策略）只保留最近一次回测的信号文件
+日常信号检查只读取 latest_signals 指向的文件，避免重复读取和重复统计历史文件；
+compact_signal_files 负责清理被新回测取代的旧文件。
+"""
+import datetime
+import os
+
+import settings
+from common.logger import create_log
+from common.util_sqlite import connect, transaction, init_schema
+
+logger = create_log('signal_store')
+
+SIGNAL_FILE_PREFIX = 'stock_signals_'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signal_files (
+    file_path TEXT PRIMARY KEY,
+    data_source TEXT NOT NULL,
+    stock_info TEXT NOT NULL,
+    stock_code TEXT NOT NULL,
+    strategy_name TEXT NOT NULL,
+    run_time TEXT NOT NULL,
+    file_time TEXT NOT NULL,
+    row_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_signal_files_key
+    ON signal_files (data_source, stock_code, strategy_name, run_time);
+
+CREATE TABLE IF NOT EXISTS latest_signals (
+    data_source TEXT NOT NULL,
+    stock_code TEXT NOT NULL,
+    strategy_name TEXT NOT NULL,
+    stock_info TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    run_time TEXT NOT NULL,
+    file_time TEXT NOT NULL,
+    row_count INTEGER,
+    PRIMARY KEY (data_source, stock_code, strategy_name)
+);
+
+CREATE TABLE IF NOT EXISTS signal_index_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_initialized = set()
+
+
+def _db():
+    db_path = str(settings.signal_index_db)
+    if (os.getpid(), db_path) not in _initialized:
+        init_schema(db_path, _SCHEMA)
+        _initialized.add((os.getpid(), db_path))
+        if not _is_synced():
+            sync_signal_index()
+    return db_path
+
+
+def _is_synced():
+    row = connect(settings.signal_index_db).execute(
+        "SELECT value FROM signal_index_meta WHERE key = 'synced'").fetchone()
+    return row is not None
+
+
+def parse_signal_path(relative_path):
+    """
+    从信号文件相对路径中解析元数据
+
+    参数:
+        relative_path: 相对signals_root的路径，如 futu/HK.00700_腾讯控股_20220414_20260414/EnhancedVolumeStrategy/stock_signals_20260414_101010.csv
+
+    返回:
+        元数据字典，路径格式不正确时返回None
+    """
+    parts = str(relative_path).replace('\\', '/').split('/')
+    if len(parts) < 4:
+        return None
+    file_name = parts[-1]
+    if not (file_name.startswith(SIGNAL_FILE_PREFIX) and file_name.endswith('.csv')):
+        return None
+    stock_info = parts[1]
+    return {
+        'file_path': os.path.join(*parts),
+        'data_source': parts[0],
+        'stock_info': stock_info,
+        'stock_code': stock_info.split('_')[0],
+        'strategy_name': parts[2],
+        'run_time': file_name[len(SIGNAL_FILE_PREFIX):-len('.csv')],
+    }
+
+
+def _file_time(relative_path):
+    full_path = os.path.join(settings.signals_root, relative_path)
+    return datetime.datetime.fromtimestamp(os.path.getctime(full_path)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _upsert(conn, record):
+    conn.execute(
+        """INSERT OR REPLACE INTO signal_files
+           (file_path, data_source, stock_info, stock_code, strategy_name, run_time, file_time, row_count)
+           VALUES (:file_path, :data_source, :stock_info, :stock_code, :strategy_name, :run_time, :file_time, :row_count)""",
+        record)
+    conn.execute(
+        """INSERT INTO latest_signals
+           (data_source, stock_code, strategy_name, stock_info, file_path, run_time, file_time, row_count)
+           VALUES (:data_source, :stock_code, :strategy_name, :stock_info, :file_path, :run_time, :file_time, :row_count)
+           ON CONFLICT (data_source, stock_code, strategy_name) DO UPDATE SET
+               stock_info = excluded.stock_info,
+               file_path = excluded.file_path,
+               run_time = excluded.run_time,
+               file_time = excluded.file_time,
+               row_count = excluded.row_count
+           WHERE excluded.run_time >= latest_signals.run_time""",
+        record)
+
+
+def register_signal_file(relative_path, row_count=None):
+    """
+    登记一次回测新生成的信号文件，并刷新最新视图
+
+    参数:
+        relative_path: 相对signals_root的信号文件路径
+        row_count: 信号条数
+
+    返回:
+        bool: 是否登记成功
+    """
+    record = parse_signal_path(relative_path)
+    if record is None:
+        logger.warning(f"信号文件路径格式不正确，跳过登记: {relative_path}")
+        return False
+    record['file_time'] = _file_time(record['file_path'])
+    record['row_count'] = row_count
+    with transaction(_db()) as conn:
+        _upsert(conn, record)
+    logger.info(f"登记信号文件: {record['file_path']}")
+    return True
+
+
+def sync_signal_index():
+    """
+    扫描信号目录，补登记索引中缺失的文件、移除已不存在的文件，并重建最新视图
+
+    返回:
+        int: 索引中的信号文件数量
+    """
+    db_path = str(settings.signal_index_db)
+    init_schema(db_path, _SCHEMA)
+    on_disk = {}
+    if os.path.exists(settings.signals_root):
+        for root, dirs, files in os.walk(settings.signals_root):
+            for file in files:
+                if file.endswith('.csv') and file.startswith(SIGNAL_FILE_PREFIX):
+                    relative_path = os.path.relpath(os.path.join(root, file), settings.signals_root)
+                    record = parse_signal_path(relative_path)
+                    if record:
+                        on_disk[record['file_path']] = record
+
+    with transaction(db_path) as conn:
+        indexed = {row['file_path'] for row in conn.execute("SELECT file_path FROM signal_files")}
+        for file_path in indexed - set(on_disk):
+            conn.execute("DELETE FROM signal_files WHERE file_path = ?", (file_path,))
+        conn.execute("DELETE FROM latest_signals")
+        for file_path, record in on_disk.items():
+            if file_path in indexed:
+                continue
+            record['file_time'] = _file_time(file_path)
+            record['row_count'] = None
+            conn.execute(
+                """INSERT OR REPLACE INTO signal_files
+                   (file_path, data_source, stock_info, stock_code, strategy_name, run_time, file_time, row_count)
+                   VALUES (:file_path, :data_source, :stock_info, :stock_code, :strategy_name, :run_time, :file_time, :row_count)""",
+                record)
+        # 重建最新视图：每个（数据源, 股票代码, 策略）取run_time最大的文件
+        conn.execute(
+            """INSERT INTO latest_signals
+               (data_source, stock_code, strategy_name, stock_info, file_path, run_time, file_time, row_count)
+               SELECT data_source, stock_code, strategy_name, stock_info, file_path, run_time, file_time, row_count
+               FROM signal_files f
+               WHERE run_time = (SELECT MAX(run_time) FROM signal_files g
+                                 WHERE g.data_source = f.data_source
+                                   AND g.stock_code = f.stock_code
+                                   AND g.strategy_name = f.strategy_name)
+               GROUP BY data_source, stock_code, strategy_name""")
+        conn.execute("INSERT OR REPLACE INTO signal_index_meta (key, value) VALUES ('synced', ?)",
+                     (datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+    logger.info(f"信号索引同步完成，共 {len(on_disk)} 个信号文件")
+    return len(on_disk)
+
+
+def get_latest_signal_files(data_source=None, stock_code=None, strategy_name=None):
+    """
+    获取每个（数据源, 股票代码, 策略）最近一次回测的信号文件
+
+    参数:
+        data_source: 数据源筛选（可选）
+        stock_code: 股票代码筛选，如 HK.00700（可选）
+        strategy_name: 策略筛选（可选）
+
+    返回:
+        信号文件信息列表，字段与signal_get一致，按文件时间倒序
+    """
+    conditions = []
+    params = []
+    for column, value in (('data_source', data_source), ('stock_code', stock_code), ('strategy_name', strategy_name)):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    sql = "SELECT * FROM latest_signals"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY file_time DESC"
+    rows = connect(_db()).execute(sql, params).fetchall()
+    return [{
+        'file_path': row['file_path'],
+        'data_source': row['data_source'],
+        'stock_info': row['stock_info'],
+        'strategy_name': row['strategy_name'],
+        'file_time': row['file_time'],
+    } for row in rows]
+
+
+def compact_signal_files(keep=None, dry_run=False):
+    """
+    信号文件保留/压缩任务：每个（数据源, 股票代码, 策略）只保留最近keep次回测的信号文件，删除其余被取代的文件
+
+    参数:
+        keep: 保留的最近回测次数，默认settings.SIGNAL_RETENTION_RUNS
+        dry_run: 为True时只统计不删除
+
+    返回:
+        list: 被删除（dry_run时为将被删除）的信号文件相对路径
+    """
+    keep = max(1, keep or settings.SIGNAL_RETENTION_RUNS)
+    db_path = _db()
+    rows = connect(db_path).execute(
+        """SELECT file_path, data_source, stock_code, strategy_name FROM signal_files
+           ORDER BY data_source, stock_code, strategy_name, run_time DESC""").fetchall()
+
+    superseded = []
+    seen = {}
+    for row in rows:
+        key = (row['data_source'], row['stock_code'], row['strategy_name'])
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > keep:
+            superseded.append(row['file_path'])
+
+    if dry_run or not superseded:
+        logger.info(f"信号文件压缩：{len(superseded)} 个文件可清理（dry_run={dry_run}）")
+        return superseded
+
+    removed = []
+    for file_path in superseded:
+        full_path = os.path.join(settings.signals_root, file_path)
+        try:
+            if os.path.exists(full_path):
+                os.remove(full_path)
+            removed.append(file_path)
+        except OSError as e:
+            logger.warning(f"删除信号文件失败: {full_path}, {str(e)}")
+
+    with transaction(db_path) as conn:
+        conn.executemany("DELETE FROM signal_files WHERE file_path = ?", [(p,) for p in removed])
+    logger.info(f"信号文件压缩完成，删除 {len(removed)} 个被取代的信号文件")
+    return removed
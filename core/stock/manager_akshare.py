@@ -5,6 +5,7 @@ import pandas as pd
 from pandas import DataFrame
 
 from common.logger import create_log
+from common.util_metrics import observe_fetch
 from common.util_csv import save_to_csv
 from core.stock.manager_common import standardize_stock_data
 from settings import stock_data_root
@@ -59,6 +60,7 @@ def get_hk_stock_history(stock_code: str, start_date: str, end_date: str, adjust
         return pd.DataFrame()
 
 
+@observe_fetch('akshare')
 def get_single_hk_stock_history(stock_code: str, start_date: str, end_date: str,
                                 adjust_type: str = 'qfq', output_dir: str = 'akshare'):
     """
@@ -145,6 +147,7 @@ def get_us_history(stock_code: str, start_date: str, end_date: str) -> DataFrame
         return pd.DataFrame()
 
 
+@observe_fetch('akshare')
 def get_single_us_history(stock_code: str, start_date: str, end_date: str,
                               output_dir: str = 'akshare'):
     """
@@ -4,6 +4,7 @@ import os
 import baostock as bs
 import pandas as pd
 from common.logger import create_log
+from common.util_metrics import observe_fetch
 from common.util_csv import save_to_csv
 from core.stock.manager_common import standardize_stock_data
 from settings import stock_data_root
@@ -99,6 +100,7 @@ def get_stock_history(stock_code, start_date, end_date, adjust_type='2'):
         return pd.DataFrame()
 
 
+@observe_fetch('baostock')
 def get_single_cn_stock_history(stock_code, start_date, end_date, adjust_type = '2', output_dir='baostock'):
     """
     获取单只港股的历史数据并保存到CSV
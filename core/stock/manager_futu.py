@@ -7,6 +7,7 @@ import pandas as pd
 from futu import RET_OK
 
 from common.logger import create_log
+from common.util_metrics import observe_fetch
 from common.util_csv import save_to_csv
 from settings import stock_data_root
 
@@ -209,6 +210,7 @@ def indicator_fetcher(stock_code='HK.00700'):
         fetcher.close_connection()
 
 
+@observe_fetch('futu')
 def get_single_hk_stock_history(stock_code, start_date, end_date, adjust_type=ft.AuType.QFQ, output_dir='futu'):
     fetcher = TestIndicatorFetcher()
     try:
@@ -1,17 +1,29 @@
 import datetime
 import pandas as pd
+from common.util_records import ColumnarRecords
+
 
 class SignalRecordManager:
+    """信号记录按列追加（见common.util_records），不再为每个信号创建一个SignalRecord对象"""
+    __slots__ = ('records',)
+
     def __init__(self):
-        self.signal_records = []
+        self.records = ColumnarRecords((('date', 'date'), ('signal_type', object), ('signal_description', object)))
 
     def add_signal_record(self, date, signal_type, signal_description):
-        self.signal_records.append(SignalRecord(date, signal_type, signal_description))
+        self.records.append(date, signal_type, signal_description)
+
+    @property
+    def signal_records(self):
+        """逐条的SignalRecord列表（按需生成，仅用于兼容）"""
+        return [SignalRecord(*row) for row in self.records.rows()]
 
     def transform_to_dataframe(self):
-        return pd.DataFrame([record.__dict__ for record in self.signal_records])
+        return self.records.to_dataframe()
 
 class SignalRecord:
+    __slots__ = ('date', 'signal_type', 'signal_description')
+
     def __init__(self, date, signal_type, signal_description):
         if type(date) is datetime.date:
             # 将datetime.date转换为pandas Timestamp
@@ -1,10 +1,7 @@
-import backtrader as bt
-import importlib
-import pkgutil
-import os
-import sys
 import inspect
 from common.logger import create_log
+from core.strategy.plugin_manifest import PluginManifest
+from core.strategy.plugin_registry import PluginRegistry
 
 logger = create_log("indicator_manager")
 
@@ -12,78 +9,53 @@ logger = create_log("indicator_manager")
 class IndicatorManager:
     """
     信号指标管理器，专门用于管理和发现所有的信号指标类
-    与交易策略管理器完全独立
+    与交易策略管理器完全独立；通过插件清单递归发现指标类，请求某个指标时才导入其模块，
+    指标文件修改后自动重新加载（使用该指标的策略模块同时重新加载）
     """
 
     def __init__(self):
-        self.indicator_list = []
-        self.indicator_map = {}
-        self._auto_discover_indicators()
-
-    def _auto_discover_indicators(self):
-        """自动发现并注册所有继承自bt.Indicator的信号指标类"""
-        # 获取指标目录路径
-        indicator_dir = os.path.join(os.path.dirname(__file__), 'indicator')
-
-        # 遍历indicator目录下的所有子模块
-        for _, module_name, _ in pkgutil.iter_modules([indicator_dir]):
-            # 跳过common模块
-            if module_name == 'common' or module_name.startswith('__'):
-                continue
-
-            try:
-                # 构建完整模块路径
-                full_module_path = f'core.strategy.indicator.{module_name}'
-                module = importlib.import_module(full_module_path)
-
-                # 遍历模块中的所有属性，查找继承自bt.Indicator的类
-                for attr_name in dir(module):
-                    attr = getattr(module, attr_name)
-                    # 检查是否为类，是否继承自bt.Indicator，且不是bt.Indicator本身
-                    if isinstance(attr, type) and issubclass(attr, bt.Indicator) and attr != bt.Indicator:
-                        self.register_indicator(attr)
-            except Exception as e:
-                logger.error(f"Failed to load module {module_name}: {str(e)}")
-                continue
-
-        # 特殊处理volume子目录
-        volume_dir = os.path.join(indicator_dir, 'volume')
-        if os.path.exists(volume_dir):
-            for _, module_name, _ in pkgutil.iter_modules([volume_dir]):
-                if module_name.startswith('__'):
-                    continue
-
-                try:
-                    full_module_path = f'core.strategy.indicator.volume.{module_name}'
-                    module = importlib.import_module(full_module_path)
-
-                    for attr_name in dir(module):
-                        attr = getattr(module, attr_name)
-                        if isinstance(attr, type) and issubclass(attr, bt.Indicator) and attr != bt.Indicator:
-                            self.register_indicator(attr)
-                except Exception as e:
-                    logger.error(f"Failed to load volume indicator module {module_name}: {str(e)}")
-                    continue
+        self.manifest = PluginManifest('indicator', 'core.strategy.indicator', ('Indicator',))
+        self.registry = PluginRegistry(self.manifest, self._base_class)
+
+    @staticmethod
+    def _base_class():
+        import backtrader as bt
+        return bt.Indicator
+
+    @property
+    def indicator_map(self):
+        """类名 -> 指标类（重新加载时整体替换）"""
+        return self.registry.classes
+
+    @property
+    def indicator_list(self):
+        return list(self.registry.classes.values())
+
+    def refresh(self):
+        """重新读取插件清单并重新加载已修改的指标模块"""
+        self.registry.refresh()
+        return self.get_indicator_names()
 
     def register_indicator(self, indicator_class):
         """注册一个信号指标类"""
-        if indicator_class not in self.indicator_list:
-            self.indicator_list.append(indicator_class)
-            # 使用类名作为key，方便前端通过名称查找指标类
-            self.indicator_map[indicator_class.__name__] = indicator_class
+        if self.registry.register(indicator_class):
             logger.info(f"Registered indicator: {indicator_class.__name__}")
 
     def get_indicator(self, indicator_class_name):
-        """根据类名获取信号指标类"""
-        return self.indicator_map.get(indicator_class_name)
+        """根据类名获取信号指标类（首次请求时导入其模块）"""
+        return self.registry.get(indicator_class_name)
 
     def get_all_indicators(self):
-        """获取所有注册的信号指标类"""
-        return self.indicator_list
+        """获取所有信号指标类（会导入全部指标模块）"""
+        return self.registry.get_all()
 
     def get_indicator_names(self):
-        """获取所有注册的信号指标类名"""
-        return list(self.indicator_map.keys())
+        """获取所有信号指标类名（只读取插件清单，不导入模块）"""
+        return self.registry.names()
+
+    def get_module_stats(self):
+        """各指标模块的导入耗时与重新加载情况"""
+        return self.registry.module_stats()
 
     def get_indicator_source_code(self, indicator_class_name):
         """
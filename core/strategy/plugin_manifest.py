@@ -0,0 +1,161 @@
+"""
+策略/指标插件清单
+
+启动时不再导入所有策略和指标模块（会连带导入backtrader、pandas等，耗时数秒），而是用AST解析模块源码，
+找出继承自指定基类的类，得到 类名 -> 模块路径 的清单；只有真正请求某个策略时才导入其模块。
+解析结果按文件缓存在settings.plugin_manifest_dir中，文件的修改时间或大小变化时才重新解析该文件。
+"""
+import ast
+import importlib.util
+import json
+import os
+
+import settings
+from common.logger import create_log
+
+logger = create_log("plugin_manifest")
+
+# 清单格式变化时递增，旧格式的缓存整体失效
+_MANIFEST_VERSION = 1
+
+
+def _base_name(node):
+    """基类表达式的名称：StrategyBase -> StrategyBase，bt.Indicator -> Indicator"""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def scan_classes(file_path):
+    """
+    解析模块源码中定义的顶层类（不导入模块）
+
+    返回:
+        list: [[类名, [基类名, ...]], ...]
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=file_path)
+    return [[node.name, [name for name in map(_base_name, node.bases) if name]]
+            for node in tree.body if isinstance(node, ast.ClassDef)]
+
+
+class PluginManifest:
+    """
+    用法:
+        manifest = PluginManifest('strategy', 'core.strategy.trading', ('StrategyBase',))
+        manifest.load()  # {'EnhancedVolumeStrategy': 'core.strategy.trading.volume.enhanced_volume', ...}
+    """
+
+    def __init__(self, kind, package, base_names, skip_modules=('common',), manifest_path=None):
+        """
+        参数:
+            kind: 插件类型（清单文件名）
+            package: 插件所在的包，递归扫描其下所有模块
+            base_names: 插件基类名称；继承自这些基类（或继承自其他插件类）的类视为插件
+            skip_modules: 包顶层跳过的模块（如定义基类的common）
+        """
+        self.kind = kind
+        self.package = package
+        self.base_names = set(base_names)
+        self.skip_modules = set(skip_modules)
+        self.manifest_path = str(manifest_path or os.path.join(settings.plugin_manifest_dir, f"{kind}.json"))
+        # 只定位包目录，不导入包本身
+        self.package_dir = os.path.abspath(importlib.util.find_spec(package).submodule_search_locations[0])
+
+    def iter_modules(self):
+        """
+        遍历包下的模块文件
+
+        返回:
+            list: [(模块路径, 文件路径), ...]，按文件路径排序
+        """
+        modules = []
+        for folder, dirs, files in os.walk(self.package_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith(('__', '.'))
+                             and os.path.exists(os.path.join(folder, d, '__init__.py')))
+            relative = os.path.relpath(folder, self.package_dir)
+            prefix = self.package if relative == '.' else f"{self.package}.{relative.replace(os.sep, '.')}"
+            for name in sorted(files):
+                module_name, ext = os.path.splitext(name)
+                if ext != '.py' or module_name.startswith('__'):
+                    continue
+                if relative == '.' and module_name in self.skip_modules:
+                    continue
+                modules.append((f"{prefix}.{module_name}", os.path.join(folder, name)))
+        return modules
+
+    def _read_cache(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cache.get('version') != _MANIFEST_VERSION:
+            return {}
+        return cache.get('modules', {})
+
+    def _write_cache(self, modules):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': _MANIFEST_VERSION, 'modules': modules}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def scan(self):
+        """
+        按修改时间增量解析模块
+
+        返回:
+            dict: 模块路径 -> {'file', 'mtime_ns', 'size', 'classes'}
+        """
+        cached = self._read_cache()
+        modules = {}
+        parsed = 0
+        for module_name, file_path in self.iter_modules():
+            stat = os.stat(file_path)
+            entry = cached.get(module_name)
+            if entry and entry.get('mtime_ns') == stat.st_mtime_ns and entry.get('size') == stat.st_size:
+                modules[module_name] = entry
+                continue
+            try:
+                classes = scan_classes(file_path)
+            except (OSError, SyntaxError, UnicodeDecodeError) as e:
+                logger.error(f"解析插件模块失败: {module_name}, {str(e)}")
+                classes = []
+            modules[module_name] = {'file': file_path, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                                    'classes': classes}
+            parsed += 1
+        if parsed or set(modules) != set(cached):
+            try:
+                self._write_cache(modules)
+            except OSError as e:
+                logger.warning(f"写入插件清单缓存失败: {self.manifest_path}, {str(e)}")
+            logger.info(f"更新{self.kind}插件清单：解析 {parsed} 个模块，共 {len(modules)} 个模块")
+        return modules
+
+    def load(self):
+        """
+        插件清单
+
+        返回:
+            dict: 类名 -> 模块路径（按模块路径、类定义顺序排列）
+        """
+        modules = self.scan()
+        plugin_names = set(self.base_names)
+        # 继承自其他插件类的类同样是插件，直到不再有新增
+        changed = True
+        while changed:
+            changed = False
+            for entry in modules.values():
+                for class_name, bases in entry['classes']:
+                    if class_name not in plugin_names and plugin_names.intersection(bases):
+                        plugin_names.add(class_name)
+                        changed = True
+        plugins = {}
+        for module_name, entry in modules.items():
+            for class_name, _ in entry['classes']:
+                if class_name in plugin_names and class_name not in self.base_names:
+                    plugins.setdefault(class_name, module_name)
+        return plugins
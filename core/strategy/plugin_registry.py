@@ -0,0 +1,358 @@
+"""
+策略/指标插件注册表（按需导入 + 热加载）
+
+插件模块在首次请求插件类时导入，并记录每个模块的导入耗时（可通过module_stats查看，用于发现导入缓慢的插件）。
+注册表每隔settings.PLUGIN_RELOAD_INTERVAL秒检查已加载插件模块的文件修改时间，只重新执行发生变化的模块
+以及导入了这些模块的插件模块（如指标修改后，使用该指标的策略模块也会重新执行）：
+- 新版本在新的模块对象中执行，成功后才替换sys.modules中的模块；执行失败时保留旧版本并记录错误
+- 类映射整体替换，读取方不会看到一半新一半旧的映射
+- 正在运行的回测持有的是旧的类对象，不受影响；之后的请求得到新版本的类
+定义插件基类的模块（如trading/common.py）不参与热加载（见settings.PLUGIN_RELOAD_EXCLUDE），修改后仍需重启进程。
+"""
+import ast
+import datetime
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+import time
+
+import settings
+from common.logger import create_log
+from common.util_metrics import plugin_import_seconds
+
+logger = create_log("plugin_registry")
+
+# 同一进程内的所有注册表共用：模块的替换需要整体串行，且策略模块依赖指标模块
+_lock = threading.RLock()
+_files = {}     # 已加载的插件模块路径 -> 文件路径
+_versions = {}  # 已加载的插件模块路径 -> 加载时文件的 (mtime_ns, size)
+_imports = {}   # 已加载的插件模块路径 -> 源码中导入的其他插件模块路径
+_reloads = {}   # 插件模块路径 -> {'reloads', 'reloaded_at', 'error'}
+_pinned = set(settings.PLUGIN_RELOAD_EXCLUDE)  # 不热加载的模块路径（插件基类所在模块等）
+
+
+def pin_modules(module_names):
+    """登记不热加载的模块（重新执行会替换插件基类或模块级状态的模块）"""
+    with _lock:
+        _pinned.update(module_names)
+        for name in module_names:
+            for table in (_files, _versions, _imports):
+                table.pop(name, None)
+
+
+def _reloadable(module_name):
+    return module_name.startswith(settings.PLUGIN_RELOAD_PACKAGE) and module_name not in _pinned
+
+
+def _file_version(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def scan_imports(file_path, module_name):
+    """
+    解析模块源码中导入的模块路径（不导入模块；相对导入按module_name解析）
+
+    返回:
+        set: 模块路径（from a.b import c 同时包含a.b与a.b.c，调用方按已知模块过滤）
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        tree = ast.parse(f.read(), filename=file_path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                package = module_name.rsplit('.', node.level)[0]
+                base = f"{package}.{base}" if base else package
+            names.add(base)
+            names.update(f"{base}.{alias.name}" for alias in node.names)
+    return names
+
+
+def _track(module_name):
+    """登记已加载的插件模块及其已加载的插件依赖（记录当前文件版本作为基准）"""
+    pending = [module_name]
+    while pending:
+        name = pending.pop()
+        if name in _versions:
+            continue
+        file_path = getattr(sys.modules.get(name), '__file__', None)
+        if not file_path or not _reloadable(name):
+            continue
+        _files[name] = file_path
+        _versions[name] = _file_version(file_path)
+        try:
+            imports = scan_imports(file_path, name)
+        except (OSError, SyntaxError, UnicodeDecodeError):
+            imports = set()
+        _imports[name] = sorted(dep for dep in imports if dep in sys.modules and dep != name
+                                and _reloadable(dep) and getattr(sys.modules[dep], '__file__', None))
+        pending.extend(_imports[name])
+
+
+def _exec_module(module_name, file_path):
+    """在新的模块对象中执行模块源码，成功后替换sys.modules及父包中的模块；失败时恢复旧模块并抛出异常"""
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    old = sys.modules.get(module_name)
+    # 执行期间需要在sys.modules中（模块内的类定义、相对导入会用到）
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        if old is not None:
+            sys.modules[module_name] = old
+        else:
+            sys.modules.pop(module_name, None)
+        raise
+    parent, _, child = module_name.rpartition('.')
+    if parent in sys.modules:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def reload_changed():
+    """
+    重新执行文件发生变化的插件模块，以及（直接或间接）导入了这些模块的插件模块；被依赖的模块先执行
+
+    返回:
+        tuple: (重新加载成功的模块, {失败的模块: 错误信息}, 文件已删除的模块)
+    """
+    with _lock:
+        changed = {name for name, file_path in _files.items()
+                   if _reloadable(name) and _file_version(file_path) != _versions[name]}
+        if not changed:
+            return [], {}, []
+        removed = [name for name in changed if _file_version(_files[name]) is None]
+        # 导入了变化模块的模块同样需要重新执行，才能引用到新的类
+        stale = set(changed)
+        grown = True
+        while grown:
+            grown = False
+            for name, deps in _imports.items():
+                if name not in stale and stale.intersection(deps):
+                    stale.add(name)
+                    grown = True
+
+        order = []
+
+        def visit(name):
+            if name in order:
+                return
+            order.append(None)  # 占位，防止循环依赖无限递归
+            for dep in _imports.get(name, ()):
+                if dep in stale:
+                    visit(dep)
+            order.remove(None)
+            order.append(name)
+
+        for name in sorted(stale):
+            visit(name)
+
+        reloaded, failed = [], {}
+        for name in order:
+            if name in removed:
+                sys.modules.pop(name, None)
+                for table in (_files, _versions, _imports, _reloads):
+                    table.pop(name, None)
+                continue
+            version = _file_version(_files[name])
+            try:
+                _exec_module(name, _files[name])
+            except Exception as e:
+                # 保留旧版本；记录新版本号，文件再次修改前不再重复尝试
+                failed[name] = f"{type(e).__name__}: {str(e)}"
+                _versions[name] = version
+                _reloads.setdefault(name, {'reloads': 0, 'reloaded_at': None})['error'] = failed[name]
+                logger.error(f"重新加载插件模块失败，继续使用旧版本: {name}, {failed[name]}")
+                continue
+            _versions[name] = version
+            try:
+                imports = scan_imports(_files[name], name)
+            except (OSError, SyntaxError, UnicodeDecodeError):
+                imports = set()
+            _imports[name] = sorted(dep for dep in imports if dep in _files and dep != name)
+            info = _reloads.setdefault(name, {'reloads': 0})
+            info.update(reloads=info['reloads'] + 1, error=None,
+                        reloaded_at=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            reloaded.append(name)
+        if reloaded or removed:
+            logger.info(f"重新加载插件模块: {reloaded}，已删除: {removed}")
+        return reloaded, failed, removed
+
+
+class PluginRegistry:
+    """
+    用法:
+        registry = PluginRegistry(manifest, get_base_class)
+        registry.get('EnhancedVolumeStrategy')  # 首次请求时导入模块；模块文件修改后自动重新加载
+        registry.module_stats()                 # 各模块的导入耗时
+    """
+
+    def __init__(self, manifest, base_class, reload_interval=None):
+        """
+        参数:
+            manifest: PluginManifest
+            base_class: 无参数函数，返回插件基类（延迟导入基类所在模块）
+            reload_interval: 检查模块修改的间隔（秒），0表示不热加载；默认settings.PLUGIN_RELOAD_INTERVAL
+        """
+        self.manifest = manifest
+        self.base_class = base_class
+        self.reload_interval = settings.PLUGIN_RELOAD_INTERVAL if reload_interval is None else reload_interval
+        self.classes = {}    # 类名 -> 类，整体替换
+        self._modules = None  # 类名 -> 模块路径（插件清单）
+        self._stats = {}     # 模块路径 -> {'import_ms', 'loaded_at', 'error'}（首次导入）
+        self._checked = time.monotonic()
+        # 清单跳过的模块（定义插件基类的common）不热加载
+        pin_modules([f"{manifest.package}.{name}" for name in manifest.skip_modules])
+
+    def plugin_modules(self):
+        if self._modules is None:
+            self._modules = self.manifest.load()
+        return self._modules
+
+    def refresh(self):
+        """重新读取插件清单并重新加载已修改的模块"""
+        self._modules = None
+        self.check(force=True)
+        return self.plugin_modules()
+
+    def check(self, force=False):
+        """
+        检查已加载模块是否被修改（未到检查间隔时直接返回），有变化时重新加载并更新类映射
+
+        返回:
+            list: 本次重新加载的模块
+        """
+        now = time.monotonic()
+        if not force and (self.reload_interval <= 0 or now - self._checked < self.reload_interval):
+            return []
+        self._checked = now
+        # 插件清单按文件修改时间增量更新，新增、删除、重命名的类在下次读取清单时生效
+        self._modules = None
+        with _lock:
+            reloaded, failed, removed = reload_changed()
+            if not reloaded and not removed and not self._outdated():
+                return reloaded
+            base = self.base_class()
+            classes = {}
+            for name, cls in self.classes.items():
+                current = getattr(sys.modules.get(cls.__module__), name, None)
+                if cls.__module__ in removed or current is None:
+                    logger.info(f"插件类已移除: {cls.__module__}.{name}")
+                elif current is cls or (isinstance(current, type) and issubclass(current, base)):
+                    classes[name] = current
+                else:
+                    logger.error(f"重新加载后 {cls.__module__}.{name} 不是{base.__name__}的子类，已移除")
+            for module_name in removed:
+                self._stats.pop(module_name, None)
+            self.classes = classes
+        return reloaded
+
+    def _outdated(self):
+        """类映射中是否有类已被其他注册表的重新加载替换（如指标模块重新加载后，依赖它的策略模块也已重新执行）"""
+        for name, cls in self.classes.items():
+            if getattr(sys.modules.get(cls.__module__), name, None) is not cls:
+                return True
+        return False
+
+    def get(self, class_name):
+        """根据类名获取插件类（首次请求时导入其模块），失败返回None"""
+        self.check()
+        cls = self.classes.get(class_name)
+        if cls is None:
+            cls = self._load(class_name)
+        return cls
+
+    def get_all(self):
+        """获取所有插件类（会导入全部插件模块）"""
+        for name in self.plugin_modules():
+            self.get(name)
+        return list(self.classes.values())
+
+    def names(self):
+        """所有插件类名（只读取插件清单，不导入模块）"""
+        self.check()
+        names = list(self.plugin_modules())
+        names += [name for name in self.classes if name not in names]
+        return names
+
+    def _load(self, class_name):
+        module_path = self.plugin_modules().get(class_name)
+        if module_path is None:
+            return None
+        base = self.base_class()
+        if base.__module__ not in _pinned:
+            pin_modules([base.__module__])
+        with _lock:
+            preloaded = module_path in sys.modules
+            start = time.perf_counter()
+            try:
+                module = importlib.import_module(module_path)
+            except Exception as e:
+                error = f"{type(e).__name__}: {str(e)}"
+                self._stats[module_path] = {'import_ms': None, 'loaded_at': None, 'error': error}
+                logger.error(f"Failed to load module {module_path}: {error}")
+                return None
+            if module_path not in self._stats or self._stats[module_path]['loaded_at'] is None:
+                import_ms = round((time.perf_counter() - start) * 1000, 1)
+                self._stats[module_path] = {
+                    # 模块已被其他插件导入时耗时计入首先导入它的模块
+                    'import_ms': None if preloaded else import_ms,
+                    'loaded_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                    'error': None}
+                if not preloaded:
+                    plugin_import_seconds.set(import_ms / 1000, kind=self.manifest.kind, module=module_path)
+            _track(module_path)
+            attr = getattr(module, class_name, None)
+            if not (isinstance(attr, type) and issubclass(attr, base)):
+                logger.error(f"{module_path}.{class_name} 不是{base.__name__}的子类")
+                return None
+            self.register(attr)
+        return attr
+
+    def register(self, cls):
+        """注册一个插件类，返回是否为新注册"""
+        with _lock:
+            if self.classes.get(cls.__name__) is cls:
+                return False
+            classes = dict(self.classes)
+            classes[cls.__name__] = cls
+            self.classes = classes
+        return True
+
+    def module_stats(self):
+        """
+        各插件模块的加载情况，按导入耗时倒序
+
+        返回:
+            list: [{'module', 'classes', 'loaded', 'import_ms', 'loaded_at', 'reloads', 'reloaded_at', 'error'}, ...]
+        """
+        by_module = {}
+        for class_name, module_path in self.plugin_modules().items():
+            by_module.setdefault(module_path, []).append(class_name)
+        stats = []
+        for module_path, class_names in by_module.items():
+            entry = self._stats.get(module_path, {})
+            reload_info = _reloads.get(module_path, {})
+            stats.append({
+                'module': module_path,
+                'classes': class_names,
+                'loaded': module_path in _versions,
+                'import_ms': entry.get('import_ms'),
+                'loaded_at': entry.get('loaded_at'),
+                'reloads': reload_info.get('reloads', 0),
+                'reloaded_at': reload_info.get('reloaded_at'),
+                # 重新加载失败时为最近一次的错误（仍在使用旧版本）
+                'error': reload_info.get('error') or entry.get('error'),
+            })
+        stats.sort(key=lambda item: (item['import_ms'] is None, -(item['import_ms'] or 0), item['module']))
+        return stats
@@ -1,86 +1,61 @@
-import backtrader as bt
-import importlib
-import pkgutil
-import os
-import sys
-from core.strategy.trading.common import StrategyBase
-from common.logger import create_log
 import inspect
+from common.logger import create_log
+from core.strategy.plugin_manifest import PluginManifest
+from core.strategy.plugin_registry import PluginRegistry
 
 logger = create_log("strategy_manager")
 
 
 class StrategyManager:
+    """
+    策略管理器：通过插件清单递归发现trading包下所有继承自StrategyBase的策略类，
+    只有请求某个策略时才导入其模块（避免启动时导入backtrader及全部策略）；
+    策略文件修改后自动重新加载（见plugin_registry），无需重启进程
+    """
 
     def __init__(self):
-        self.strategy_list = []
-        self.strategy_map = {}
-        self._auto_discover_strategies()
-
-    def _auto_discover_strategies(self):
-        """自动发现并注册所有继承自StrategyBase的策略类"""
-        # 获取策略目录路径
-        strategy_dir = os.path.join(os.path.dirname(__file__), 'trading')
-
-        # 遍历trading目录下的所有子模块
-        for _, module_name, _ in pkgutil.iter_modules([strategy_dir]):
-            # 跳过common模块
-            if module_name == 'common' or module_name.startswith('__'):
-                continue
-
-            try:
-                # 构建完整模块路径
-                full_module_path = f'core.strategy.trading.{module_name}'
-                module = importlib.import_module(full_module_path)
-
-                # 遍历模块中的所有属性，查找继承自StrategyBase的类
-                for attr_name in dir(module):
-                    attr = getattr(module, attr_name)
-                    # 检查是否为类，是否继承自StrategyBase，且不是StrategyBase本身
-                    if isinstance(attr, type) and issubclass(attr, StrategyBase) and attr != StrategyBase:
-                        self.register_strategy(attr)
-            except Exception as e:
-                logger.error(f"Failed to load module {module_name}: {str(e)}")
-                continue
-
-        # 特殊处理volume子目录
-        volume_dir = os.path.join(strategy_dir, 'volume')
-        if os.path.exists(volume_dir):
-            for _, module_name, _ in pkgutil.iter_modules([volume_dir]):
-                if module_name.startswith('__'):
-                    continue
-
-                try:
-                    full_module_path = f'core.strategy.trading.volume.{module_name}'
-                    module = importlib.import_module(full_module_path)
-
-                    for attr_name in dir(module):
-                        attr = getattr(module, attr_name)
-                        if isinstance(attr, type) and issubclass(attr, StrategyBase) and attr != StrategyBase:
-                            self.register_strategy(attr)
-                except Exception as e:
-                    logger.error(f"Failed to load volume module {module_name}: {str(e)}")
-                    continue
+        self.manifest = PluginManifest('strategy', 'core.strategy.trading', ('StrategyBase',))
+        self.registry = PluginRegistry(self.manifest, self._base_class)
+
+    @staticmethod
+    def _base_class():
+        from core.strategy.trading.common import StrategyBase
+        return StrategyBase
+
+    @property
+    def strategy_map(self):
+        """类名 -> 策略类（重新加载时整体替换）"""
+        return self.registry.classes
+
+    @property
+    def strategy_list(self):
+        return list(self.registry.classes.values())
+
+    def refresh(self):
+        """重新读取插件清单并重新加载已修改的策略模块"""
+        self.registry.refresh()
+        return self.get_strategy_names()
 
     def register_strategy(self, strategy_class):
         """注册一个策略类"""
-        if strategy_class not in self.strategy_list:
-            self.strategy_list.append(strategy_class)
-            # 使用类名作为key，方便前端通过名称查找策略类
-            self.strategy_map[strategy_class.__name__] = strategy_class
+        if self.registry.register(strategy_class):
             logger.info(f"Registered strategy: {strategy_class.__name__}")
 
     def get_strategy(self, strategy_class_name):
-        """根据类名获取策略类"""
-        return self.strategy_map.get(strategy_class_name)
+        """根据类名获取策略类（首次请求时导入其模块；调用方持有的类对象不受之后的重新加载影响）"""
+        return self.registry.get(strategy_class_name)
 
     def get_all_strategies(self):
-        """获取所有注册的策略类"""
-        return self.strategy_list
+        """获取所有策略类（会导入全部策略模块）"""
+        return self.registry.get_all()
 
     def get_strategy_names(self):
-        """获取所有注册的策略类名"""
-        return list(self.strategy_map.keys())
+        """获取所有策略类名（只读取插件清单，不导入模块）"""
+        return self.registry.names()
+
+    def get_module_stats(self):
+        """各策略模块的导入耗时与重新加载情况"""
+        return self.registry.module_stats()
 
     def get_strategy_source_code(self, strategy_class_name):
         """
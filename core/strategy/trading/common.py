@@ -1,22 +1,36 @@
 import datetime
+import numpy as np
 import pandas as pd
 import backtrader as bt
 from common.logger import create_log
+from common.util_records import ColumnarRecords
 import settings
 
 logger = create_log("trade_strategy_common")
 
 
 class TradeRecordManager:
+    """交易记录按列追加（见common.util_records），不再为每笔交易创建一个TradeRecord对象"""
+    __slots__ = ('records',)
+
     def __init__(self):
-        self.trade_records = []
+        self.records = ColumnarRecords((
+            ('date', 'date'), ('trade_id', np.int64), ('action', object), ('price', np.float64),
+            ('size', np.float64), ('total_amount', np.float64), ('commission', np.float64),
+            ('order_type', object), ('status', np.int64)))
 
     def add_trade_record(self, trade_id, date, action, price, size, total_amount, commission, order_type, status):
-        self.trade_records.append(
-            TradeRecord(trade_id, date, action, price, size, total_amount, commission, order_type, status))
+        self.records.append(date, trade_id, action, price, size, total_amount, commission, order_type, status)
+
+    @property
+    def trade_records(self):
+        """逐条的TradeRecord列表（按需生成，仅用于兼容）"""
+        return [TradeRecord(trade_id, date, action, price, size, total_amount, commission, order_type, status)
+                for date, trade_id, action, price, size, total_amount, commission, order_type, status
+                in self.records.rows()]
 
     def transform_to_dataframe(self):
-        return pd.DataFrame([record.__dict__ for record in self.trade_records])
+        return self.records.to_dataframe()
 
 
 class TradeRecord:
@@ -31,6 +45,7 @@ class TradeRecord:
     :param order_type: 订单类型
     :param status: 订单状态
     """
+    __slots__ = ('date', 'trade_id', 'action', 'price', 'size', 'total_amount', 'commission', 'order_type', 'status')
 
     def __init__(self, trade_id, date, action, price, size, total_amount, commission, order_type, status):
         if type(date) is datetime.date:
@@ -0,0 +1,129 @@
+"""
+cron表达式解析与下次触发时间计算
+
+格式为5段：分 时 日 月 周，每段支持 *、数字、范围(1-5)、步长(*/15、0-30/10)、列表(1,3,5)，
+周支持 MON-SUN，月支持 JAN-DEC。与标准cron一致，日和周都不是 * 时，两者满足其一即触发。
+
+兼容旧版任务配置：
+    日、月为 0 时视为 *（如 "28 16 0 0 1-5" 表示周一至周五16:28）
+    周的 7 与 0 都表示周日
+"""
+import datetime
+
+_WEEKDAY_NAMES = {'SUN': 0, 'MON': 1, 'TUE': 2, 'WED': 3, 'THU': 4, 'FRI': 5, 'SAT': 6}
+_MONTH_NAMES = {name: i + 1 for i, name in enumerate(
+    ('JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC'))}
+
+# 各字段：(名称, 最小值, 最大值, 名称映射)
+_FIELDS = (
+    ('minute', 0, 59, None),
+    ('hour', 0, 23, None),
+    ('day', 1, 31, None),
+    ('month', 1, 12, _MONTH_NAMES),
+    ('weekday', 0, 7, _WEEKDAY_NAMES),
+)
+
+# 向后最多搜索的天数（如 "0 0 31 2 *" 永远不会触发）
+_MAX_SEARCH_DAYS = 366 * 5
+
+
+def _parse_value(token, names):
+    token = token.upper()
+    if names and token in names:
+        return names[token]
+    return int(token)
+
+
+def _parse_field(text, name, low, high, names):
+    """解析一个字段，返回允许值集合；字段为*时返回None"""
+    if text == '*':
+        return None
+    # 旧版配置中日、月使用0表示任意
+    if name in ('day', 'month') and text == '0':
+        return None
+    values = set()
+    for part in text.split(','):
+        rng, _, step_text = part.partition('/')
+        step = int(step_text) if step_text else 1
+        if step <= 0:
+            raise ValueError(f"{name}字段步长必须大于0: {part}")
+        if rng == '*':
+            start, end = low, high
+        elif '-' in rng:
+            start_text, end_text = rng.split('-', 1)
+            start, end = _parse_value(start_text, names), _parse_value(end_text, names)
+        else:
+            start = _parse_value(rng, names)
+            end = high if step_text else start
+        if not (low <= start <= high and low <= end <= high) or start > end:
+            raise ValueError(f"{name}字段取值超出范围({low}-{high}): {part}")
+        values.update(range(start, end + 1, step))
+    if name == 'weekday' and 7 in values:
+        values.discard(7)
+        values.add(0)
+    return values
+
+
+class CronExpression:
+    """
+    cron表达式
+
+    用法:
+        cron = CronExpression("28 16 * * 1-5")
+        cron.next_fire(datetime.datetime.now())  # 下一次触发时间（分钟精度）
+    """
+
+    def __init__(self, expression):
+        parts = str(expression).split()
+        if len(parts) != 5:
+            raise ValueError(f"cron表达式应为5段（分 时 日 月 周）: {expression}")
+        self.expression = ' '.join(parts)
+        fields = [_parse_field(text, *spec) for text, spec in zip(parts, _FIELDS)]
+        self.minutes, self.hours, self.days, self.months, self.weekdays = fields
+
+    def _day_matches(self, date):
+        if self.months is not None and date.month not in self.months:
+            return False
+        if self.days is None and self.weekdays is None:
+            return True
+        # cron的weekday中周日为0，Python的weekday中周一为0
+        day_ok = self.days is not None and date.day in self.days
+        weekday_ok = self.weekdays is not None and (date.weekday() + 1) % 7 in self.weekdays
+        if self.days is None:
+            return weekday_ok
+        if self.weekdays is None:
+            return day_ok
+        return day_ok or weekday_ok
+
+    def _times(self):
+        hours = sorted(self.hours) if self.hours is not None else range(24)
+        minutes = sorted(self.minutes) if self.minutes is not None else range(60)
+        return hours, minutes
+
+    def next_fire(self, after):
+        """
+        计算严格晚于after的下一次触发时间
+
+        参数:
+            after: datetime
+
+        返回:
+            datetime（秒和微秒为0），表达式永远不会触发时返回None
+        """
+        start = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        hours, minutes = self._times()
+        date = start.date()
+        for offset in range(_MAX_SEARCH_DAYS):
+            if self._day_matches(date):
+                for hour in hours:
+                    if offset == 0 and hour < start.hour:
+                        continue
+                    for minute in minutes:
+                        if offset == 0 and hour == start.hour and minute < start.minute:
+                            continue
+                        return datetime.datetime.combine(date, datetime.time(hour, minute))
+            date += datetime.timedelta(days=1)
+        return None
+
+    def __repr__(self):
+        return f"CronExpression({self.expression!r})"
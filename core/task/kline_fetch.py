@@ -0,0 +1,150 @@
+"""
+定时任务K线获取的共享层：并发请求合并 + 按收盘时间判断新鲜度的缓存
+
+多个任务同时请求同一（数据源, 市场, 股票, 复权, 日期范围）时只发起一次下载，其余请求等待同一结果；
+下载成功的记录保存在SQLite中，在该市场下一次收盘之前重复请求直接复用已保存的CSV，
+因此同一股票每个交易日最多只下载一次（跨任务、跨调度进程重启）。
+"""
+import datetime
+import os
+import threading
+from concurrent.futures import Future
+
+import settings
+from common.logger import create_log
+from common.util_metrics import record_cache
+from common.util_sqlite import connect, transaction, init_schema
+
+logger = create_log('kline_fetch')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kline_fetch (
+    key TEXT PRIMARY KEY,
+    data_source TEXT NOT NULL,
+    stock_code TEXT NOT NULL,
+    csv_name TEXT NOT NULL,
+    fetched_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_kline_fetch_time ON kline_fetch (fetched_at);
+"""
+
+_initialized = set()
+
+
+def last_market_close(market, now=None):
+    """
+    计算不晚于now的最近一次收盘时间（本地时间，收盘时间见settings.MARKET_CLOSE_TIMES）
+
+    参数:
+        market: 市场，如 hk、cn、us
+        now: 当前时间，默认为datetime.now()
+
+    返回:
+        datetime
+    """
+    now = now or datetime.datetime.now()
+    close_time = settings.MARKET_CLOSE_TIMES.get(str(market).upper(), '00:00')
+    hour, minute = (int(x) for x in close_time.split(':'))
+    close = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if close > now:
+        close -= datetime.timedelta(days=1)
+    return close
+
+
+class KlineFetchCache:
+    """
+    用法:
+        success, csv_name = kline_fetch_cache.fetch('futu', 'hk', 'HK.00700', 'qfq', start, end,
+                                                    lambda: download(...), info=info)
+    loader返回 (success, csv_name)，与各数据源的 get_single_*_history 一致；
+    传入info字典时写入info['cached']：复用已保存的CSV或等待进行中的下载为True，本次调用loader下载为False
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = str(db_path or settings.kline_fetch_db)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if (os.getpid(), self.db_path) not in _initialized:
+            init_schema(self.db_path, _SCHEMA)
+            _initialized.add((os.getpid(), self.db_path))
+        return self.db_path
+
+    def _lookup(self, key, data_source, market, now):
+        row = connect(self._db()).execute(
+            "SELECT csv_name, fetched_at FROM kline_fetch WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        fetched_at = datetime.datetime.strptime(row['fetched_at'], '%Y-%m-%d %H:%M:%S')
+        if fetched_at < last_market_close(market, now):
+            return None
+        # CSV被手工删除时重新下载
+        if not os.path.exists(os.path.join(settings.stock_data_root, data_source, row['csv_name'])):
+            return None
+        return row['csv_name']
+
+    def _store(self, key, data_source, stock_code, csv_name, now):
+        with transaction(self._db()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO kline_fetch (key, data_source, stock_code, csv_name, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, data_source, stock_code, csv_name, now.strftime('%Y-%m-%d %H:%M:%S')))
+
+    def fetch(self, data_source, market, stock_code, adjust_type, start_date, end_date, loader, info=None):
+        """
+        获取K线CSV：缓存新鲜时直接返回；同一请求正在下载时等待其结果；否则调用loader下载
+
+        参数:
+            info: 可选字典，返回前写入cached（是否命中缓存，见类说明）
+
+        返回:
+            tuple: (success, csv_name)
+        """
+        key = '|'.join(str(x) for x in (data_source, str(market).upper(), stock_code, adjust_type,
+                                         start_date, end_date))
+        info = info if info is not None else {}
+        now = datetime.datetime.now()
+        csv_name = self._lookup(key, data_source, market, now)
+        info['cached'] = bool(csv_name)
+        if csv_name:
+            record_cache('kline_fetch', True)
+            logger.info(f"复用今日已获取的K线数据: {stock_code}, {csv_name}")
+            return True, csv_name
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        info['cached'] = not owner
+        if not owner:
+            record_cache('kline_fetch', True)
+            logger.info(f"等待进行中的K线下载: {stock_code}")
+            return future.result()
+
+        record_cache('kline_fetch', False)
+        try:
+            result = loader()
+            success, csv_name = result
+            if success and csv_name:
+                self._store(key, data_source, stock_code, csv_name, now)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self, before=None):
+        """删除fetched_at早于before的记录（默认全部删除），返回删除数量"""
+        with transaction(self._db()) as conn:
+            if before is None:
+                return conn.execute("DELETE FROM kline_fetch").rowcount
+            return conn.execute("DELETE FROM kline_fetch WHERE fetched_at < ?",
+                                (before.strftime('%Y-%m-%d %H:%M:%S'),)).rowcount
+
+
+kline_fetch_cache = KlineFetchCache()
@@ -0,0 +1,123 @@
+"""
+调度服务：独立于Web进程运行定时任务调度器和回测工作进程
+
+生产环境下Web由gunicorn多进程提供服务，定时任务和回测任务不能随每个Web进程各启动一份，
+因此由本服务单独运行，并通过文件锁保证同一时间只有一个调度器实例。
+任务配置、任务执行记录、回测任务队列均通过config/与result/下的存储共享，不依赖进程内全局变量。
+
+用法（在项目根目录下）：
+    python -m core.task.scheduler_service                # 定时任务调度器 + 回测工作进程
+    python -m core.task.scheduler_service --role scheduler
+    python -m core.task.scheduler_service --role worker --workers 4
+"""
+import argparse
+import os
+import sys
+import time
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import settings
+from common.logger import create_log
+
+logger = create_log('scheduler_service')
+
+
+class SingleInstanceLock:
+    """
+    基于文件锁的单实例锁，进程退出时操作系统自动释放
+    """
+
+    def __init__(self, lock_path):
+        self.lock_path = str(lock_path)
+        self._file = None
+
+    def acquire(self):
+        """
+        尝试获取锁（非阻塞）
+
+        返回:
+            bool: 是否获取成功
+        """
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        self._file = open(self.lock_path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.write(str(os.getpid()))
+        self._file.flush()
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def run_scheduler_service(role='all', workers=None):
+    """
+    运行调度服务（阻塞）
+
+    参数:
+        role: 'scheduler' 只运行定时任务调度器；'worker' 只运行回测工作进程；'all' 两者都运行
+        workers: 回测工作进程数量，默认settings.BACKTEST_WORKERS
+
+    返回:
+        bool: 未能获取单实例锁时返回False
+    """
+    if role in ('scheduler', 'all'):
+        lock = SingleInstanceLock(settings.scheduler_lock_file)
+        if not lock.acquire():
+            logger.warning(f"调度器已在其他进程中运行（锁文件: {settings.scheduler_lock_file}），本进程不再启动调度器")
+            if role == 'scheduler':
+                return False
+            role = 'worker'
+
+    if role in ('worker', 'all'):
+        from core.quant.backtest_job import start_workers
+        start_workers(workers)
+
+    if role == 'worker':
+        # 工作进程为守护进程，主进程需保持运行
+        while True:
+            time.sleep(60)
+
+    from core.task.task_timer import schedule_tasks
+    logger.info("启动任务定时器")
+    schedule_tasks()
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='定时任务调度与回测工作进程服务')
+    parser.add_argument('--role', choices=['all', 'scheduler', 'worker'], default='all')
+    parser.add_argument('--workers', type=int, default=None, help='回测工作进程数量')
+    args = parser.parse_args()
+    try:
+        if not run_scheduler_service(args.role, args.workers):
+            sys.exit(1)
+    except KeyboardInterrupt:
+        logger.info("用户中断，停止调度服务")
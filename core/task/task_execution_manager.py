@@ -1,53 +1,121 @@
 import json
 import os
-from datetime import datetime
+import sqlite3
+from datetime import datetime, timedelta
 from common.logger import create_log
+from common.util_sqlite import connect, transaction, init_schema
+import settings
 
 logger = create_log('task_execution')
 
+# 执行记录完整内容保存在data（JSON）中，查询与排序字段冗余为列并建索引
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_executions (
+    id TEXT PRIMARY KEY,
+    task_id TEXT,
+    status TEXT,
+    start_time TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_executions_task ON task_executions (task_id, start_time);
+CREATE INDEX IF NOT EXISTS idx_task_executions_status ON task_executions (status, start_time);
+CREATE INDEX IF NOT EXISTS idx_task_executions_start ON task_executions (start_time);
+
+-- 每次执行中各阶段（fetch、backtest、signals、report、notify）的耗时记录，stock为空表示任务级阶段
+CREATE TABLE IF NOT EXISTS task_execution_spans (
+    execution_id TEXT NOT NULL,
+    task_id TEXT,
+    stock TEXT,
+    stage TEXT NOT NULL,
+    status TEXT,
+    start_time TEXT,
+    duration_ms REAL,
+    bytes INTEGER,
+    bars INTEGER,
+    attempts INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_task_execution_spans_exec ON task_execution_spans (execution_id);
+CREATE INDEX IF NOT EXISTS idx_task_execution_spans_task ON task_execution_spans (task_id, stage);
+
+CREATE TABLE IF NOT EXISTS task_store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_initialized = set()
+
+_SPAN_FIELDS = ('stock', 'stage', 'status', 'start_time', 'duration_ms', 'bytes', 'bars', 'attempts', 'error')
+
+
+def _percentile(sorted_values, pct):
+    """最近秩法百分位数，sorted_values需已升序排列"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
 
 class TaskExecutionManager:
     """
     任务执行记录管理器，用于存储和管理定时任务的执行历史
+    数据存储在SQLite（WAL模式）中，按行更新；首次使用时自动迁移旧版JSON文件
     """
 
-    def __init__(self, file_path=None):
-        if file_path is None:
-            self.file_path = os.path.join(
-                os.path.dirname(os.path.abspath(__file__)),
-                '../../config',
-                'task_executions.json'
-            )
-        else:
-            self.file_path = file_path
-        self._ensure_file_exists()
-
-    def _ensure_file_exists(self):
-        config_dir = os.path.dirname(self.file_path)
-        if not os.path.exists(config_dir):
-            os.makedirs(config_dir)
-            logger.info(f"创建配置目录: {config_dir}")
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-            logger.info(f"创建空执行记录文件: {self.file_path}")
+    def __init__(self, file_path=None, db_path=None):
+        self.file_path = str(file_path or settings.task_executions_file)
+        self.db_path = str(db_path or settings.task_db)
+
+    def _db(self):
+        """初始化表结构（每个进程一次），并在首次使用时导入旧版JSON执行记录"""
+        key = (os.getpid(), self.db_path)
+        if key not in _initialized:
+            init_schema(self.db_path, _SCHEMA)
+            with transaction(self.db_path) as conn:
+                migrated = conn.execute(
+                    "SELECT value FROM task_store_meta WHERE key = 'executions_migrated'").fetchone()
+                if migrated is None:
+                    count = self._migrate_json(conn)
+                    conn.execute("INSERT INTO task_store_meta (key, value) VALUES ('executions_migrated', ?)",
+                                 (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+                    if count:
+                        logger.info(f"从 {self.file_path} 迁移了 {count} 条执行记录")
+            _initialized.add(key)
+        return self.db_path
 
-    def _read_executions(self):
+    def _migrate_json(self, conn):
+        if not os.path.exists(self.file_path):
+            return 0
         try:
             with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                executions = json.load(f)
         except Exception as e:
-            logger.error(f"读取执行记录文件失败: {e}")
-            return []
+            logger.error(f"读取旧版执行记录文件失败，跳过迁移: {e}")
+            return 0
+        for execution in executions:
+            if execution.get('id'):
+                self._insert(conn, execution, ignore=True)
+        return len(executions)
+
+    @staticmethod
+    def _insert(conn, execution, ignore=False):
+        conn.execute(
+            f"INSERT {'OR IGNORE ' if ignore else ''}INTO task_executions (id, task_id, status, start_time, data) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (execution['id'], execution.get('task_id'), execution.get('status'), execution.get('start_time'),
+             json.dumps(execution, ensure_ascii=False)))
 
-    def _write_executions(self, executions):
+    def _read_executions(self, where='', params=(), limit=None):
         try:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(executions, f, ensure_ascii=False, indent=2)
-            return True
+            sql = f"SELECT data FROM task_executions {where} ORDER BY start_time DESC"
+            if limit is not None:
+                sql += f" LIMIT {int(limit)}"
+            rows = connect(self._db()).execute(sql, params).fetchall()
+            return [json.loads(row['data']) for row in rows]
         except Exception as e:
-            logger.error(f"写入执行记录文件失败: {e}")
-            return False
+            logger.error(f"读取执行记录失败: {e}")
+            return []
 
     def create(self, task_id, task_name, status='running', details=None, stocks=None):
         execution = {
@@ -64,17 +132,22 @@ class TaskExecutionManager:
             'stocks_success': 0,
             'stocks_failed': 0
         }
-        executions = self._read_executions()
-        executions.append(execution)
-        if self._write_executions(executions):
-            logger.info(f"创建执行记录: {execution['id']} (任务: {task_name})")
-            return execution
-        return None
+        try:
+            with transaction(self._db()) as conn:
+                self._insert(conn, execution)
+        except sqlite3.Error as e:
+            logger.error(f"写入执行记录失败: {e}")
+            return None
+        logger.info(f"创建执行记录: {execution['id']} (任务: {task_name})")
+        return execution
 
     def update(self, execution_id, status=None, details=None, stocks_processed=None, stocks_success=None, stocks_failed=None):
-        executions = self._read_executions()
-        for i, exec_record in enumerate(executions):
-            if exec_record.get('id') == execution_id:
+        try:
+            with transaction(self._db()) as conn:
+                row = conn.execute("SELECT data FROM task_executions WHERE id = ?", (execution_id,)).fetchone()
+                if row is None:
+                    return None
+                exec_record = json.loads(row['data'])
                 if status:
                     exec_record['status'] = status
                 if details:
@@ -90,50 +163,127 @@ class TaskExecutionManager:
                     start = datetime.strptime(exec_record['start_time'], '%Y-%m-%d %H:%M:%S')
                     end = datetime.strptime(exec_record['end_time'], '%Y-%m-%d %H:%M:%S')
                     exec_record['duration'] = round((end - start).total_seconds(), 2)
-                self._write_executions(executions)
-                logger.info(f"更新执行记录: {execution_id}, status: {status}")
-                return exec_record
-        return None
+                conn.execute("UPDATE task_executions SET status = ?, data = ? WHERE id = ?",
+                             (exec_record['status'], json.dumps(exec_record, ensure_ascii=False), execution_id))
+        except sqlite3.Error as e:
+            logger.error(f"更新执行记录失败: {execution_id}, {e}")
+            return None
+        logger.info(f"更新执行记录: {execution_id}, status: {status}")
+        return exec_record
 
     def read(self, execution_id):
-        executions = self._read_executions()
-        for exec_record in executions:
-            if exec_record.get('id') == execution_id:
-                return exec_record
-        return None
+        executions = self._read_executions("WHERE id = ?", (execution_id,))
+        if not executions:
+            return None
+        execution = executions[0]
+        execution['spans'] = self.read_spans(execution_id)
+        return execution
+
+    def add_spans(self, execution_id, task_id, spans):
+        """
+        保存一次执行的阶段span
+
+        参数:
+            spans: StageRunner记录的span列表，每项包含stage、status、start_time、duration_ms，
+                   以及可选的stock、bytes（获取字节数）、bars（回测K线数）、attempts、error
+        """
+        if not spans:
+            return 0
+        rows = [(execution_id, task_id) + tuple(span.get(field) for field in _SPAN_FIELDS)
+                for span in spans if span.get('stage')]
+        try:
+            with transaction(self._db()) as conn:
+                conn.executemany(
+                    f"INSERT INTO task_execution_spans (execution_id, task_id, {', '.join(_SPAN_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * (len(_SPAN_FIELDS) + 2))})", rows)
+        except sqlite3.Error as e:
+            logger.error(f"写入阶段耗时记录失败: {execution_id}, {e}")
+            return 0
+        return len(rows)
+
+    def read_spans(self, execution_id):
+        try:
+            rows = connect(self._db()).execute(
+                f"SELECT {', '.join(_SPAN_FIELDS)} FROM task_execution_spans WHERE execution_id = ? "
+                "ORDER BY start_time", (execution_id,)).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"读取阶段耗时记录失败: {execution_id}, {e}")
+            return []
+        return [{k: v for k, v in dict(row).items() if v is not None} for row in rows]
+
+    def stage_stats(self, task_id=None, runs=20):
+        """
+        统计最近若干次执行中各阶段的耗时分布
+
+        参数:
+            task_id: 只统计该任务，为None时统计所有任务
+            runs: 统计最近的执行次数
+
+        返回:
+            dict: {'runs': 实际统计的执行次数, 'stages': {stage: {count, cached, failed, p50_ms, p90_ms, p99_ms,
+                   max_ms, mean_ms, bytes, bars}}}；p*_ms只统计实际执行（非复用）的span
+        """
+        where, params = ("WHERE task_id = ?", (task_id,)) if task_id else ("", ())
+        try:
+            conn = connect(self._db())
+            execution_ids = [row['id'] for row in conn.execute(
+                f"SELECT id FROM task_executions {where} ORDER BY start_time DESC LIMIT ?",
+                params + (int(runs),)).fetchall()]
+            rows = conn.execute(
+                f"SELECT stage, status, duration_ms, bytes, bars FROM task_execution_spans "
+                f"WHERE execution_id IN ({', '.join('?' * len(execution_ids))})", execution_ids).fetchall() \
+                if execution_ids else []
+        except sqlite3.Error as e:
+            logger.error(f"统计阶段耗时失败: {e}")
+            return {'runs': 0, 'stages': {}}
+
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(row['stage'], []).append(row)
+        stages = {}
+        for stage, stage_rows in grouped.items():
+            durations = sorted(row['duration_ms'] for row in stage_rows
+                               if row['status'] != 'cached' and row['duration_ms'] is not None)
+            stages[stage] = {
+                'count': len(stage_rows),
+                'cached': sum(1 for row in stage_rows if row['status'] == 'cached'),
+                'failed': sum(1 for row in stage_rows if row['status'] == 'failed'),
+                'p50_ms': _percentile(durations, 50),
+                'p90_ms': _percentile(durations, 90),
+                'p99_ms': _percentile(durations, 99),
+                'max_ms': durations[-1] if durations else None,
+                'mean_ms': round(sum(durations) / len(durations), 1) if durations else None,
+                'bytes': sum(row['bytes'] or 0 for row in stage_rows),
+                'bars': sum(row['bars'] or 0 for row in stage_rows),
+            }
+        return {'runs': len(execution_ids), 'stages': stages}
 
     def read_by_task(self, task_id, limit=50):
-        executions = self._read_executions()
-        task_executions = [e for e in executions if e.get('task_id') == task_id]
-        task_executions.sort(key=lambda x: x.get('start_time', ''), reverse=True)
-        return task_executions[:limit]
+        return self._read_executions("WHERE task_id = ?", (task_id,), limit=limit)
+
+    def read_by_status(self, status, limit=100):
+        return self._read_executions("WHERE status = ?", (status,), limit=limit)
 
     def read_all(self, limit=100):
-        executions = self._read_executions()
-        executions.sort(key=lambda x: x.get('start_time', ''), reverse=True)
-        return executions[:limit]
+        return self._read_executions(limit=limit)
 
     def delete(self, execution_id):
-        executions = self._read_executions()
-        executions = [e for e in executions if e.get('id') != execution_id]
-        return self._write_executions(executions)
-
-    def delete_old(self, days=30):
-        executions = self._read_executions()
-        cutoff = datetime.now() - datetime.timedelta(days=days)
-        old_count = 0
-        new_list = []
-        for e in executions:
-            try:
-                exec_time = datetime.strptime(e.get('start_time', ''), '%Y-%m-%d %H:%M:%S')
-                if exec_time >= cutoff:
-                    new_list.append(e)
-                else:
-                    old_count += 1
-            except:
-                new_list.append(e)
+        try:
+            with transaction(self._db()) as conn:
+                conn.execute("DELETE FROM task_executions WHERE id = ?", (execution_id,))
+                conn.execute("DELETE FROM task_execution_spans WHERE execution_id = ?", (execution_id,))
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"删除执行记录失败: {execution_id}, {e}")
+            return False
+
+    def delete_old(self, days=None):
+        days = settings.TASK_EXECUTION_RETENTION_DAYS if days is None else days
+        cutoff = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        with transaction(self._db()) as conn:
+            old_count = conn.execute("DELETE FROM task_executions WHERE start_time < ?", (cutoff,)).rowcount
+            conn.execute("DELETE FROM task_execution_spans WHERE start_time < ?", (cutoff,))
         if old_count > 0:
-            self._write_executions(new_list)
             logger.info(f"删除了 {old_count} 条过期执行记录")
         return old_count
 
@@ -1,38 +1,78 @@
-# 保存为 core/task/task_manager.py
 import json
 import os
+import sqlite3
 from datetime import datetime
 from common.logger import create_log
+from common.util_sqlite import connect, transaction, init_schema
 import random
+import settings
 
 logger = create_log('task_manager')
 
+# 任务完整内容保存在data（JSON）中，常用查询字段冗余为列并建索引
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    name TEXT,
+    type TEXT,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    data TEXT NOT NULL,
+    create_time TEXT,
+    update_time TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_enabled ON tasks (enabled);
+CREATE INDEX IF NOT EXISTS idx_tasks_type ON tasks (type);
+
+CREATE TABLE IF NOT EXISTS task_store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# 可直接下推到SQL条件的字段（其余字段在Python中过滤）
+_INDEXED_FIELDS = ('id', 'name', 'type', 'enabled')
+
+
+def _sql_filter_value(key, value):
+    """
+    索引字段的查询值能否在SQL中按相等比较，结果与逐个任务比较 task[key] == value 相同
+
+    Returns:
+        tuple: (是否可以在SQL中过滤, SQL参数值)；enabled只接受bool或0/1（如字符串"false"留给逐个比较，不匹配任何任务），
+               其余字段只接受字符串
+    """
+    if key == 'enabled':
+        if isinstance(value, bool) or (isinstance(value, int) and value in (0, 1)):
+            return True, int(value)
+        return False, None
+    return isinstance(value, str), value
+
+_initialized = set()
+
+
+def _bump_version(conn):
+    """任务每次变更时递增版本号，调度器据此判断是否需要重新加载任务"""
+    conn.execute("INSERT INTO task_store_meta (key, value) VALUES ('tasks_version', '1') "
+                 "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
 
 class TaskManager:
     """
     任务管理器类，用于处理任务实体的增删改查操作
-    数据存储在JSON文件中
+    数据存储在SQLite（WAL模式）中，Web进程与调度进程可并发读写；首次使用时自动迁移旧版JSON文件
     """
 
-    def __init__(self, file_path=None):
+    def __init__(self, file_path=None, db_path=None):
         """
         初始化任务管理器
 
         Args:
-            file_path: JSON文件路径，如果不提供则使用默认路径
+            file_path: 旧版JSON文件路径（用于迁移），如果不提供则使用默认路径
+            db_path: SQLite数据库路径，如果不提供则使用 settings.task_db
         """
-        if file_path is None:
-            # 使用默认配置文件路径
-            self.file_path = os.path.join(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-                '../config',
-                'scheduled_tasks.json'
-            )
-        else:
-            self.file_path = file_path
-
-        # 确保文件存在
-        self._ensure_file_exists()
+        self.file_path = str(file_path or settings.scheduled_tasks_file)
+        self.db_path = str(db_path or settings.task_db)
 
         # 默认配置
         self.default_target_stocks = [
@@ -45,56 +85,79 @@ class TaskManager:
             "init_cash": 5000000
         }
 
-    def _ensure_file_exists(self):
+        # 确保数据库存在并完成迁移
+        self._ensure_db()
+
+    def _ensure_db(self):
         """
-        确保配置文件和目录存在
+        初始化表结构，并在首次使用时导入旧版JSON任务文件
         """
-        config_dir = os.path.dirname(self.file_path)
-        if not os.path.exists(config_dir):
-            os.makedirs(config_dir)
-            logger.info(f"创建配置目录: {config_dir}")
-
+        key = (os.getpid(), self.db_path)
+        if key in _initialized:
+            return
+        init_schema(self.db_path, _SCHEMA)
+        with transaction(self.db_path) as conn:
+            migrated = conn.execute("SELECT value FROM task_store_meta WHERE key = 'tasks_migrated'").fetchone()
+            if migrated is None:
+                count = self._migrate_json(conn)
+                conn.execute("INSERT INTO task_store_meta (key, value) VALUES ('tasks_migrated', ?)",
+                             (datetime.now().strftime('%Y-%m-%d %H:%M:%S'),))
+                if count:
+                    _bump_version(conn)
+                    logger.info(f"从 {self.file_path} 迁移了 {count} 个任务")
+        _initialized.add(key)
+
+    def _migrate_json(self, conn):
         if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-            logger.info(f"创建空配置文件: {self.file_path}")
+            return 0
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as f:
+                tasks = json.load(f)
+        except Exception as e:
+            logger.error(f"读取旧版任务文件失败，跳过迁移: {e}")
+            return 0
+        for task in tasks:
+            if task.get('id'):
+                conn.execute(
+                    "INSERT OR IGNORE INTO tasks (id, name, type, enabled, data, create_time, update_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", self._row_values(task))
+        return len(tasks)
 
-    def _read_tasks(self):
+    @staticmethod
+    def _row_values(task):
+        return (task['id'], task.get('name'), task.get('type'), 1 if task.get('enabled', True) else 0,
+                json.dumps(task, ensure_ascii=False), task.get('create_time'), task.get('update_time'))
+
+    def _read_tasks(self, where='', params=()):
         """
-        从JSON文件中读取任务列表
+        从数据库中读取任务列表（按创建顺序）
 
         Returns:
             list: 任务列表
         """
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            rows = connect(self.db_path).execute(
+                f"SELECT data FROM tasks {where} ORDER BY seq", params).fetchall()
+            return [json.loads(row['data']) for row in rows]
         except Exception as e:
-            logger.error(f"读取任务文件失败: {e}")
+            logger.error(f"读取任务失败: {e}")
             return []
 
-    def _write_tasks(self, tasks):
-        """
-        将任务列表写入JSON文件
+    def _write_task(self, conn, task):
+        conn.execute(
+            "UPDATE tasks SET name = ?, type = ?, enabled = ?, data = ?, create_time = ?, update_time = ? "
+            "WHERE id = ?", self._row_values(task)[1:] + (task['id'],))
 
-        Args:
-            tasks: 任务列表
+    def version(self):
+        """
+        获取任务版本号（任务每次增删改都会递增），用于判断任务是否有变化
 
         Returns:
-            bool: 写入是否成功
+            int: 版本号
         """
-        try:
-            # 确保每个任务都有必要的字段
-            for task in tasks:
-                self._ensure_task_fields(task)
-
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(tasks, f, ensure_ascii=False, indent=2)
-            logger.info(f"保存了 {len(tasks)} 个任务")
-            return True
-        except Exception as e:
-            logger.error(f"写入任务文件失败: {e}")
-            return False
+        row = connect(self.db_path).execute(
+            "SELECT value FROM task_store_meta WHERE key = 'tasks_version'").fetchone()
+        return int(row['value']) if row else 0
 
     def _ensure_task_fields(self, task):
         """
@@ -124,20 +187,12 @@ class TaskManager:
         Returns:
             dict: 创建的任务（包含id和时间戳），失败返回None
         """
-        # 读取现有任务
-        tasks = self._read_tasks()
-
         # 为新任务添加必要字段
         task = task_data.copy()
 
         # id，生成一个
         task['id'] = f"task_{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
-        # 检查ID是否已存在
-        if any(t['id'] == task['id'] for t in tasks):
-            logger.warning(f"任务ID已存在: {task['id']}，重新生成ID")
-            task['id'] = f"task_{datetime.now().strftime('%Y%m%d%H%M%S')}_{random.randint(1000, 9999)}"
-
         # 添加时间戳
         current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         task['create_time'] = current_time
@@ -146,16 +201,21 @@ class TaskManager:
         # 确保必要字段存在
         self._ensure_task_fields(task)
 
-        # 添加到任务列表
-        tasks.append(task)
-
-        # 写入文件
-        if self._write_tasks(tasks):
-            logger.info(f"创建任务成功: {task['name']} (ID: {task['id']})")
-            return task
-        else:
-            logger.error(f"创建任务失败: {task['name']}")
+        try:
+            with transaction(self.db_path) as conn:
+                # 检查ID是否已存在
+                if conn.execute("SELECT 1 FROM tasks WHERE id = ?", (task['id'],)).fetchone():
+                    logger.warning(f"任务ID已存在: {task['id']}，重新生成ID")
+                    task['id'] = f"task_{datetime.now().strftime('%Y%m%d%H%M%S')}_{random.randint(1000, 9999)}"
+                conn.execute(
+                    "INSERT INTO tasks (id, name, type, enabled, data, create_time, update_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", self._row_values(task))
+                _bump_version(conn)
+        except sqlite3.Error as e:
+            logger.error(f"创建任务失败: {task.get('name')}, {e}")
             return None
+        logger.info(f"创建任务成功: {task.get('name')} (ID: {task['id']})")
+        return task
 
     def read(self, task_id):
         """
@@ -167,10 +227,9 @@ class TaskManager:
         Returns:
             dict: 任务信息，如果不存在返回None
         """
-        tasks = self._read_tasks()
-        for task in tasks:
-            if task.get('id') == task_id:
-                return task
+        tasks = self._read_tasks("WHERE id = ?", (task_id,))
+        if tasks:
+            return tasks[0]
         logger.warning(f"未找到任务: {task_id}")
         return None
 
@@ -196,11 +255,14 @@ class TaskManager:
         Returns:
             dict: 更新后的任务，如果不存在返回None
         """
-        tasks = self._read_tasks()
-        updated = False
-
-        for i, task in enumerate(tasks):
-            if task.get('id') == task_id:
+        try:
+            # 读取与写入在同一个写事务中完成，避免并发更新互相覆盖
+            with transaction(self.db_path) as conn:
+                row = conn.execute("SELECT data FROM tasks WHERE id = ?", (task_id,)).fetchone()
+                if row is None:
+                    logger.error(f"更新任务失败，未找到任务: {task_id}")
+                    return None
+                task = json.loads(row['data'])
                 # 保留不变的字段
                 original_create_time = task.get('create_time')
 
@@ -211,18 +273,16 @@ class TaskManager:
                 task['id'] = task_id
                 # 保留创建时间
                 task['create_time'] = original_create_time
-                # 更新修改时间
-                task['update_time'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-                updated = True
-                break
+                # 更新修改时间，确保必要字段存在
+                self._ensure_task_fields(task)
 
-        if updated and self._write_tasks(tasks):
-            logger.info(f"更新任务成功: {task_id}")
-            return task
-        else:
-            logger.error(f"更新任务失败: {task_id}")
+                self._write_task(conn, task)
+                _bump_version(conn)
+        except sqlite3.Error as e:
+            logger.error(f"更新任务失败: {task_id}, {e}")
             return None
+        logger.info(f"更新任务成功: {task_id}")
+        return task
 
     def delete(self, task_id):
         """
@@ -234,21 +294,19 @@ class TaskManager:
         Returns:
             bool: 删除是否成功
         """
-        tasks = self._read_tasks()
-        original_length = len(tasks)
-
-        # 过滤掉要删除的任务
-        tasks = [task for task in tasks if task.get('id') != task_id]
-
-        # 检查是否删除了任务
-        if len(tasks) < original_length:
-            success = self._write_tasks(tasks)
-            if success:
-                logger.info(f"删除任务成功: {task_id}")
-            return success
-        else:
-            logger.error(f"未找到任务: {task_id}")
+        try:
+            with transaction(self.db_path) as conn:
+                deleted = conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,)).rowcount
+                if deleted:
+                    _bump_version(conn)
+        except sqlite3.Error as e:
+            logger.error(f"删除任务失败: {task_id}, {e}")
             return False
+        if deleted:
+            logger.info(f"删除任务成功: {task_id}")
+            return True
+        logger.error(f"未找到任务: {task_id}")
+        return False
 
     def query(self, filters=None):
         """
@@ -260,15 +318,24 @@ class TaskManager:
         Returns:
             list: 符合条件的任务列表
         """
-        tasks = self._read_tasks()
-
         if filters is None or not filters:
-            return tasks
+            return self._read_tasks()
+
+        # 有索引的字段直接在SQL中过滤
+        conditions, params, remaining = [], [], {}
+        for key, value in filters.items():
+            pushdown, sql_value = _sql_filter_value(key, value) if key in _INDEXED_FIELDS else (False, None)
+            if pushdown:
+                conditions.append(f"{key} = ?")
+                params.append(sql_value)
+            else:
+                remaining[key] = value
+        tasks = self._read_tasks(f"WHERE {' AND '.join(conditions)}" if conditions else '', params)
 
         filtered_tasks = []
         for task in tasks:
             match = True
-            for key, value in filters.items():
+            for key, value in remaining.items():
                 # 支持嵌套查询，例如 "backtest_config.strategy": "EnhancedVolumeStrategy"
                 if '.' in key:
                     nested_keys = key.split('.')
@@ -324,8 +391,7 @@ class TaskManager:
         Returns:
             int: 任务数量
         """
-        tasks = self._read_tasks()
-        return len(tasks)
+        return connect(self.db_path).execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
 
     def exists(self, task_id):
         """
@@ -337,7 +403,7 @@ class TaskManager:
         Returns:
             bool: 任务是否存在
         """
-        return self.read(task_id) is not None
+        return connect(self.db_path).execute("SELECT 1 FROM tasks WHERE id = ?", (task_id,)).fetchone() is not None
 
 
 if __name__ == '__main__':
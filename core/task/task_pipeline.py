@@ -0,0 +1,181 @@
+"""
+定时任务分阶段执行：每个阶段（获取、回测、信号、报告、通知）独立重试，产出按内容键登记
+
+阶段的内容键由其输入计算（如回测阶段为CSV文件大小/修改时间+回测配置，报告阶段为信号阶段的键），
+重新执行任务时，输入未变化且上次已成功的阶段直接复用登记的产出，不再重复执行。
+例如PDF发送失败后重跑任务，不会重新获取数据和回测。
+"""
+import datetime
+import hashlib
+import json
+import os
+import time
+
+import settings
+from common.logger import create_log
+from common.util_metrics import record_cache
+from common.util_sqlite import connect, transaction, init_schema
+
+logger = create_log('task_pipeline')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_stage_artifacts (
+    task_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    key TEXT NOT NULL,
+    output TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (task_id, stage, key)
+);
+CREATE INDEX IF NOT EXISTS idx_task_stage_artifacts_time ON task_stage_artifacts (created_at);
+"""
+
+_initialized = set()
+
+
+class StageError(Exception):
+    """阶段在重试后仍然失败"""
+
+
+def content_key(*parts):
+    """根据阶段输入计算内容键（输入需可JSON序列化，不可序列化的对象按str处理）"""
+    data = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()[:32]
+
+
+def file_key(path):
+    """文件的内容标识（路径+大小+修改时间），文件不存在时返回None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def artifact_dir(task_id):
+    """任务阶段产出文件（信号表、PDF等）的保存目录"""
+    path = os.path.join(settings.task_artifact_root, str(task_id))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _db():
+    db_path = str(settings.task_db)
+    if (os.getpid(), db_path) not in _initialized:
+        init_schema(db_path, _SCHEMA)
+        _initialized.add((os.getpid(), db_path))
+    return db_path
+
+
+class StageRunner:
+    """
+    用法:
+        runner = StageRunner(task_id)
+        output = runner.run('backtest', func, key=content_key(file_key(csv_path), backtest_config))
+
+    func返回可JSON序列化的产出；返回None或False、或抛出异常视为失败，按指数退避重试
+    """
+
+    def __init__(self, task_id, retries=None, backoff=None):
+        self.task_id = task_id
+        self.retries = settings.TASK_STAGE_RETRIES if retries is None else retries
+        self.backoff = settings.TASK_STAGE_BACKOFF if backoff is None else backoff
+        # 每次run记录一个span：阶段、状态（success/cached/failed）、尝试次数、开始时间、耗时（毫秒）
+        self.spans = []
+
+    def lookup(self, stage, key):
+        row = connect(_db()).execute(
+            "SELECT output FROM task_stage_artifacts WHERE task_id = ? AND stage = ? AND key = ?",
+            (self.task_id, stage, key)).fetchone()
+        return json.loads(row['output']) if row else None
+
+    def record(self, stage, key, output):
+        with transaction(_db()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO task_stage_artifacts (task_id, stage, key, output, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.task_id, stage, key, json.dumps(output, ensure_ascii=False),
+                 datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def run(self, stage, func, key=None, retries=None, validate=None, span=None):
+        """
+        执行一个阶段
+
+        参数:
+            stage: 阶段名称（同一任务内按 stage+key 登记产出）
+            func: 阶段函数，无参数
+            key: 内容键，为None时不复用也不登记产出（如获取阶段由K线缓存负责去重）
+            retries: 覆盖默认重试次数
+            validate: 复用登记的产出前的校验函数（如检查产出文件仍然存在），返回False时重新执行
+            span: 附加到本次span的字段（如股票代码），该字典即为记录到spans中的span，调用方可在返回后继续补充
+
+        返回:
+            阶段产出
+
+        异常:
+            StageError: 重试后仍然失败
+        """
+        span = span if span is not None else {}
+        span.update(stage=stage, start_time=datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
+                    attempts=0)
+        self.spans.append(span)
+        start = time.perf_counter()
+
+        def finish(status, error=None):
+            span['status'] = status
+            span['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            if error:
+                span['error'] = error
+
+        if key is not None:
+            output = self.lookup(stage, key)
+            if output is not None and (validate is None or validate(output)):
+                record_cache('task_stage', True)
+                logger.info(f"阶段输入未变化，复用上次产出: {self.task_id}/{stage}")
+                finish('cached')
+                return output
+            record_cache('task_stage', False)
+
+        retries = self.retries if retries is None else retries
+        last_error = None
+        for attempt in range(retries + 1):
+            if attempt:
+                delay = self.backoff * (2 ** (attempt - 1))
+                logger.warning(f"阶段执行失败，{delay}秒后第{attempt}次重试: {self.task_id}/{stage}, {last_error}")
+                time.sleep(delay)
+            span['attempts'] = attempt + 1
+            try:
+                output = func()
+            except Exception as e:
+                last_error = str(e)
+                continue
+            if output is None or output is False:
+                last_error = '阶段未产出结果'
+                continue
+            if key is not None:
+                self.record(stage, key, output)
+            finish('success')
+            return output
+        finish('failed', last_error)
+        raise StageError(f"{stage}: {last_error}")
+
+
+def delete_old_artifacts(days=None):
+    """删除超过保留天数的阶段产出登记及产出文件，返回删除的登记数量"""
+    days = settings.TASK_EXECUTION_RETENTION_DAYS if days is None else days
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    with transaction(_db()) as conn:
+        count = conn.execute("DELETE FROM task_stage_artifacts WHERE created_at < ?",
+                             (cutoff.strftime('%Y-%m-%d %H:%M:%S'),)).rowcount
+    root = str(settings.task_artifact_root)
+    for folder, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(folder, name)
+            try:
+                if os.path.getmtime(path) < cutoff.timestamp():
+                    os.remove(path)
+            except OSError:
+                pass
+    if count:
+        logger.info(f"删除了 {count} 条过期阶段产出登记")
+    return count
@@ -0,0 +1,156 @@
+"""
+定时任务调度器
+
+按cron表达式计算每个任务的下次触发时间，放入按时间排序的小顶堆，主循环只检查堆顶。
+任务配置通过TaskManager的版本号检测变化，版本未变时不读取任务；有变化时只重新调度内容改变的任务。
+同一任务上一次执行尚未结束时跳过本次触发，避免长任务被重复启动。
+"""
+import datetime
+import heapq
+import itertools
+import json
+import threading
+
+from common.logger import create_log
+from core.task.cron import CronExpression
+from core.task.task_manager import TaskManager
+
+logger = create_log('task_scheduler')
+
+
+class _Entry:
+    def __init__(self, task, cron, fingerprint):
+        self.task = task
+        self.cron = cron
+        self.fingerprint = fingerprint
+        self.next_fire = None
+
+
+class TaskScheduler:
+    """
+    用法:
+        scheduler = TaskScheduler(process_task)
+        while True:
+            scheduler.sync()          # 任务有变化时增量更新调度
+            scheduler.run_pending()   # 启动到期任务（每个任务在独立线程中执行）
+            time.sleep(1)
+    """
+
+    def __init__(self, job_func, task_manager=None):
+        self.job_func = job_func
+        self.task_manager = task_manager or TaskManager()
+        self.entries = {}  # task_id -> _Entry
+        self._heap = []  # (下次触发时间, 序号, task_id, entry)
+        self._counter = itertools.count()
+        self._version = None
+        self._running = {}  # task_id -> Thread
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _fingerprint(task):
+        # update_time在任务每次保存时都会变化，比较时忽略
+        return json.dumps({k: v for k, v in task.items() if k != 'update_time'}, sort_keys=True, ensure_ascii=False)
+
+    def _push(self, entry, task_id, now):
+        entry.next_fire = entry.cron.next_fire(now)
+        if entry.next_fire is not None:
+            heapq.heappush(self._heap, (entry.next_fire, next(self._counter), task_id, entry))
+
+    def sync(self, now=None, force=False):
+        """
+        根据任务配置增量更新调度：新增、删除、修改的任务分别加入、移出、重新计算触发时间，未变化的任务保持不动
+
+        返回:
+            bool: 是否检测到任务变化
+        """
+        version = self.task_manager.version()
+        if not force and version == self._version:
+            return False
+        now = now or datetime.datetime.now()
+        tasks = {task.get('id'): task for task in self.task_manager.query({'enabled': True}) if task.get('id')}
+        added, changed, removed = 0, 0, 0
+
+        for task_id in list(self.entries):
+            if task_id not in tasks:
+                # 堆中的过期条目在弹出时丢弃
+                del self.entries[task_id]
+                removed += 1
+
+        for task_id, task in tasks.items():
+            fingerprint = self._fingerprint(task)
+            entry = self.entries.get(task_id)
+            if entry is not None and entry.fingerprint == fingerprint:
+                continue
+            schedule_time = task.get('schedule_time', '')
+            try:
+                cron = CronExpression(schedule_time)
+            except ValueError as e:
+                logger.error(f"解析调度时间失败: {task.get('name')}, {schedule_time}, 错误: {str(e)}")
+                self.entries.pop(task_id, None)
+                continue
+            new_entry = _Entry(task, cron, fingerprint)
+            self.entries[task_id] = new_entry
+            self._push(new_entry, task_id, now)
+            if entry is None:
+                added += 1
+            else:
+                changed += 1
+            logger.info(f"调度任务: {task.get('name')}, 执行时间: {cron.expression}, 下次执行: {new_entry.next_fire}")
+
+        self._version = version
+        logger.info(f"调度任务更新完成，新增 {added}，修改 {changed}，删除 {removed}，共 {len(self.entries)} 个任务")
+        return True
+
+    def next_fire_time(self):
+        """最近一次的触发时间，没有任务时返回None"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _discard_stale(self):
+        while self._heap and self.entries.get(self._heap[0][2]) is not self._heap[0][3]:
+            heapq.heappop(self._heap)
+
+    def run_pending(self, now=None):
+        """
+        启动所有已到触发时间的任务
+
+        返回:
+            list: 本次启动的任务id
+        """
+        now = now or datetime.datetime.now()
+        started = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, _, task_id, entry = heapq.heappop(self._heap)
+            # 调度器阻塞期间错过的多次触发合并为一次，下一次从当前时间开始计算
+            self._push(entry, task_id, now)
+            if self._start(task_id, entry.task):
+                started.append(task_id)
+        return started
+
+    def is_running(self, task_id):
+        with self._lock:
+            thread = self._running.get(task_id)
+            return thread is not None and thread.is_alive()
+
+    def _start(self, task_id, task):
+        if self.is_running(task_id):
+            logger.warning(f"任务上一次执行尚未结束，跳过本次触发: {task.get('name')} (ID: {task_id})")
+            return False
+        thread = threading.Thread(target=self._run, args=(task_id, task), name=f"task-{task_id}")
+        with self._lock:
+            self._running[task_id] = thread
+        thread.start()
+        return True
+
+    def _run(self, task_id, task):
+        try:
+            self.job_func(task)
+        except Exception as e:
+            logger.error(f"任务执行异常: {task.get('name')} (ID: {task_id}), {str(e)}")
+        finally:
+            with self._lock:
+                if self._running.get(task_id) is threading.current_thread():
+                    del self._running[task_id]
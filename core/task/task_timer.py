@@ -1,22 +1,34 @@
 import os
 import schedule
+import threading
 import time
 import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
-from common.logger import create_log
+from common.logger import create_log, quiet_backtest
 from common.util_html import signals_to_html, save_clean_html
-from core.signal.signal_handler import signal_get, signals_analyze
-from core.stock import manager_akshare, manager_baostock, manager_futu
+from common.util_pdf import pdf_renderer
+from common.util_process import pool_context
+from core.signal.signal_handler import signals_query
+from core.signal.signal_store import get_latest_signal_files, compact_signal_files
 from core.task.task_manager import TaskManager
+from core.task.task_scheduler import TaskScheduler
+from core.task.kline_fetch import kline_fetch_cache
+from core.task.task_pipeline import StageRunner, StageError, content_key, file_key, artifact_dir, \
+    delete_old_artifacts
 from core.task.task_execution_manager import task_execution_manager
 from core.strategy.strategy_manager import global_strategy_manager
 from core.quant.quant_manage import run_backtest_enhanced_volume_strategy
+from core.quant.result_catalog import sync_result_catalog
 import settings
-from core.notification.wechat_notifier import send_wechat_message, send_wechat_report_pdf
+from core.notification.wechat_notifier import send_wechat_message
+from core.notification.notify_dispatcher import notify_dispatcher
 
 logger = create_log('task_timer')
 
-scheduled_jobs = []
+# 各数据源的K线获取并发限制
+_fetch_semaphores = {source: threading.BoundedSemaphore(limit)
+                     for source, limit in settings.TASK_FETCH_SOURCE_LIMITS.items()}
 
 def load_tasks():
     """
@@ -38,12 +50,36 @@ def load_tasks():
         return []
 
 
-def get_kline_data(stock_config):
+def _download_kline(data_source, market, stock_code, start_date, end_date, adjust_type):
+    """根据数据源和市场调用对应的下载函数，返回 (success, csv_name)"""
+    # 数据源SDK导入较慢，只导入本次用到的数据源模块
+    if data_source == 'akshare':
+        from core.stock import manager_akshare
+    elif data_source == 'baostock':
+        from core.stock import manager_baostock
+    elif data_source == 'futu':
+        from core.stock import manager_futu
+    if data_source == 'akshare' and market.upper() == 'HK':
+        return manager_akshare.get_single_hk_stock_history(stock_code, start_date, end_date, adjust_type)
+    elif data_source == 'akshare' and market.upper() == 'US':
+        return manager_akshare.get_single_us_history(stock_code, start_date, end_date, adjust_type)
+    elif data_source == 'baostock' and market.upper() == 'CN':
+        return manager_baostock.get_stock_history(stock_code, start_date, end_date, adjust_type)
+    elif data_source == 'futu' and market.upper() == 'HK':
+        return manager_futu.get_single_hk_stock_history(stock_code, start_date, end_date, adjust_type)
+    elif data_source == 'futu' and market.upper() == 'CN':
+        return manager_futu.get_single_cn_stock_history(stock_code, start_date, end_date, adjust_type)
+    logger.error(f"不支持的数据源或市场: data_source={data_source}, market={market}")
+    return False, None
+
+
+def get_kline_data(stock_config, info=None):
     """
     获取历史k线数据（第一步）
 
     Args:
         stock_config: 股票配置，包含market, data_source, stock_code, adjust_type
+        info: 可选字典，写入cached（是否复用了K线缓存，见KlineFetchCache.fetch）
 
     Returns:
         tuple: (success, csv_path) 成功标志和CSV文件路径
@@ -63,26 +99,18 @@ def get_kline_data(stock_config):
         end_date = datetime.datetime.now().strftime("%Y-%m-%d")
         start_date = (datetime.datetime.now() - datetime.timedelta(days=365 * 4)).strftime("%Y-%m-%d")
 
-        # 根据数据源和市场调用对应的函数
+        # 同一股票当天已获取过或正在被其他任务获取时，复用同一份数据
         if data_source and market:
-            if data_source == 'akshare' and market.upper() == 'HK':
-                success, csv_name = manager_akshare.get_single_hk_stock_history(stock_code, start_date, end_date, adjust_type)
-            elif data_source == 'akshare' and market.upper() == 'US':
-                success, csv_name = manager_akshare.get_single_us_history(stock_code, start_date, end_date, adjust_type)
-            elif data_source == 'baostock' and market.upper() == 'CN':
-                success, csv_name = manager_baostock.get_stock_history(stock_code, start_date, end_date, adjust_type)
-            elif data_source == 'futu' and market.upper() == 'HK':
-                success, csv_name = manager_futu.get_single_hk_stock_history(stock_code, start_date, end_date, adjust_type)
-            elif data_source == 'futu' and market.upper() == 'CN':
-                success, csv_name = manager_futu.get_single_cn_stock_history(stock_code, start_date, end_date, adjust_type)
-            else:
-                logger.error(f"不支持的数据源或市场: data_source={data_source}, market={market}")
-                return False, None
+            success, csv_name = kline_fetch_cache.fetch(
+                data_source, market, stock_code, adjust_type, start_date, end_date,
+                lambda: _download_kline(data_source, market, stock_code, start_date, end_date, adjust_type),
+                info=info)
             if success and csv_name:
                 csv_path = os.path.join(settings.stock_data_root, data_source, csv_name)
                 stock_config['filename'] = csv_name
                 logger.info(f"成功获取股票数据 {stock_config.get('stock_code')}: {csv_path}")
                 return True, csv_path
+            return False, None
 
         logger.error(f"不支持的数据源或市场: data_source={data_source}, market={market}")
         return False, None
@@ -100,7 +128,7 @@ def run_backtest(csv_path, backtest_config):
         backtest_config: 回测配置，包含strategy, init_cash等
 
     Returns:
-        bool: 是否成功
+        dict: 回测结果（含bars等，见run_backtest_enhanced_volume_strategy），失败返回False
     """
     try:
         strategy_name = backtest_config.get('strategy', 'EnhancedVolumeStrategy')
@@ -113,14 +141,34 @@ def run_backtest(csv_path, backtest_config):
             return False
 
         # 执行回测
-        run_backtest_enhanced_volume_strategy(csv_path, strategy_class, init_cash)
+        result = run_backtest_enhanced_volume_strategy(csv_path, strategy_class, init_cash)
+        if not result:
+            return False
         logger.info(f"回测完成: {csv_path}, 策略: {strategy_name}")
-        return True
+        return result
     except Exception as e:
         logger.error(f"回测失败: {str(e)}")
         return False
 
 
+def latest_signal_files(target_stocks):
+    """
+    只读取每只股票每个策略最近一次回测的信号文件，避免历史文件重复统计
+
+    Returns:
+        list: 相对signals_root的信号文件路径
+    """
+    target_signal_file = []
+    for stock in target_stocks:
+        stock_file = stock.get("filename")
+        if not stock_file:
+            continue
+        latest_files = get_latest_signal_files(data_source=stock["data_source"],
+                                               stock_code=stock_file.split('_')[0])
+        target_signal_file.extend(signal_file['file_path'] for signal_file in latest_files)
+    return target_signal_file
+
+
 def check_signals(target_stocks, task_id, days):
     """
     检查昨天买入信号
@@ -133,24 +181,12 @@ def check_signals(target_stocks, task_id, days):
     start_day = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
 
     try:
-        signal_files = signal_get()
-        signal_files.sort(key=lambda x: x['file_time'], reverse=True)
-        logger.info(f"获取到 {len(signal_files)} 个信号文件")
-        all_signal_files = []
-        target_signal_file = []
-        for signal_file in signal_files:
-            all_signal_files.append(signal_file['file_path'])
-        for signal_file in all_signal_files:
-            for stock in target_stocks:
-                data_source = stock["data_source"]
-                stock_file = stock["filename"]
-                if data_source in signal_file and stock_file.replace('.csv', '') in signal_file:
-                    target_signal_file.append(signal_file)
+        target_signal_file = latest_signal_files(target_stocks)
         if len(target_signal_file) == 0:
             for stock in target_stocks:
-                stock_file = stock["filename"]
+                stock_file = stock.get("filename", stock.get("stock_code", ''))
                 logger.error(f"没有信号文件包含股票 {stock_file.replace('.csv', '')}")
-            return
+            return False, None
         else:
             logger.info(f"找到 {len(target_signal_file)} 个信号文件包含目标股票")
         filters = {
@@ -161,16 +197,10 @@ def check_signals(target_stocks, task_id, days):
                 "signal_type": ""
             }
 
-        combined_df = signals_analyze(target_signal_file, filters)
-        summary = {
-            'total_signals': len(combined_df),
-            'buy_signals': len(combined_df[combined_df['signal_type'].str.contains('buy')]),
-            'sell_signals': len(combined_df[combined_df['signal_type'].str.contains('sell')]),
-            'unique_stocks': combined_df['stock_info'].nunique(),
-            'unique_strategies': combined_df['strategy_name'].nunique()
-        }
-        signals = combined_df.to_dict('records')
-        total_signals_count = len(combined_df)
+        result = signals_query(target_signal_file, filters)
+        summary = result['summary']
+        signals = result['signals']
+        total_signals_count = result['total']
         logger.info(f"昨天共有 {total_signals_count} 个信号")
 
         # 打印每个信号
@@ -189,9 +219,198 @@ def check_signals(target_stocks, task_id, days):
 
 
 
+def _fetch_stock(task_id, stock_config):
+    """
+    获取一只股票的K线（流水线第一阶段，在线程池中执行，按数据源限制并发，失败时退避重试）；
+    复用K线缓存时span状态为cached，与其他阶段复用产出一样不计入耗时分布
+    """
+    info = {}
+
+    def fetch():
+        semaphore = _fetch_semaphores.get(stock_config.get('data_source'))
+        if semaphore is None:
+            return get_kline_data(stock_config, info)[1]
+        with semaphore:
+            return get_kline_data(stock_config, info)[1]
+
+    span = {'stock': stock_config.get('stock_code')}
+    try:
+        # 当天的数据去重由K线缓存负责，这里只做重试
+        csv_path = StageRunner(task_id).run('fetch', fetch, span=span)
+    except StageError:
+        return False, None, span
+    if info.get('cached'):
+        # 复用缓存时CSV未被重写，不计入获取字节数
+        span['status'] = 'cached'
+        span['bytes'] = 0
+    else:
+        span['bytes'] = os.path.getsize(csv_path)
+    return True, csv_path, span
+
+
+def _init_backtest_worker(strategy_name):
+    """回测进程初始化：预先导入回测模块与策略，每只股票的回测不再各自承担导入耗时"""
+    import core.quant.quant_manage  # noqa: F401
+    global_strategy_manager.get_strategy(strategy_name)
+
+
+def _backtest_stock(task_id, csv_path, backtest_config, quiet):
+    """回测一只股票（流水线第二阶段，在进程池中执行）；K线文件与回测配置都未变化时跳过"""
+    def backtest():
+        with quiet_backtest(quiet):
+            result = run_backtest(csv_path, backtest_config)
+        return result and {'csv_path': csv_path, 'bars': result.get('bars', 0)}
+
+    span = {'stock': os.path.basename(csv_path).split('_')[0]}
+    try:
+        output = StageRunner(task_id).run('backtest', backtest, key=content_key(file_key(csv_path), backtest_config),
+                                          span=span)
+    except StageError:
+        return False, span
+    span['bars'] = output.get('bars', 0) if span['status'] == 'success' else 0
+    return True, span
+
+
+def run_stock_pipeline(task_id, target_stocks, backtest_config, counts, on_progress=None, spans=None):
+    """
+    流水线处理任务中的股票：线程池并发获取K线，每只股票获取完成后立即提交到进程池回测，
+    网络等待与回测计算相互重叠
+
+    Args:
+        task_id: 任务id（阶段产出按任务登记）
+        target_stocks: 股票配置列表（获取成功后会写入filename，供信号检查使用）
+        backtest_config: 回测配置
+        counts: 计数字典，包含processed、success、failed，处理过程中实时更新
+        on_progress: 每处理完一只股票后的回调，参数为counts
+        spans: 收集每只股票获取、回测阶段span的列表
+    """
+    spans = spans if spans is not None else []
+
+    def finish(success):
+        counts['processed'] += 1
+        counts['success' if success else 'failed'] += 1
+        if on_progress:
+            on_progress(counts)
+
+    quiet = settings.LOG_QUIET_BATCH
+    backtest_workers = min(settings.TASK_BACKTEST_WORKERS, len(target_stocks))
+    backtest_pool = ProcessPoolExecutor(
+        max_workers=backtest_workers, mp_context=pool_context(), initializer=_init_backtest_worker,
+        initargs=(backtest_config.get('strategy', 'EnhancedVolumeStrategy'),)) if backtest_workers > 1 else None
+    try:
+        with ThreadPoolExecutor(max_workers=settings.TASK_FETCH_WORKERS, thread_name_prefix='kline_fetch') as fetch_pool:
+            fetch_futures = {fetch_pool.submit(_fetch_stock, task_id, stock_config): stock_config
+                             for stock_config in target_stocks}
+            backtest_futures = {}
+            for future in as_completed(fetch_futures):
+                stock_code = fetch_futures[future].get('stock_code')
+                success, csv_path, span = future.result()
+                spans.append(span)
+                if not success or not csv_path:
+                    logger.error(f"跳过股票处理，因为获取k线数据失败: {stock_code}")
+                    finish(False)
+                    continue
+                if backtest_pool is None:
+                    # 单进程模式：在当前进程内回测（获取线程仍在后台预取后续股票）
+                    success, span = _backtest_stock(task_id, csv_path, backtest_config, quiet)
+                    spans.append(span)
+                    if not success:
+                        logger.error(f"跳过股票处理，因为回测失败: {stock_code}")
+                        finish(False)
+                    else:
+                        finish(True)
+                    continue
+                backtest_futures[backtest_pool.submit(_backtest_stock, task_id, csv_path, backtest_config, quiet)] = stock_code
+
+        for future in as_completed(backtest_futures):
+            stock_code = backtest_futures[future]
+            try:
+                success, span = future.result()
+            except Exception as e:
+                # 回测进程异常退出等情况，只计为该股票失败
+                logger.error(f"回测进程执行失败: {stock_code}, {str(e)}")
+                success, span = False, {'stock': stock_code, 'stage': 'backtest', 'status': 'failed', 'error': str(e)}
+            spans.append(span)
+            if not success:
+                logger.error(f"跳过股票处理，因为回测失败: {stock_code}")
+            finish(success)
+    finally:
+        if backtest_pool is not None:
+            backtest_pool.shutdown(cancel_futures=True)
+
+
+def run_report_stages(task, target_stocks, days=180, spans=None):
+    """
+    信号、报告、通知三个阶段：信号文件与时间窗口都未变化时复用上次的信号表/PDF，已发送过的同一报告不再重复发送
+
+    Args:
+        spans: 收集各阶段span的列表
+
+    Returns:
+        str: 任务状态，success或partial
+    """
+    task_id = task.get('id')
+    runner = StageRunner(task_id)
+    try:
+        return _run_report_stages(runner, task, target_stocks, days)
+    finally:
+        if spans is not None:
+            spans.extend(runner.spans)
+
+
+def _run_report_stages(runner, task, target_stocks, days):
+    task_id = task.get('id')
+    folder = artifact_dir(task_id)
+    signal_files = latest_signal_files(target_stocks)
+    signals_key = content_key(sorted(file_key(os.path.join(settings.signals_root, f)) or f for f in signal_files),
+                              days, datetime.date.today().isoformat())
+
+    def signals_stage():
+        success, html_content = check_signals(target_stocks, task_id, days=days)
+        if not success or not html_content:
+            return None
+        html_path = os.path.join(folder, f"signals_{signals_key}.html")
+        with open(html_path, 'w', encoding='utf-8') as f:
+            f.write(html_content)
+        return {'html_path': html_path}
+
+    def report_stage():
+        with open(signals['html_path'], 'r', encoding='utf-8') as f:
+            html_content = f.read()
+        pdf_path = os.path.join(folder, f"{task_id}_report_{signals_key}.pdf")
+        # 在后台渲染进程中生成，调度进程内的其他任务不受影响
+        return pdf_renderer.render(html_content, pdf_path) and {'pdf_path': pdf_path}
+
+    def notify_stage(pdf_path):
+        # 写入持久化发送队列后即视为完成，发送、限流合并与失败重试由发送队列负责
+        message_ids = notify_dispatcher.send_pdf_report(pdf_path, title=title, description=f"{task}")
+        return {'message_ids': message_ids, 'queued_time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+    title = f"定时任务{task_id}信号详情"
+    try:
+        # 信号统计为本地计算，失败不是偶发错误，不重试
+        signals = runner.run('signals', signals_stage, key=signals_key, retries=0,
+                             validate=lambda output: os.path.exists(output['html_path']))
+    except StageError as e:
+        logger.error(f"生成信号详情失败: {e}")
+        return 'partial'
+    logger.info(f"股票处理完成: {target_stocks}")
+    try:
+        report_span = {}
+        report = runner.run('report', report_stage, key=signals_key,
+                            validate=lambda output: os.path.exists(output['pdf_path']), span=report_span)
+        if report_span['status'] == 'success':
+            report_span['bytes'] = os.path.getsize(report['pdf_path'])
+        runner.run('notify', lambda: notify_stage(report['pdf_path']), key=content_key(signals_key, title))
+    except StageError as e:
+        logger.error(f"发送微信报告失败: {e}")
+        return 'partial'
+    return 'success'
+
+
 def process_task(task):
     """
-    处理单个任务，执行三步流程
+    处理单个任务，按阶段执行：获取K线、回测、信号、报告、通知
 
     Args:
         task: 任务配置
@@ -212,111 +431,58 @@ def process_task(task):
         return
     execution_id = execution['id']
 
-    stocks_processed = 0
-    stocks_success = 0
-    stocks_failed = 0
+    counts = {'processed': 0, 'success': 0, 'failed': 0}
+    spans = []
+
+    def on_progress(progress):
+        task_execution_manager.update(
+            execution_id,
+            stocks_processed=progress['processed'],
+            stocks_success=progress['success'],
+            stocks_failed=progress['failed']
+        )
 
     try:
         target_stocks = task.get('target_stocks', [])
         backtest_config = task.get('backtest_config', {})
 
-        for stock_config in target_stocks:
-            logger.info(f"处理股票: {stock_config.get('stock_code')}")
-
-            success, csv_path = get_kline_data(stock_config)
-            if not success or not csv_path:
-                logger.error(f"跳过股票处理，因为获取k线数据失败")
-                stocks_failed += 1
-                stocks_processed += 1
-                continue
-
-            backtest_success = run_backtest(csv_path, backtest_config)
-            if not backtest_success:
-                logger.error(f"跳过股票处理，因为回测失败")
-                stocks_failed += 1
-                stocks_processed += 1
-                continue
+        # 批量回测使用静默回测模式，策略循环日志只采样输出
+        with quiet_backtest(settings.LOG_QUIET_BATCH):
+            run_stock_pipeline(task_id, target_stocks, backtest_config, counts, on_progress, spans)
 
-            stocks_success += 1
-            stocks_processed += 1
-
-        success, html_content = check_signals(target_stocks, task_id, days=180)
-        if not success or not html_content:
-            logger.error(f"生成信号详情失败")
-            status = 'partial'
-        else:
-            logger.info(f"股票处理完成: {target_stocks}")
-            try:
-                send_wechat_report_pdf(
-                    html_content=html_content,
-                    title=f"定时任务{task_id}信号详情",
-                    description=f"{task}",
-                    report_filename=f"{task_id}_report.pdf"
-                )
-            except Exception as e:
-                logger.error(f"发送微信报告失败: {e}")
-            status = 'success'
+        status = run_report_stages(task, target_stocks, spans=spans)
 
+        task_execution_manager.add_spans(execution_id, task_id, spans)
         task_execution_manager.update(
             execution_id,
             status=status,
-            stocks_processed=stocks_processed,
-            stocks_success=stocks_success,
-            stocks_failed=stocks_failed
+            stocks_processed=counts['processed'],
+            stocks_success=counts['success'],
+            stocks_failed=counts['failed']
         )
-        logger.info(f"任务处理完成: {task_name} (ID: {task_id}), 状态: {status}, 成功: {stocks_success}/{stocks_processed}")
+        logger.info(f"任务处理完成: {task_name} (ID: {task_id}), 状态: {status}, 成功: {counts['success']}/{counts['processed']}")
     except Exception as e:
         logger.error(f"处理任务时出错: {str(e)}")
+        task_execution_manager.add_spans(execution_id, task_id, spans)
         task_execution_manager.update(
             execution_id,
             status='failed',
             details={'error': str(e)},
-            stocks_processed=stocks_processed,
-            stocks_success=stocks_success,
-            stocks_failed=stocks_failed
+            stocks_processed=counts['processed'],
+            stocks_success=counts['success'],
+            stocks_failed=counts['failed']
         )
 
 
-def update_schedule():
-    """
-    更新调度任务
-    """
-    global current_tasks, scheduled_jobs
-
-    # 获取新的任务列表
-    new_tasks = load_tasks()
+# 定时任务调度器（cron触发，任务在独立线程中执行）
+task_scheduler = TaskScheduler(process_task)
 
-    # 清除现有的调度任务
-    for job in scheduled_jobs:
-        schedule.cancel_job(job)
-    scheduled_jobs.clear()
 
-    # 添加新的调度任务
-    for task in new_tasks:
-        schedule_time = task.get('schedule_time', '0 0 0 0 0')  # 默认每分钟执行
-        task_id = task.get('id')
-
-        # 解析cron表达式
-        try:
-            parts = schedule_time.split()
-            if len(parts) == 5:
-                minute, hour, day, month, weekday = parts
-
-                # 根据cron表达式创建定时任务
-                # 这里简化处理，实际应该更复杂地解析cron表达式
-                job = schedule.every().day.at(f"{hour}:{minute}").do(process_task, task)
-                scheduled_jobs.append(job)
-                logger.info(f"添加定时任务: {task.get('name')}, 执行时间: {schedule_time}")
-            else:
-                # 默认每分钟执行
-                job = schedule.every(1).minutes.do(process_task, task)
-                scheduled_jobs.append(job)
-                logger.info(f"添加定时任务: {task.get('name')}, 执行时间: 每分钟")
-        except Exception as e:
-            logger.error(f"解析调度时间失败: {schedule_time}, 错误: {str(e)}")
-
-    current_tasks = new_tasks
-    logger.info(f"调度任务更新完成，共 {len(scheduled_jobs)} 个任务")
+def update_schedule(force=False):
+    """
+    更新调度任务：任务版本号未变化时直接返回，有变化时只重新调度改动的任务
+    """
+    return task_scheduler.sync(force=force)
 
 
 def schedule_tasks():
@@ -324,12 +490,20 @@ def schedule_tasks():
     启动任务调度
     """
     # 初始更新调度
-    update_schedule()
-
-    # 每小时重新加载配置
-    schedule.every(1).hours.do(update_schedule)
+    update_schedule(force=True)
+
+    # 每天凌晨清理被新回测取代的旧信号文件
+    schedule.every().day.at("03:00").do(compact_signal_files)
+    # 每天凌晨校对回测结果目录与html目录（补登记手工拷入的报告、移除已删除的报告）
+    schedule.every().day.at("03:10").do(sync_result_catalog)
+    # 每天凌晨删除超过保留天数的任务执行记录
+    schedule.every().day.at("03:20").do(task_execution_manager.delete_old)
+    schedule.every().day.at("03:20").do(delete_old_artifacts)
+    schedule.every().day.at("03:20").do(notify_dispatcher.delete_old)
+    # 继续发送上次退出时未发送完的通知
+    notify_dispatcher.start()
     logger.info("启动定时任务调度器")
-    # 每分钟更新一次调度任务配置
+    # 每分钟检查一次任务配置是否变化（只读取版本号）
     last_update_time = time.time()
     update_interval = 60
     # 主循环
@@ -339,7 +513,7 @@ def schedule_tasks():
             if current_time - last_update_time >= update_interval:
                 update_schedule()
                 last_update_time = current_time
-                logger.info("更新任务配置完成")
+            task_scheduler.run_pending()
             schedule.run_pending()
             time.sleep(1)
         except Exception as e:
@@ -68,7 +68,8 @@ import time
 import datetime
 from common.logger import create_log
 from common.util_html import signals_to_html, save_clean_html
-from core.signal.signal_handler import signal_get, signals_analyze
+from core.signal.signal_handler import signals_query
+from core.signal.signal_store import get_latest_signal_files
 from core.stock import manager_akshare, manager_baostock
 from core.task.task_manager import TaskManager
 from core.strategy.strategy_manager import global_strategy_manager
@@ -192,24 +193,20 @@ def check_signals(target_stocks, task_id, days=365):
     start_day = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime('%Y-%m-%d')
 
     try:
-        signal_files = signal_get()
-        signal_files.sort(key=lambda x: x['file_time'], reverse=True)
-        logger.info(f"获取到 {len(signal_files)} 个信号文件")
-        all_signal_files = []
+        # 只读取每只股票每个策略最近一次回测的信号文件，避免历史文件重复统计
         target_signal_file = []
-        for signal_file in signal_files:
-            all_signal_files.append(signal_file['file_path'])
-        for signal_file in all_signal_files:
-            for stock in target_stocks:
-                data_source = stock["data_source"]
-                stock_file = stock["filename"]
-                if data_source in signal_file and stock_file.replace('.csv', '') in signal_file:
-                    target_signal_file.append(signal_file)
+        for stock in target_stocks:
+            stock_file = stock.get("filename")
+            if not stock_file:
+                continue
+            latest_files = get_latest_signal_files(data_source=stock["data_source"],
+                                                   stock_code=stock_file.split('_')[0])
+            target_signal_file.extend(signal_file['file_path'] for signal_file in latest_files)
         if len(target_signal_file) == 0:
             for stock in target_stocks:
-                stock_file = stock["filename"]
+                stock_file = stock.get("filename", stock.get("stock_code", ''))
                 logger.error(f"没有信号文件包含股票 {stock_file.replace('.csv', '')}")
-            return
+            return False, None
         else:
             logger.info(f"找到 {len(target_signal_file)} 个信号文件包含目标股票")
         filters = {
@@ -220,16 +217,10 @@ def check_signals(target_stocks, task_id, days=365):
                 "signal_type": ""
             }
 
-        combined_df = signals_analyze(target_signal_file, filters)
-        summary = {
-            'total_signals': len(combined_df),
-            'buy_signals': len(combined_df[combined_df['signal_type'].str.contains('buy')]),
-            'sell_signals': len(combined_df[combined_df['signal_type'].str.contains('sell')]),
-            'unique_stocks': combined_df['stock_info'].nunique(),
-            'unique_strategies': combined_df['strategy_name'].nunique()
-        }
-        signals = combined_df.to_dict('records')
-        total_signals_count = len(combined_df)
+        result = signals_query(target_signal_file, filters)
+        summary = result['summary']
+        signals = result['signals']
+        total_signals_count = result['total']
         logger.info(f"昨天共有 {total_signals_count} 个信号")
 
         # 打印每个信号
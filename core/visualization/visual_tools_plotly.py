@@ -7,6 +7,7 @@ from plotly.subplots import make_subplots
 from common.logger import create_log
 from common.time_key import get_current_time
 from common.util_csv import load_stock_data
+from common.util_profile import PhaseTimer
 from core.visualization.visual_demo import get_sample_signal_records, get_sample_trade_records, get_sample_asset_records
 from settings import stock_data_root, html_root
 
@@ -930,7 +931,9 @@ def save_and_show_chart(fig, file_name, output_dir=None, metrics=None):
     return file_path
 
 
-def plotly_draw(kline_csv_path, strategy, initial_capital, html_file_name, html_file_path):
+def plotly_draw(kline_csv_path, strategy, initial_capital, html_file_name, html_file_path, timer=None):
+    # timer: 可选的PhaseTimer，记录load/holdings/metrics/figure/html_write各子阶段耗时
+    timer = timer or PhaseTimer()
     signal_record_manager = strategy.indicator.signal_record_manager
     signals_df = signal_record_manager.transform_to_dataframe()
     trade_record_manager = strategy.trade_record_manager
@@ -940,6 +943,7 @@ def plotly_draw(kline_csv_path, strategy, initial_capital, html_file_name, html_
 
     # 2. 准备连续日期数据
     df_continuous = prepare_continuous_dates(df)
+    timer.lap('load')
 
     # 3. 获取信号记录和交易记录和资产记录
     if signals_df is None:
@@ -954,9 +958,11 @@ def plotly_draw(kline_csv_path, strategy, initial_capital, html_file_name, html_
     # 4. 筛选有效的日期
     valid_signals = filter_valid_dates(df, signals_df)
     valid_trades = filter_valid_dates(df, trades_df)
+    timer.lap('filter')
 
     # 5. 计算持仓量和资产变化
     holdings_data = calculate_holdings(df_continuous, valid_trades, initial_capital)
+    timer.lap('holdings')
 
     # 6. 计算绩效指标
     metrics = calculate_performance_metrics(strategy, initial_capital, df)
@@ -975,6 +981,7 @@ def plotly_draw(kline_csv_path, strategy, initial_capital, html_file_name, html_
     logger.info(f"卖出信号: {metrics['sell_signals_count']} (策略生成的卖出信号数量)")
     logger.info(f"实际买入: {metrics['executed_buys_count']} (实际执行的买入交易次数)")
     logger.info(f"实际卖出: {metrics['executed_sells_count']} (实际执行的卖出交易次数)")
+    timer.lap('metrics')
 
     # 7. 创建图表
     # 从CSV路径中提取股票代码和名称
@@ -987,7 +994,9 @@ def plotly_draw(kline_csv_path, strategy, initial_capital, html_file_name, html_
         stock_info = f"{stock_code} {stock_name}"
 
     fig = create_trading_chart(stock_info, df_continuous, valid_signals, valid_trades, holdings_data, initial_capital)
+    timer.lap('figure')
     # 8. 保存和显示图表
     output_path = save_and_show_chart(fig, html_file_name, html_file_path, metrics)
+    timer.lap('html_write')
 
     return output_path
\ No newline at end of file
@@ -10,30 +10,63 @@ sys.path.append(project_root)
 import multiprocessing
 
 import secrets
+import time
 from datetime import datetime
 from functools import wraps
+from urllib.parse import quote
 from core.ai.ai_manager import AIManager
 
-from core.signal.signal_handler import signal_get, signals_analyze
-from core.task.task_timer import schedule_tasks
+from core.signal.signal_handler import signal_get, signals_query
+from core.task.scheduler_service import run_scheduler_service
 from core.strategy.indicator_manager import global_indicator_manager
 from core.task.task_manager import TaskManager
 from core.task.task_execution_manager import task_execution_manager
-from flask import Flask, render_template, request, send_from_directory
+from flask import Flask, render_template, request, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
-from flask import make_response
+from flask import abort
+from werkzeug.exceptions import HTTPException
+from werkzeug.security import safe_join
 import json
 from common.util_csv import combine_data, read_data
 from common.util_html import signals_to_html
-from core.stock import manager_baostock, manager_akshare, manager_futu
+from common.util_static import send_static, is_precompressed_copy
+from common.util_response import json_response
+from common.util_metrics import metrics_registry, http_request_duration, http_requests_total, http_request_errors, \
+    http_requests_in_flight
 from core.strategy.strategy_manager import global_strategy_manager
 from common.logger import create_log
-from core.quant.quant_manage import run_backtest_enhanced_volume_strategy, run_backtest_enhanced_volume_strategy_multi
-from settings import stock_data_root, html_root, signals_root
+from core.quant.backtest_job import backtest_job_queue, FINISHED_STATUSES
+from core.quant.result_catalog import query_backtest_results
+from core.quant.run_store import load_run
+from core.quant import result_cache
+from settings import stock_data_root, html_root, signals_root, secret_key_file
 
 # 初始化Flask应用
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)
+
+
+def load_secret_key():
+    """
+    获取Flask密钥：优先使用环境变量QUANT_SECRET_KEY，否则读取（首次生成）密钥文件，
+    保证多个WSGI工作进程及重启前后使用同一密钥
+    """
+    secret_key = os.environ.get('QUANT_SECRET_KEY')
+    if secret_key:
+        return secret_key
+    if not os.path.exists(secret_key_file):
+        os.makedirs(os.path.dirname(secret_key_file), exist_ok=True)
+        try:
+            # O_EXCL保证多个工作进程同时启动时只有一个写入
+            fd = os.open(secret_key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                f.write(secrets.token_hex(32))
+        except FileExistsError:
+            pass
+    with open(secret_key_file) as f:
+        return f.read().strip()
+
+
+app.secret_key = load_secret_key()
 CORS(app)
 logger = create_log('quant_frontend')
 task_manager = TaskManager()
@@ -86,6 +119,11 @@ def log_request_details(f):
 
         logger.info(f"Request received: {json.dumps(log_data, ensure_ascii=False)}")
 
+        # 指标按路由模板统计（如/show_result/<path:result_path>），避免路径参数导致标签过多
+        route = request.url_rule.rule if request.url_rule else path
+        http_requests_in_flight.inc(route=route)
+        metric_start = time.perf_counter()
+        status_code = 500
         try:
             # 执行原始函数
             response = f(*args, **kwargs)
@@ -109,9 +147,16 @@ def log_request_details(f):
 
             logger.error(f"Request failed: request_id={request_id}, error={str(e)}, "
                          f"processing_time={processing_time:.2f}ms", exc_info=True)
+            status_code = e.code if isinstance(e, HTTPException) and e.code else 500
 
             # 重新抛出异常，让Flask处理
             raise
+        finally:
+            http_requests_in_flight.dec(route=route)
+            http_request_duration.observe(time.perf_counter() - metric_start, route=route, method=method)
+            http_requests_total.inc(route=route, method=method, status=status_code)
+            if status_code >= 500:
+                http_request_errors.inc(route=route, method=method)
 
     return decorated_function
 
@@ -130,16 +175,12 @@ def get_stocks(source):
     """获取指定数据源下的所有股票文件"""
     if source not in DATA_SOURCES:
         error_response_data = {'success': False, 'message': f'Invalid data source', 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
     source_path = stock_data_root / source
     if not os.path.exists(source_path):
         error_response_data = {'success': False, 'message': f'Source directory not found', 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
     stocks = []
     try:
@@ -158,9 +199,7 @@ def get_stocks(source):
     except Exception as e:
         logger.error(f"Error reading stocks: {str(e)}")
         error_response_data = {'success': False, 'message': f'Error reading stocks: {str(e)}', 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
     response_data = {
         'success': True,
         'message': f'Found {len(stocks)} stocks',
@@ -168,9 +207,7 @@ def get_stocks(source):
             'stocks': stocks
         }
     }
-    response = make_response(json.dumps(response_data, ensure_ascii=False))
-    response.headers['Content-Type'] = 'application/json; charset=utf-8'
-    return response
+    return json_response(response_data)
 
 
 @app.route('/run_backtest', methods=['POST'])
@@ -189,70 +226,124 @@ def run_backtest():
         strategy_class = global_strategy_manager.get_strategy(strategy_name)
         if not strategy_class:
             error_response_data = {'success': False, 'message': f'Invalid strategy: {strategy_name}', 'data':{}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         if source not in DATA_SOURCES:
             error_response_data = {'success': False, 'message': f'Invalid data source', 'data':{}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
-
-        if is_batch:
-            # 批量回测
-            folder_path = stock_data_root / source
-            run_backtest_enhanced_volume_strategy_multi(str(folder_path), strategy_class, init_cash)
-            response_data = {
-                'success': True,
-                'message': 'Batch backtest completed',
-                'data':{}
-            }
-            response = make_response(json.dumps(response_data, ensure_ascii=False))
-            response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return response
-        else:
+            return json_response(error_response_data)
+
+        if not is_batch:
             # 单个股票回测
             if not stock_file:
                 error_response_data = {'success': False, 'message': f'Stock file is required', 'data':{}}
-                error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                return error_response
-
-            file_path = stock_data_root / source / stock_file
-            run_backtest_enhanced_volume_strategy(str(file_path), strategy_class, init_cash)
-
-            # 构建回测结果的HTML路径，添加策略名称作为最后一层
-            relative_path = f"{source}/{stock_file.rsplit('.', 1)[0]}/{strategy_class.__name__}"
-            # 查找最新的回测结果文件
-            result_dir = html_root / source / stock_file.rsplit('.', 1)[0] / strategy_class.__name__
-            if os.path.exists(result_dir):
-                files = sorted(os.listdir(result_dir), reverse=True)
-                if files:
-                    latest_file = files[0]
-                    result_path = f"{relative_path}/{latest_file}"
-
-                    response_data = {
-                        'success': True,
-                        'message': 'Backtest completed',
-                        'data':{
-                            'result_path': result_path
-                        }
-                    }
-                    response = make_response(json.dumps(response_data, ensure_ascii=False))
-                    response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                    return response
-            else:
-                response_data = {'success': False, 'message': 'No result files found', 'data': {}}
-                response = make_response(json.dumps(response_data, ensure_ascii=False))
-                response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                return response
+                return json_response(error_response_data)
+            if not os.path.exists(stock_data_root / source / stock_file):
+                error_response_data = {'success': False, 'message': f'Stock file not found: {stock_file}', 'data':{}}
+                return json_response(error_response_data)
+
+        # 提交到回测任务队列，由后台工作进程执行，立即返回任务ID
+        job = backtest_job_queue.submit('batch' if is_batch else 'single', {
+            'source': source,
+            'stock_file': None if is_batch else stock_file,
+            'strategy': strategy_name,
+            'init_cash': init_cash,
+            # 可选：单次开启cProfile性能分析，未传时使用settings.BACKTEST_PROFILE
+            'profile': data.get('profile'),
+            # 可选：忽略回测结果缓存，强制重新回测
+            'force': bool(data.get('force')),
+            # 可选：低内存回测模式，未传时按settings.BACKTEST_LOW_MEMORY与CSV大小决定
+            'low_memory': data.get('low_memory'),
+        })
+        response_data = {
+            'success': True,
+            'message': 'Backtest job submitted',
+            'data': {'job_id': job['id'], 'job': job}
+        }
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"回测执行失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'回测执行失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
+
+@app.route('/api/jobs', methods=['GET'])
+@log_request_details
+def list_backtest_jobs():
+    """获取回测任务列表"""
+    try:
+        limit = int(request.args.get('limit', 50))
+        status = request.args.get('status')
+        jobs = backtest_job_queue.list_jobs(limit=limit, status=status)
+        response_data = {'success': True, 'message': 'Success', 'data': jobs}
+        return json_response(response_data)
+    except Exception as e:
+        logger.error(f"获取回测任务列表失败: {str(e)}")
+        error_response_data = {'success': False, 'message': f'获取回测任务列表失败: {str(e)}', 'data': []}
+        return json_response(error_response_data)
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@log_request_details
+def get_backtest_job(job_id):
+    """获取回测任务状态与进度"""
+    try:
+        job = backtest_job_queue.get(job_id)
+        if not job:
+            error_response_data = {'success': False, 'message': f'Job not found: {job_id}', 'data': {}}
+            return json_response(error_response_data)
+        response_data = {'success': True, 'message': 'Success', 'data': job}
+        return json_response(response_data)
+    except Exception as e:
+        logger.error(f"获取回测任务失败: {str(e)}")
+        error_response_data = {'success': False, 'message': f'获取回测任务失败: {str(e)}', 'data': {}}
+        return json_response(error_response_data)
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+@log_request_details
+def cancel_backtest_job(job_id):
+    """取消回测任务"""
+    try:
+        job = backtest_job_queue.cancel(job_id)
+        if not job:
+            error_response_data = {'success': False, 'message': f'Job not found: {job_id}', 'data': {}}
+            return json_response(error_response_data)
+        response_data = {'success': True, 'message': 'Cancel requested', 'data': job}
+        return json_response(response_data)
+    except Exception as e:
+        logger.error(f"取消回测任务失败: {str(e)}")
+        error_response_data = {'success': False, 'message': f'取消回测任务失败: {str(e)}', 'data': {}}
+        return json_response(error_response_data)
+
+
+@app.route('/api/jobs/<job_id>/events')
+def backtest_job_events(job_id):
+    """以Server-Sent Events推送回测任务进度，任务结束后关闭连接"""
+    def generate():
+        last_payload = None
+        while True:
+            job = backtest_job_queue.get(job_id)
+            if not job:
+                yield f"event: error\ndata: {json.dumps({'message': f'Job not found: {job_id}'}, ensure_ascii=False)}\n\n"
+                return
+            payload = json.dumps(job, ensure_ascii=False)
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+            if job['status'] in FINISHED_STATUSES:
+                return
+            time.sleep(0.5)
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus指标（文本格式），汇总Web进程、调度服务及回测工作进程的指标"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 
 @app.route('/api/music/list', methods=['GET'])
 @log_request_details
@@ -273,132 +364,93 @@ def get_music_list():
         'message': 'Success',
         'data': {'music_list': music_files}
     }
-    response = make_response(json.dumps(response_data, ensure_ascii=False))
-    response.headers['Content-Type'] = 'application/json; charset=utf-8'
-    return response
+    return json_response(response_data)
 
 
 @app.route('/get_backtest_results')
 @log_request_details
 def get_backtest_results():
-    """获取所有回测结果"""
-    results = []
+    """获取回测结果（从回测结果目录按索引分页查询）"""
     try:
         # 获取分页和筛选参数
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 20))
-        start_idx = (page - 1) * page_size
-
-        # 获取筛选参数
-        stock_filter = request.args.get('stock', '')
-        source_filter = request.args.get('source', '')
-        date_start = request.args.get('date_start', '')
-        date_end = request.args.get('date_end', '')
-        strategy_filter = request.args.get('strategy', '')
-
-        # 遍历所有数据源
-        for source in DATA_SOURCES:
-            # 应用数据源筛选
-            if source_filter and source != source_filter:
-                continue
-
-            source_path = html_root / source
-            if os.path.exists(source_path):
-                for stock_dir in os.listdir(source_path):
-                    # 应用股票筛选
-                    if stock_filter and stock_filter.lower() not in stock_dir.lower():
-                        continue
-
-                    stock_path = source_path / stock_dir
-                    if os.path.isdir(stock_path):
-                        for strategy_dir in os.listdir(stock_path):
-                            # 应用策略筛选
-                            if strategy_filter and strategy_dir != strategy_filter:
-                                continue
-
-                            strategy_path = stock_path / strategy_dir
-                            if os.path.isdir(strategy_path):
-                                for result_file in os.listdir(strategy_path):
-                                    if result_file.endswith('.html'):
-                                        # 获取文件创建时间
-                                        file_path = strategy_path / result_file
-                                        run_time = datetime.fromtimestamp(os.path.getctime(file_path)).strftime('%Y-%m-%d %H:%M:%S')
-                                        run_time_date = run_time.split(' ')[0] if run_time else ''
-
-                                        # 应用日期范围筛选
-                                        if date_start and run_time_date < date_start:
-                                            continue
-                                        if date_end and run_time_date > date_end:
-                                            continue
-
-                                        # 构建结果路径
-                                        relative_path = f"{source}/{stock_dir}/{strategy_dir}/{result_file}"
-
-                                        results.append({
-                                            'stock': stock_dir,
-                                            'source': source,
-                                            'strategy': strategy_dir,
-                                            'run_time': run_time,
-                                            'path': relative_path
-                                        })
-
-        # 按运行时间降序排序
-        results.sort(key=lambda x: x['run_time'], reverse=True)
-
-        # 计算总页数
-        total = len(results)
-        total_pages = (total + page_size - 1) // page_size
-
-        # 分页
-        paginated_results = results[start_idx:start_idx + page_size]
+        page = max(1, int(request.args.get('page', 1)))
+        page_size = max(1, int(request.args.get('page_size', 20)))
+        # 键集分页游标（上一页返回的next_cursor），提供时忽略page的偏移
+        cursor = request.args.get('cursor') or None
+
+        result = query_backtest_results(
+            stock=request.args.get('stock', ''),
+            source=request.args.get('source', ''),
+            strategy=request.args.get('strategy', ''),
+            date_start=request.args.get('date_start', ''),
+            date_end=request.args.get('date_end', ''),
+            page=page,
+            page_size=page_size,
+            cursor=cursor,
+        )
 
         response_data = {
             'success': True,
-            'message': f'Found {total} backtest results',
-            'data':{
-                'results': paginated_results,
-                'page': page,
-                'total_pages': total_pages,
-                'total': total
-            }
+            'message': f"Found {result['total'] if result['total'] is not None else len(result['results'])} backtest results",
+            'data': result
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
 
     except Exception as e:
         logger.error(f"Error getting backtest results: {str(e)}")
         error_response_data = {'success': False, 'message': f'Error getting backtest results: {str(e)}', 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/show_result/<path:result_path>')
 @log_request_details
 def show_result(result_path):
-    """显示回测结果图表"""
+    """显示回测结果图表（页面通过iframe加载报告，报告本身由/html/路由以预压缩静态文件发送）"""
     try:
-        # 获取实际文件路径
-        actual_path = os.path.join(html_root, result_path)
-        if not os.path.exists(actual_path):
+        actual_path = safe_join(str(html_root), result_path)
+        if not actual_path or not os.path.isfile(actual_path):
             error_response_data = {'success': False, 'message': 'Result file not found', 'data':{}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
-        # 读取HTML文件内容
-        with open(actual_path, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-
-        return render_template('result_viewer.html', html_content=html_content, file_path=result_path)
+        return render_template('result_viewer.html', report_url=f"/html/{quote(result_path)}", file_path=result_path)
 
     except Exception as e:
         logger.error(f"Error showing result: {str(e)}")
         error_response_data = {'success': False, 'message': f'Error showing result: {str(e)}', 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
+
+
+@app.route('/api/backtest_cache/stats')
+@log_request_details
+def get_backtest_cache_stats():
+    """获取回测结果缓存的条目数、占用空间与命中次数"""
+    try:
+        response_data = {'success': True, 'message': '获取回测缓存统计成功', 'data': result_cache.stats()}
+        return json_response(response_data)
+    except Exception as e:
+        logger.error(f"获取回测缓存统计失败: {str(e)}")
+        error_response_data = {'success': False, 'message': f'获取回测缓存统计失败: {str(e)}', 'data': {}}
+        return json_response(error_response_data)
+
+
+@app.route('/api/backtest_runs/<path:result_path>')
+@log_request_details
+def get_backtest_run(result_path):
+    """获取回测报告对应的运行数据（元数据、交易记录、每日资产曲线），用于后续分析而不需要重新回测"""
+    try:
+        if not safe_join(str(html_root), result_path):
+            error_response_data = {'success': False, 'message': 'Invalid result path', 'data': {}}
+            return json_response(error_response_data)
+        run = load_run(result_path)
+        if run is None:
+            error_response_data = {'success': False, 'message': '该回测没有保存运行数据', 'data': {}}
+            return json_response(error_response_data)
+        response_data = {'success': True, 'message': '获取运行数据成功', 'data': run}
+        return json_response(response_data)
+    except Exception as e:
+        logger.error(f"获取运行数据失败: {str(e)}")
+        error_response_data = {'success': False, 'message': f'获取运行数据失败: {str(e)}', 'data': {}}
+        return json_response(error_response_data)
 
 
 @app.route('/static/<path:filename>')
@@ -411,8 +463,14 @@ def serve_static(filename):
 @app.route('/html/<path:filename>')
 @log_request_details
 def serve_html(filename):
-    """提供HTML结果文件服务"""
-    return send_from_directory('../html', filename)
+    """
+    提供HTML结果文件服务：报告使用预压缩版本（br/gzip）、分块发送，支持ETag/Last-Modified条件请求；
+    其他文件（如性能分析结果）按扩展名确定类型原样发送，预压缩文件不单独提供访问
+    """
+    file_path = safe_join(str(html_root), filename)
+    if not file_path or is_precompressed_copy(file_path) or not os.path.isfile(file_path):
+        abort(404)
+    return send_static(file_path, request.headers.get('Accept-Encoding', ''))
 
 
 @app.route('/acquire_stock_data', methods=['POST'])
@@ -431,28 +489,24 @@ def acquire_stock_data():
         # 参数验证
         if not all([market, data_source, stock_code, start_date, end_date]):
             error_response_data = {'success': False, 'message': '缺少必要参数', 'data':{}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         if data_source not in DATA_SOURCES:
             error_response_data = {'success': False, 'message': f'不支持的数据源: {data_source}', 'data':{}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         logger.info(f"开始获取数据: 市场={market}, 数据源={data_source}, 股票代码={stock_code}")
 
         # 根据市场和数据源调用不同的数据获取函数
         success = False
         filename = None
+        # 数据源SDK导入较慢（akshare、futu各需数百毫秒），只在获取数据时导入对应模块
         if data_source == 'akshare':
+            from core.stock import manager_akshare
             if market == 'hk':
                 if not stock_code.startswith('HK') :
                     error_response_data = {'success': False, 'message': f'{market}股票代码请保证前缀HK: {stock_code}', 'data':{}}
-                    error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                    error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                    return error_response
+                    return json_response(error_response_data)
                 stock_code = stock_code.replace('HK.', '')
                 success, filename = manager_akshare.get_single_hk_stock_history(
                     stock_code=stock_code,
@@ -464,9 +518,7 @@ def acquire_stock_data():
             elif market == 'us':
                 if not stock_code.startswith('US') :
                     error_response_data = {'success': False, 'message': f'{market}股票代码请保证前缀US: {stock_code}', 'data':{}}
-                    error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                    error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                    return error_response
+                    return json_response(error_response_data)
                 stock_code = stock_code.replace('US.', '')
                 success, filename = manager_akshare.get_single_us_history(
                     stock_code=stock_code,
@@ -476,10 +528,9 @@ def acquire_stock_data():
                 )
             else:
                 error_response_data = {'success': False, 'message': f'暂不支持的市场: {market}', 'data':{}}
-                error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                return error_response
+                return json_response(error_response_data)
         elif data_source == 'baostock':
+            from core.stock import manager_baostock
             if adjust_type == 'qfq':
                 adjust_type = '2'
             elif adjust_type == 'hfq':
@@ -488,15 +539,11 @@ def acquire_stock_data():
                 adjust_type = '1'
             else:
                 error_response_data = {'success': False, 'message': f'不支持的调整类型: {adjust_type}', 'data':{}}
-                error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                return error_response
+                return json_response(error_response_data)
             if market == 'cn':
                 if not stock_code.startswith('SH') and not stock_code.startswith('SZ'):
                     error_response_data = {'success': False, 'message': f'{market}股票代码请保证前缀SH或SZ: {stock_code}', 'data':{}}
-                    error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                    error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                    return error_response
+                    return json_response(error_response_data)
                 stock_code = stock_code.replace('SH.', 'sh.')
                 stock_code = stock_code.replace('SZ.', 'sz.')
                 success, filename = manager_baostock.get_single_cn_stock_history(
@@ -508,10 +555,9 @@ def acquire_stock_data():
                 )
             else:
                 error_response_data = {'success': False, 'message': f'暂不支持的市场: {market}', 'data':{}}
-                error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                return error_response
+                return json_response(error_response_data)
         elif data_source == 'futu':
+            from core.stock import manager_futu
             if adjust_type == 'qfq':
                 pass
             elif adjust_type == 'hfq':
@@ -520,15 +566,11 @@ def acquire_stock_data():
                 adjust_type = 'None'
             else:
                 error_response_data = {'success': False, 'message': f'不支持的调整类型: {adjust_type}', 'data':{}}
-                error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                return error_response
+                return json_response(error_response_data)
             if market == 'cn':
                 if not stock_code.startswith('SH') and not stock_code.startswith('SZ'):
                     error_response_data = {'success': False, 'message': f'{market}股票代码请保证前缀SH或SZ: {stock_code}', 'data':{}}
-                    error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                    error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                    return error_response
+                    return json_response(error_response_data)
                 success, filename = manager_futu.get_single_cn_stock_history(
                     stock_code=stock_code,
                     start_date=start_date,
@@ -539,9 +581,7 @@ def acquire_stock_data():
             elif market == 'hk':
                 if not stock_code.startswith('HK') :
                     error_response_data = {'success': False, 'message': f'{market}股票代码请保证前缀HK: {stock_code}', 'data':{}}
-                    error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                    error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                    return error_response
+                    return json_response(error_response_data)
                 success, filename = manager_futu.get_single_hk_stock_history(
                     stock_code=stock_code,
                     start_date=start_date,
@@ -551,14 +591,10 @@ def acquire_stock_data():
                 )
             else:
                 error_response_data = {'success': False, 'message': f'暂不支持的市场: {market}', 'data':{}}
-                error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-                error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-                return error_response
+                return json_response(error_response_data)
         else:
             error_response_data = {'success': False, 'message': f'数据源 {data_source} 的数据获取功能尚未实现', 'data':{}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         if success:
             response_data = {
@@ -568,22 +604,16 @@ def acquire_stock_data():
                     'filename': filename
                 }
             }
-            response = make_response(json.dumps(response_data, ensure_ascii=False))
-            response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return response
+            return json_response(response_data)
 
         else:
             error_response_data = {'success': False, 'message': '股票数据获取失败，请检查股票代码是否正确或稍后重试', 'data':{}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
     except Exception as e:
         logger.error(f"获取股票数据时出错: {str(e)}")
         error_response_data = {'success': False, 'message':f'获取数据时发生错误: {str(e)},请检查股票代码是否正确或稍后重试', 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/signal_analysis')
@@ -596,10 +626,11 @@ def signal_analysis():
 @app.route('/get_signal_files')
 @log_request_details
 def get_signal_files():
-    """获取所有信号文件信息"""
+    """获取所有信号文件信息（latest_only=true时只返回每个股票+策略最近一次回测的信号文件）"""
 
     try:
-        signal_files = signal_get()
+        latest_only = request.args.get('latest_only', 'false').lower() in ('1', 'true', 'yes')
+        signal_files = signal_get(latest_only=latest_only)
         signal_files.sort(key=lambda x: x['file_time'], reverse=True)
         response_data = {
             'success': True,
@@ -608,65 +639,38 @@ def get_signal_files():
                 'signal_files': signal_files
             }
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"获取信号文件失败: {str(e)}")
         error_response_data = {'success': False, 'message': str(e), 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/analyze_signals', methods=['POST'])
 @log_request_details
 def analyze_signals():
-    """分析信号文件"""
+    """分析信号文件，支持page/page_size分页"""
 
     try:
         data = request.json
         file_paths = data.get('file_paths', [])
         filters = data.get('filters', {})
-        combined_df = signals_analyze(file_paths, filters)
-        
-        # 计算时间范围
-        date_range = ''
-        if len(combined_df) > 0:
-            min_date = combined_df['date'].min()
-            max_date = combined_df['date'].max()
-            date_range = f"{min_date} 至 {max_date}"
-        
-        # 统计信号类型分布
-        signal_type_counts = combined_df['signal_type'].value_counts().to_dict()
-        
+        # page_size为0时返回全部信号
+        result = signals_query(file_paths, filters,
+                               page=data.get('page', 1),
+                               page_size=data.get('page_size', 0))
+
         response_data = {
             'success': True,
             'message': f'Found signals success',
-            'data': {
-                'signals': combined_df.to_dict('records'),
-                'summary': {
-                    'total_signals': len(combined_df),
-                    'buy_signals': len(combined_df[combined_df['signal_type'].str.contains('buy')]),
-                    'sell_signals': len(combined_df[combined_df['signal_type'].str.contains('sell')]),
-                    'neutral_signals': len(combined_df[combined_df['signal_type'].str.contains('neutral')]),
-                    'unique_stocks': combined_df['stock_info'].nunique(),
-                    'unique_strategies': combined_df['strategy_name'].nunique(),
-                    'date_range': date_range,
-                    'signal_type_counts': signal_type_counts
-                }
-            }
+            'data': result
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
 
     except Exception as e:
         logger.error(f"分析信号失败: {str(e)}")
         error_response_data = {'success': False, 'message': str(e), 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 @app.route('/get_signal_metadata')
 @log_request_details
@@ -675,9 +679,7 @@ def get_signal_metadata():
     try:
         if not os.path.exists(signals_root):
             response_data = {'success': False, 'message': '信号目录不存在', 'data':{}}
-            response = make_response(json.dumps(response_data, ensure_ascii=False))
-            response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return response
+            return json_response(response_data)
 
         strategies = set()
         stock_codes = set()
@@ -718,15 +720,11 @@ def get_signal_metadata():
             }
 
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"获取信号元数据失败: {str(e)}")
         error_response_data = {'success': False, 'message': str(e), 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 # 在现有API端点后添加新的端点
 @app.route('/generate_html_report', methods=['POST'])
 @log_request_details
@@ -740,9 +738,7 @@ def generate_html_report():
 
         if not signals_data:
             response_data = {'success': False, 'message': '没有可生成报告的信号数据', 'data':{}}
-            response = make_response(json.dumps(response_data, ensure_ascii=False))
-            response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return response
+            return json_response(response_data)
 
         # 生成HTML报告
         html_content = signals_to_html(signals_data, filters, summary)
@@ -763,16 +759,12 @@ def generate_html_report():
                 'file_name': file_name,
             }
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
 
     except Exception as e:
         logger.error(f"生成HTML报告失败: {str(e)}")
         error_response_data = {'success': False, 'message': str(e), 'data':{}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 @app.route('/strategy_code')
 @log_request_details
@@ -791,24 +783,18 @@ def get_strategy_code(strategy_name):
         code_info = global_strategy_manager.get_strategy_source_code(strategy_name)
         if not code_info:
             error_response_data = {'success': False, 'message': f'Strategy not found: {strategy_name}', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         response_data = {
             'success': True,
             'message': 'Strategy code retrieved successfully',
             'data': code_info
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"Error getting strategy code: {str(e)}")
         error_response_data = {'success': False, 'message': f'Error getting strategy code: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/get_indicator_code/<indicator_name>')
@@ -819,24 +805,38 @@ def get_indicator_code(indicator_name):
         indicator_info = global_indicator_manager.get_indicator_source_code(indicator_name)
         if not indicator_info:
             error_response_data = {'success': False, 'message': f'Indicator not found: {indicator_name}', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         response_data = {
             'success': True,
             'message': 'Indicator code retrieved successfully',
             'data': indicator_info
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"Error getting indicator code: {str(e)}")
         error_response_data = {'success': False, 'message': f'Error getting indicator code: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
+
+
+@app.route('/api/plugins/stats', methods=['GET'])
+@log_request_details
+def get_plugin_stats():
+    """获取策略/指标插件模块的导入耗时与重新加载情况（refresh=1时先重新读取清单并加载已修改的模块）"""
+    try:
+        if request.args.get('refresh', type=int):
+            global_strategy_manager.refresh()
+            global_indicator_manager.refresh()
+        stats = {
+            'strategy': global_strategy_manager.get_module_stats(),
+            'indicator': global_indicator_manager.get_module_stats(),
+        }
+        response_data = {'success': True, 'message': '获取插件模块统计成功', 'data': stats}
+        return json_response(response_data)
+    except Exception as e:
+        logger.error(f"获取插件模块统计失败: {str(e)}")
+        error_response_data = {'success': False, 'message': f'获取插件模块统计失败: {str(e)}', 'data': {}}
+        return json_response(error_response_data)
 
 
 @app.route('/schedule')
@@ -858,15 +858,11 @@ def get_all_tasks():
             'message': f'获取到 {len(tasks)} 个任务',
             'data': tasks
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"获取任务列表失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'获取任务列表失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/get/<task_id>', methods=['GET'])
@@ -877,24 +873,18 @@ def get_task_by_id(task_id):
         task = task_manager.read(task_id)
         if not task:
             error_response_data = {'success': False, 'message': f'任务不存在: {task_id}', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         response_data = {
             'success': True,
             'message': '获取任务成功',
             'data': task
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"获取任务失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'获取任务失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/create', methods=['POST'])
@@ -905,31 +895,23 @@ def create_task():
         task_data = request.json
         if not task_data:
             error_response_data = {'success': False, 'message': '任务数据不能为空', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         created_task = task_manager.create(task_data)
         if not created_task:
             error_response_data = {'success': False, 'message': '创建任务失败', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         response_data = {
             'success': True,
             'message': '创建任务成功',
             'data': created_task
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"创建任务失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'创建任务失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/update/<task_id>', methods=['POST'])
@@ -940,31 +922,23 @@ def update_task_by_id(task_id):
         request_data = request.json
         if not request_data:
             error_response_data = {'success': False, 'message': '更新数据不能为空', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
         update_data = request_data.get('taskData', request_data)
         updated_task = task_manager.update(task_id, update_data)
         if not updated_task:
             error_response_data = {'success': False, 'message': f'更新任务失败: 任务不存在', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         response_data = {
             'success': True,
             'message': '更新任务成功',
             'data': updated_task
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"更新任务失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'更新任务失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/delete/<task_id>', methods=['POST'])
@@ -975,24 +949,18 @@ def delete_task_by_id(task_id):
         success = task_manager.delete(task_id)
         if not success:
             error_response_data = {'success': False, 'message': f'删除任务失败: 任务不存在', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         response_data = {
             'success': True,
             'message': '删除任务成功',
             'data': {}
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"删除任务失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'删除任务失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/query', methods=['POST'])
@@ -1008,15 +976,11 @@ def query_tasks():
             'message': f'查询到 {len(tasks)} 个符合条件的任务',
             'data': tasks
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"查询任务失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'查询任务失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/enable/<task_id>', methods=['POST'])
@@ -1027,24 +991,18 @@ def enable_task(task_id):
         enabled_task = task_manager.enable(task_id)
         if not enabled_task:
             error_response_data = {'success': False, 'message': f'启用任务失败: 任务不存在', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         response_data = {
             'success': True,
             'message': '启用任务成功',
             'data': enabled_task
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"启用任务失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'启用任务失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/disable/<task_id>', methods=['POST'])
@@ -1055,24 +1013,18 @@ def disable_task(task_id):
         disabled_task = task_manager.disable(task_id)
         if not disabled_task:
             error_response_data = {'success': False, 'message': f'禁用任务失败: 任务不存在', 'data': {}}
-            error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-            error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-            return error_response
+            return json_response(error_response_data)
 
         response_data = {
             'success': True,
             'message': '禁用任务成功',
             'data': disabled_task
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"禁用任务失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'禁用任务失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/count', methods=['GET'])
@@ -1086,15 +1038,11 @@ def get_task_count():
             'message': '获取任务数量成功',
             'data': {'count': count}
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"获取任务数量失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'获取任务数量失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/tasks/exists/<task_id>', methods=['GET'])
@@ -1108,15 +1056,11 @@ def check_task_exists(task_id):
             'message': '检查任务存在状态成功',
             'data': {'exists': exists}
         }
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"检查任务存在状态失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'检查任务存在状态失败: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/executions/get_all', methods=['GET'])
@@ -1127,15 +1071,11 @@ def get_all_executions():
         limit = request.args.get('limit', 100, type=int)
         executions = task_execution_manager.read_all(limit=limit)
         response_data = {'success': True, 'message': '获取执行记录成功', 'data': executions}
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"获取执行记录失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'获取执行记录失败: {str(e)}', 'data': []}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/executions/get/<execution_id>', methods=['GET'])
@@ -1148,15 +1088,11 @@ def get_execution(execution_id):
             response_data = {'success': True, 'message': '获取执行记录成功', 'data': execution}
         else:
             response_data = {'success': False, 'message': '执行记录不存在', 'data': None}
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"获取执行记录失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'获取执行记录失败: {str(e)}', 'data': None}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/api/executions/by_task/<task_id>', methods=['GET'])
@@ -1167,15 +1103,27 @@ def get_executions_by_task(task_id):
         limit = request.args.get('limit', 50, type=int)
         executions = task_execution_manager.read_by_task(task_id, limit=limit)
         response_data = {'success': True, 'message': '获取执行记录成功', 'data': executions}
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"获取执行记录失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'获取执行记录失败: {str(e)}', 'data': []}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
+
+
+@app.route('/api/executions/stats', methods=['GET'])
+@log_request_details
+def get_execution_stats():
+    """获取最近若干次执行中各阶段的耗时百分位统计（可按task_id过滤）"""
+    try:
+        task_id = request.args.get('task_id') or None
+        runs = request.args.get('runs', 20, type=int)
+        stats = task_execution_manager.stage_stats(task_id=task_id, runs=runs)
+        response_data = {'success': True, 'message': '获取阶段耗时统计成功', 'data': stats}
+        return json_response(response_data)
+    except Exception as e:
+        logger.error(f"获取阶段耗时统计失败: {str(e)}")
+        error_response_data = {'success': False, 'message': f'获取阶段耗时统计失败: {str(e)}', 'data': {}}
+        return json_response(error_response_data)
 
 
 @app.route('/api/executions/delete/<execution_id>', methods=['POST'])
@@ -1188,15 +1136,11 @@ def delete_execution(execution_id):
             response_data = {'success': True, 'message': '删除执行记录成功'}
         else:
             response_data = {'success': False, 'message': '删除执行记录失败'}
-        response = make_response(json.dumps(response_data, ensure_ascii=False))
-        response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return response
+        return json_response(response_data)
     except Exception as e:
         logger.error(f"删除执行记录失败: {str(e)}")
         error_response_data = {'success': False, 'message': f'删除执行记录失败: {str(e)}'}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
 
 
 @app.route('/chat')
@@ -1219,9 +1163,7 @@ def chat():
     prompt = data.get('prompt', '')
     if not prompt:
         error_response_data = {'success': False, 'message': f'请输入内容: {str(e)}', 'data': {}}
-        error_response = make_response(json.dumps(error_response_data, ensure_ascii=False))
-        error_response.headers['Content-Type'] = 'application/json; charset=utf-8'
-        return error_response
+        return json_response(error_response_data)
     logger.info(f'ai model is {model}')
     ai_manager = AIManager(model)
     result = ai_manager.get_response(prompt)
@@ -1233,27 +1175,24 @@ def chat():
         'message': f'Success',
         'data': {'response': result}
     }
-    response = make_response(json.dumps(response_data, ensure_ascii=False))
-    response.headers['Content-Type'] = 'application/json; charset=utf-8'
-    return response
+    return json_response(response_data)
 
 
 if __name__ == '__main__':
-    # 在开发环境中运行，生产环境应使用WSGI服务器
+    # 开发模式：Flask调试服务器，并在子进程中启动调度服务（定时任务调度器 + 回测工作进程）
+    # 生产环境请使用 ./start.sh web 与 ./start.sh scheduler 分别启动WSGI服务和调度服务
     try:
-        # 在Flask debug模式下，避免在子进程中重复启动任务调度器
-        import os
-        # 检查是否为主进程（Flask会设置WERKZEUG_RUN_MAIN环境变量标识子进程）
+        # 检查是否为主进程（Flask会设置WERKZEUG_RUN_MAIN环境变量标识子进程），避免重载时重复启动
         if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
-            # 创建进程启动schedule_tasks
-            task_process = multiprocessing.Process(target=schedule_tasks)
-            task_process.daemon = True  # 设置为守护进程，主进程结束时自动终止
-            task_process.start()
-            logger.info("启动任务定时器")
+            # 调度服务持有单实例锁，已有独立调度服务运行时只启动回测工作进程
+            service_process = multiprocessing.Process(target=run_scheduler_service)
+            service_process.daemon = False
+            service_process.start()
+            logger.info("启动调度服务")
         else:
-            logger.info("在Flask子进程中，不启动任务定时器")
+            logger.info("在Flask子进程中，不启动调度服务")
     except KeyboardInterrupt:
-        logger.info("用户中断，停止任务定时器")
+        logger.info("用户中断，停止调度服务")
     except Exception as e:
-        logger.error(f"任务定时器异常: {str(e)}")
+        logger.error(f"调度服务异常: {str(e)}")
     app.run(debug=True, host='0.0.0.0', port=5000)
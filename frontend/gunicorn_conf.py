@@ -0,0 +1,22 @@
+"""
+gunicorn配置，参数取自settings.py，可通过同名环境变量覆盖（如 WEB_WORKERS=8）
+"""
+import os
+import sys
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import settings  # noqa: E402
+
+bind = os.environ.get('WEB_BIND', settings.WEB_BIND)
+workers = int(os.environ.get('WEB_WORKERS', settings.WEB_WORKERS))
+# 线程工作模式：SSE进度推送等长连接只占用一个线程，不阻塞整个进程
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', settings.WEB_THREADS))
+timeout = 120
+graceful_timeout = 30
+chdir = project_root
+accesslog = '-'
+errorlog = '-'
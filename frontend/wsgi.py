@@ -0,0 +1,17 @@
+"""
+WSGI入口，供生产环境的WSGI服务器加载：
+
+    gunicorn -c frontend/gunicorn_conf.py frontend.wsgi:app
+
+Web进程只处理HTTP请求，定时任务调度器与回测工作进程由 core/task/scheduler_service.py 单独运行。
+"""
+import os
+import sys
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from frontend.frontend_app import app  # noqa: E402
+
+application = app
@@ -18,9 +18,118 @@ log_root = project_root / 'log'
 html_root = project_root / 'html'
 result_root = project_root / 'result'
 signals_root = project_root / 'signals'
+signal_index_db = signals_root / 'signal_index.db'
+backtest_job_db = result_root / 'backtest_jobs.db'
+result_catalog_db = result_root / 'result_catalog.db'
+scheduler_lock_file = result_root / 'scheduler.lock'
+metrics_dir = result_root / 'metrics'
+task_artifact_root = result_root / 'task_artifacts'
+pdf_cache_root = result_root / 'pdf_cache'
+# 回测运行数据（交易记录、资产曲线、元数据），目录结构与html_root下的报告相同
+run_data_root = result_root / 'runs'
+notify_outbox_db = result_root / 'notify_outbox.db'
+# 策略/指标插件清单缓存（按模块文件修改时间失效）
+plugin_manifest_dir = result_root / 'plugin_manifest'
+# Flask密钥文件（未设置环境变量QUANT_SECRET_KEY时首次启动生成，已在.gitignore中忽略，不要提交）
+secret_key_file = data_root / 'secret_key'
+config_root = project_root / 'config'
+task_db = config_root / 'tasks.db'
+kline_fetch_db = stock_data_root / 'kline_fetch.db'
+# 旧版JSON任务配置/执行记录，首次使用task_db时自动迁移
+scheduled_tasks_file = config_root / 'scheduled_tasks.json'
+task_executions_file = config_root / 'task_executions.json'
 # chart_show_switch = False
 
 
+# 信号文件保留策略：每个（数据源, 股票, 策略）保留最近N次回测的信号文件，更早的文件由压缩任务清理
+SIGNAL_RETENTION_RUNS = 3
+
+
+# 定时任务执行记录保留天数，更早的记录由每日清理任务删除
+TASK_EXECUTION_RETENTION_DAYS = 90
+# 定时任务流水线：K线获取线程数（网络I/O）与回测进程数（CPU，1表示在调度进程内顺序回测）
+TASK_FETCH_WORKERS = 8
+TASK_BACKTEST_WORKERS = 4
+# 回测、PDF渲染进程池的启动方式（forkserver/spawn，不使用fork：调度进程是多线程的，fork可能复制被其他线程持有的锁）
+PROCESS_POOL_START_METHOD = 'forkserver'
+# 各数据源同时获取K线的最大数量（baostock为全局会话，只能串行）
+TASK_FETCH_SOURCE_LIMITS = {'baostock': 1, 'futu': 2}
+# 定时任务阶段失败时的重试次数与退避基数（秒，每次重试翻倍）
+TASK_STAGE_RETRIES = 2
+TASK_STAGE_BACKOFF = 5
+# 各市场收盘时间（本地时间，美股为次日凌晨），定时任务在收盘后获取过的K线在下一次收盘前直接复用
+MARKET_CLOSE_TIMES = {'HK': '16:10', 'CN': '15:05', 'US': '05:00'}
+
+
+# PDF报告渲染：后台渲染进程数（0表示在调用线程内渲染）、按HTML内容缓存的PDF数量上限
+PDF_RENDER_WORKERS = 1
+PDF_CACHE_MAX_FILES = 200
+# 等待PDF渲染完成的最长时间（秒），超时视为渲染失败（渲染进程卡住时不会一直阻塞任务线程）
+PDF_RENDER_TIMEOUT = 300
+# PDF中单个表格最多保留的行数（超出部分只在页面中查看），以及超长表格每段的行数
+PDF_TABLE_MAX_ROWS = 2000
+PDF_TABLE_PAGE_ROWS = 200
+
+
+# 企业微信通知发送队列：webhook频率限制（条/分钟）、批量合并等待时间（秒）与每批最多合并的消息数
+NOTIFY_RATE_LIMIT = 20
+NOTIFY_BATCH_WINDOW = 3
+NOTIFY_BATCH_MAX = 10
+# 通知发送失败时的最多尝试次数与退避基数（秒，每次重试翻倍）
+NOTIFY_MAX_ATTEMPTS = 6
+NOTIFY_RETRY_BACKOFF = 5
+
+
+# 策略/指标插件热加载：检查已加载插件模块文件修改的间隔（秒，0表示不热加载，修改插件后需重启进程）
+PLUGIN_RELOAD_INTERVAL = 2
+# 参与热加载依赖分析的模块路径前缀
+PLUGIN_RELOAD_PACKAGE = 'core.strategy.'
+# 不热加载的模块：定义插件基类的模块（重新执行会产生新的基类，已加载的插件类不再是其子类），修改后需重启进程；
+# 各插件清单跳过的模块（skip_modules）与插件基类所在模块也会自动加入
+PLUGIN_RELOAD_EXCLUDE = ('core.strategy.trading.common', 'core.strategy.indicator.common')
+
+
+# 回测结果缓存：输入（K线数据、策略及回测代码、参数、初始资金）未变化时复用上次结果；
+# 按最近使用时间淘汰，条目数或报告与运行数据总大小（MB）超过上限时删除最久未使用的缓存登记（报告与运行数据保留）
+BACKTEST_CACHE_ENABLED = True
+BACKTEST_CACHE_MAX_ENTRIES = 2000
+BACKTEST_CACHE_MAX_MB = 2048
+
+
+# 回测任务队列：后台回测工作进程数量
+BACKTEST_WORKERS = 2
+# 回测性能分析：开启后每次回测使用cProfile分析，结果保存在报告旁（也可在提交回测时单独开启）
+BACKTEST_PROFILE = False
+
+
+# 低内存回测模式：数据源按块读取K线CSV（每块BACKTEST_STREAM_CHUNK_ROWS行），cerebro使用exactbars且逐根K线计算指标（runonce=False），
+# 回测过程的内存基本与K线数量无关，速度略慢；K线CSV超过BACKTEST_LOW_MEMORY_MIN_MB时自动开启（0表示不自动开启），
+# 也可在提交回测时单独开启。回测结束后生成报告时仍会读取整个CSV
+BACKTEST_LOW_MEMORY = False
+BACKTEST_LOW_MEMORY_MIN_MB = 100
+BACKTEST_STREAM_CHUNK_ROWS = 20000
+# backtrader的exactbars：1表示数据、指标与观察器都只保留计算所需的最少K线
+BACKTEST_EXACTBARS = 1
+
+
+# 日志级别：按模块（create_log的名称）配置，未列出的模块使用default
+LOG_LEVELS = {
+    'default': 'INFO',
+}
+# 回测循环中的高频日志模块（静默回测模式下只采样输出）
+LOG_HOT_LOGGERS = ('trade_strategy_common', 'trade_strategy_volume', 'commission', 'visual_tools_plotly')
+# 静默回测模式：高频日志每N条输出1条，其余只计数并在结束时汇总
+LOG_QUIET_SAMPLE_EVERY = 100
+# 批量回测（任务队列、多文件回测、定时任务）默认使用静默回测模式
+LOG_QUIET_BATCH = True
+
+
+# 生产部署（gunicorn）：监听地址、工作进程数、每个进程的线程数（SSE进度推送会占用线程）
+WEB_BIND = '0.0.0.0:5000'
+WEB_WORKERS = 4
+WEB_THREADS = 8
+
+
 # 交易策略相关参数
 MIN_ORDER_SIZE = 100    # 交易股票最小单位（股）
 MAX_PORTFOLIO_PERCENT = 0.8 # 最大持仓比例 = 总持仓股票数量 * 持仓股票价格 / 总资产
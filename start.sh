@@ -1,8 +1,32 @@
 #!/bin/sh
+# 用法: ./start.sh [dev|web|scheduler|worker]
+#   dev        开发模式（默认）：Flask调试服务器 + 调度服务
+#   web        生产模式Web服务：gunicorn多进程，不运行定时任务
+#   scheduler  调度服务：定时任务调度器（单实例）+ 回测工作进程
+#   worker     仅回测工作进程，可在多台机器/多个进程上扩展
 
 SCRIPT_DIR=$(dirname "$0")
 cd "$SCRIPT_DIR"
+ROLE=${1:-dev}
 python3.13 -m venv venv13
-source venv13/bin/activate
+. venv13/bin/activate
 pip install -r requirements-13.txt
-python frontend/frontend_app.py
\ No newline at end of file
+
+case "$ROLE" in
+    dev)
+        python frontend/frontend_app.py
+        ;;
+    web)
+        exec gunicorn -c frontend/gunicorn_conf.py frontend.wsgi:app
+        ;;
+    scheduler)
+        exec python -m core.task.scheduler_service --role all
+        ;;
+    worker)
+        exec python -m core.task.scheduler_service --role worker
+        ;;
+    *)
+        echo "未知角色: $ROLE（可选: dev, web, scheduler, worker）"
+        exit 1
+        ;;
+esac
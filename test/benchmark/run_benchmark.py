@@ -0,0 +1,397 @@
+"""
+基准测试：回测吞吐量（K线/秒）、报告生成耗时、信号分析耗时与峰值内存、信号/交易记录开销、
+低内存回测模式与默认模式的峰值内存对比、启动（导入）耗时
+
+所有数据由 synthetic_data 确定性生成，不依赖外部行情。结果写入JSON，可保存为基准并做回归检查。
+
+用法（在项目根目录下）：
+    python -m test.benchmark.run_benchmark                          # quick预设，结果输出到控制台与 result/benchmark/latest.json
+    python -m test.benchmark.run_benchmark --preset standard --save-baseline
+    python -m test.benchmark.run_benchmark --check --threshold 0.2  # 与基准比较，退化超过20%时退出码为1
+    python -m test.benchmark.run_benchmark --sizes 1000000x1 1000x5000 --skip report signals startup
+    python -m test.benchmark.run_benchmark --low-memory-bars 1000000 --skip backtest report signals records startup
+
+指标命名约定：*_per_sec 越大越好；*_seconds、*_mb 越小越好。
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import settings  # noqa: E402
+from test.benchmark.synthetic_data import generate_ohlcv, write_signal_files  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_OUTPUT = os.path.join(settings.result_root, 'benchmark', 'latest.json')
+
+# 预设：backtest_sizes为（每只股票K线数, 股票数）
+PRESETS = {
+    'quick': {
+        'backtest_sizes': [(1000, 1), (1000, 10)],
+        'report_bars': 1000,
+        'signal_files': 50,
+        'record_count': 100000,
+        'low_memory_bars': 20000,
+        'startup_repeat': 3,
+    },
+    'standard': {
+        'backtest_sizes': [(1000, 1), (10000, 1), (100000, 1), (1000, 100)],
+        'report_bars': 10000,
+        'signal_files': 500,
+        'record_count': 1000000,
+        'low_memory_bars': 200000,
+        'startup_repeat': 5,
+    },
+    'full': {
+        'backtest_sizes': [(1000, 1), (10000, 1), (100000, 1), (1000000, 1), (1000, 1000), (1000, 5000)],
+        'report_bars': 50000,
+        'signal_files': 5000,
+        'record_count': 5000000,
+        'low_memory_bars': 1000000,
+        'startup_repeat': 5,
+    },
+}
+STRATEGIES = ('EnhancedVolumeStrategy', 'SingleVolumeStrategy')
+
+
+def _get_strategy(name):
+    from core.strategy.strategy_manager import global_strategy_manager
+    strategy_class = global_strategy_manager.get_strategy(name)
+    if strategy_class is None:
+        raise ValueError(f"未找到策略: {name}")
+    return strategy_class
+
+
+def _measure(func, memory):
+    """
+    执行func并计时；memory为True时再单独执行一次测量峰值内存（tracemalloc会拖慢执行，不与计时混在一起）
+
+    返回:
+        (耗时秒数, 峰值内存MB或None, func返回值)
+    """
+    gc.collect()
+    start = time.perf_counter()
+    value = func()
+    elapsed = time.perf_counter() - start
+    peak_mb = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        func()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return elapsed, peak_mb, value
+
+
+def bench_backtest(strategy_name, bars, symbols, memory):
+    """回测吞吐量：symbols只股票、每只bars根K线依次回测（数据预先生成，不计入耗时）"""
+    from core.quant.quant_manage import build_cerebro, dataframe_to_feed
+    strategy_class = _get_strategy(strategy_name)
+    frames = [generate_ohlcv(bars, seed=i) for i in range(symbols)]
+
+    def run():
+        for df in frames:
+            cerebro = build_cerebro(dataframe_to_feed(df), strategy_class, settings.INIT_CASH)
+            cerebro.run()
+
+    elapsed, peak_mb, _ = _measure(run, memory)
+    result = {
+        'bars_per_sec': round(bars * symbols / elapsed, 1),
+        'elapsed_seconds': round(elapsed, 4),
+    }
+    if peak_mb is not None:
+        result['peak_memory_mb'] = round(peak_mb, 2)
+    return result
+
+
+def bench_report(bars, memory):
+    """报告生成：calculate_holdings 与 create_trading_chart 耗时（基于一次真实回测的交易/信号记录）"""
+    from core.quant.quant_manage import build_cerebro, dataframe_to_feed
+    from core.visualization.visual_tools_plotly import prepare_continuous_dates, filter_valid_dates, \
+        calculate_holdings, create_trading_chart
+
+    df = generate_ohlcv(bars, seed=0)
+    cerebro = build_cerebro(dataframe_to_feed(df), _get_strategy('EnhancedVolumeStrategy'), settings.INIT_CASH)
+    strategy = cerebro.run()[0]
+    signals_df = strategy.indicator.signal_record_manager.transform_to_dataframe()
+    trades_df = strategy.trade_record_manager.transform_to_dataframe()
+    df_continuous = prepare_continuous_dates(df)
+    valid_signals = filter_valid_dates(df, signals_df)
+    valid_trades = filter_valid_dates(df, trades_df)
+
+    holdings_seconds, holdings_peak, holdings_data = _measure(
+        lambda: calculate_holdings(df_continuous, valid_trades, settings.INIT_CASH), memory)
+    chart_seconds, chart_peak, _ = _measure(
+        lambda: create_trading_chart('BENCH', df_continuous, valid_signals, valid_trades, holdings_data,
+                                     settings.INIT_CASH), memory)
+    result = {
+        'trades': int(len(valid_trades)),
+        'calculate_holdings_seconds': round(holdings_seconds, 4),
+        'create_trading_chart_seconds': round(chart_seconds, 4),
+    }
+    if memory:
+        result['calculate_holdings_peak_memory_mb'] = round(holdings_peak, 2)
+        result['create_trading_chart_peak_memory_mb'] = round(chart_peak, 2)
+    return result
+
+
+def bench_signals(files, memory):
+    """信号分析：对files个信号文件执行signals_query（过滤、汇总、分页）"""
+    from core.signal.signal_handler import signals_query
+    with tempfile.TemporaryDirectory(prefix='bench_signals_') as root:
+        paths = write_signal_files(root, files)
+        filters = {'signal_type': 'normal_buy', 'start_date': '2016-01-01'}
+        elapsed, peak_mb, result = _measure(lambda: signals_query(paths, filters, page=1, page_size=100, root=root),
+                                            memory)
+    data = {
+        'signals': result['total'],
+        'signals_query_seconds': round(elapsed, 4),
+        'files_per_sec': round(files / elapsed, 1),
+    }
+    if peak_mb is not None:
+        data['peak_memory_mb'] = round(peak_mb, 2)
+    return data
+
+
+def bench_records(count, memory):
+    """信号/交易记录：追加count条信号记录和count条交易记录并转换为DataFrame（回测中信号密集时的记录开销）"""
+    import datetime as dt
+    from core.strategy.indicator.common import SignalRecordManager
+    from core.strategy.trading.common import TradeRecordManager
+    dates = [dt.date(2000, 1, 1) + dt.timedelta(days=i % 10000) for i in range(count)]
+
+    def append():
+        signals, trades = SignalRecordManager(), TradeRecordManager()
+        for i, date in enumerate(dates):
+            signals.add_signal_record(date, 'normal_buy', '多')
+            trades.add_trade_record(i, date, 'B', 10.5, 100, 1050.0, 3.2, 'buy', 4)
+        return signals, trades
+
+    append_seconds, peak_mb, (signals, trades) = _measure(append, memory)
+    convert_seconds, _, _ = _measure(lambda: (signals.transform_to_dataframe(), trades.transform_to_dataframe()),
+                                     False)
+    result = {
+        'records_per_sec': round(count * 2 / append_seconds, 1),
+        'append_seconds': round(append_seconds, 4),
+        'to_dataframe_seconds': round(convert_seconds, 4),
+    }
+    if peak_mb is not None:
+        result['peak_memory_mb'] = round(peak_mb, 2)
+    return result
+
+
+def bench_low_memory(bars, memory):
+    """
+    低内存回测模式：同一个bars根K线的CSV分别用默认模式（整体读入PandasData）和低内存模式（分块读取 + exactbars）回测，
+    对比吞吐量与峰值内存（包含CSV读取，不含报告生成）
+    """
+    from core.quant.quant_manage import build_cerebro, get_data_form_csv, get_data_stream
+    from test.benchmark.synthetic_data import write_symbol_csvs
+    strategy_class = _get_strategy('EnhancedVolumeStrategy')
+    result = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = write_symbol_csvs(tmp, 1, bars)[0]
+        for mode, low_memory in (('default', False), ('low_memory', True)):
+            def run():
+                data = get_data_stream(csv_path) if low_memory else get_data_form_csv(csv_path)
+                build_cerebro(data, strategy_class, settings.INIT_CASH, low_memory=low_memory).run()
+
+            elapsed, peak_mb, _ = _measure(run, memory)
+            result[f'{mode}_bars_per_sec'] = round(bars / elapsed, 1)
+            if peak_mb is not None:
+                result[f'{mode}_peak_memory_mb'] = round(peak_mb, 2)
+    return result
+
+
+def _run_timed(code, importtime=False):
+    """
+    在新的Python进程中执行code（code需打印 "ELAPSED <秒数>"），返回 (秒数, -X importtime输出)
+    每次都是冷启动的解释器，不受当前进程已导入模块的影响
+    """
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', code]
+    env = dict(os.environ, PYTHONPATH=project_root)
+    proc = subprocess.run(command, cwd=project_root, env=env, capture_output=True, text=True, timeout=600)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith('ELAPSED '):
+            return float(line.split()[1]), proc.stderr
+    raise RuntimeError(f"子进程执行失败: {proc.stderr[-2000:]}")
+
+
+def _slowest_imports(importtime_output, top=5):
+    """解析 -X importtime 输出，返回被测模块直接导入的依赖中累计耗时最长的几项 [[模块, 毫秒], ...]"""
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.startswith('   ') and not name.startswith('    '):
+            imports.append([name.strip(), round(int(cumulative) / 1000, 1)])
+    return sorted(imports, key=lambda item: item[1], reverse=True)[:top]
+
+
+def bench_startup(repeat):
+    """启动耗时：冷启动解释器中导入Web应用、定时任务模块，插件清单扫描，以及首次获取策略类的耗时"""
+    from core.strategy.plugin_manifest import PluginManifest
+    result = {}
+    for name, module in (('frontend', 'frontend.frontend_app'), ('task_timer', 'core.task.task_timer')):
+        code = f"import time; start = time.perf_counter(); import {module}; " \
+               f"print('ELAPSED', time.perf_counter() - start)"
+        timings = [_run_timed(code)[0] for _ in range(repeat)]
+        result[f'import_{name}_seconds'] = round(min(timings), 4)
+        result[f'import_{name}_slowest'] = _slowest_imports(_run_timed(code, importtime=True)[1])
+
+    code = "from core.strategy.strategy_manager import global_strategy_manager; import time; " \
+           "start = time.perf_counter(); global_strategy_manager.get_strategy('EnhancedVolumeStrategy'); " \
+           "print('ELAPSED', time.perf_counter() - start)"
+    result['first_strategy_lookup_seconds'] = round(min(_run_timed(code)[0] for _ in range(repeat)), 4)
+
+    with tempfile.TemporaryDirectory(prefix='bench_manifest_') as root:
+        manifest = PluginManifest('strategy', 'core.strategy.trading', ('StrategyBase',),
+                                  manifest_path=os.path.join(root, 'strategy.json'))
+        start = time.perf_counter()
+        manifest.load()
+        result['manifest_cold_seconds'] = round(time.perf_counter() - start, 4)
+        start = time.perf_counter()
+        manifest.load()
+        result['manifest_warm_seconds'] = round(time.perf_counter() - start, 4)
+    return result
+
+
+def run_suite(backtest_sizes, report_bars, signal_files, skip=(), memory=True, startup_repeat=3,
+              record_count=100000, low_memory_bars=20000):
+    results = {}
+    if 'backtest' not in skip:
+        for strategy_name in STRATEGIES:
+            for bars, symbols in backtest_sizes:
+                name = f"backtest.{strategy_name}.{bars}x{symbols}"
+                print(f"运行 {name} ...", flush=True)
+                results[name] = bench_backtest(strategy_name, bars, symbols, memory)
+    if 'report' not in skip:
+        name = f"report.{report_bars}"
+        print(f"运行 {name} ...", flush=True)
+        results[name] = bench_report(report_bars, memory)
+    if 'signals' not in skip:
+        name = f"signals.{signal_files}"
+        print(f"运行 {name} ...", flush=True)
+        results[name] = bench_signals(signal_files, memory)
+    if 'records' not in skip:
+        name = f"records.{record_count}"
+        print(f"运行 {name} ...", flush=True)
+        results[name] = bench_records(record_count, memory)
+    if 'low_memory' not in skip:
+        name = f"low_memory.{low_memory_bars}"
+        print(f"运行 {name} ...", flush=True)
+        results[name] = bench_low_memory(low_memory_bars, memory)
+    if 'startup' not in skip:
+        print("运行 startup ...", flush=True)
+        results['startup'] = bench_startup(startup_repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    与基准比较
+
+    返回:
+        list: 退化项描述，空列表表示无退化
+    """
+    regressions = []
+    for case, metrics in results.items():
+        base_metrics = baseline.get('results', {}).get(case)
+        if not base_metrics:
+            continue
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if not isinstance(base, (int, float)) or not base or value is None:
+                continue
+            if metric.endswith('_per_sec'):
+                change = (base - value) / base
+            elif metric.endswith('_seconds') or metric.endswith('_mb'):
+                change = (value - base) / base
+            else:
+                continue
+            if change > threshold:
+                regressions.append(f"{case} {metric}: 基准 {base} -> 当前 {value}（退化 {change:.1%}）")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='回测/报告/信号分析基准测试')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick')
+    parser.add_argument('--sizes', nargs='+', help='覆盖回测规模，格式为 K线数x股票数，如 100000x1 1000x5000')
+    parser.add_argument('--report-bars', type=int, help='覆盖报告基准的K线数')
+    parser.add_argument('--signal-files', type=int, help='覆盖信号分析基准的文件数')
+    parser.add_argument('--low-memory-bars', type=int, help='覆盖低内存模式基准的K线数')
+    parser.add_argument('--skip', nargs='*', default=[],
+                        choices=['backtest', 'report', 'signals', 'records', 'low_memory', 'startup'])
+    parser.add_argument('--no-memory', action='store_true', help='不测量峰值内存（节省一半运行时间）')
+    parser.add_argument('--with-logging', action='store_true', help='保留策略日志输出（默认关闭，只测量计算本身）')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='结果JSON输出路径')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基准JSON路径')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基准')
+    parser.add_argument('--check', action='store_true', help='与基准比较，存在退化时退出码为1')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许的退化比例，默认0.2（20%%）')
+    args = parser.parse_args()
+
+    if not args.with_logging:
+        logging.disable(logging.INFO)
+
+    preset = PRESETS[args.preset]
+    backtest_sizes = preset['backtest_sizes']
+    if args.sizes:
+        backtest_sizes = [tuple(int(x) for x in size.lower().split('x')) for size in args.sizes]
+    report_bars = args.report_bars or preset['report_bars']
+    signal_files = args.signal_files or preset['signal_files']
+
+    results = run_suite(backtest_sizes, report_bars, signal_files, skip=args.skip, memory=not args.no_memory,
+                        startup_repeat=preset['startup_repeat'], record_count=preset['record_count'],
+                        low_memory_bars=args.low_memory_bars or preset['low_memory_bars'])
+    report = {
+        'meta': {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'preset': args.preset,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+        },
+        'results': results,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基准已保存至: {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"基准文件不存在: {args.baseline}，请先使用 --save-baseline 生成")
+            sys.exit(1)
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("性能退化：")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"未发现超过 {args.threshold:.0%} 的性能退化")
+
+
+if __name__ == '__main__':
+    main()
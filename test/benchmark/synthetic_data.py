@@ -0,0 +1,100 @@
+"""
+确定性的合成行情/信号数据生成器（供基准测试使用）
+
+相同的 (bars, seed) 总是生成完全相同的数据，保证基准结果可复现。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# 超过该K线数量时改用分钟级时间戳（日线时间戳最多只能覆盖到2262年）
+MAX_DAILY_BARS = 80000
+SIGNAL_TYPES = ('normal_buy', 'normal_sell', 'strong_buy', 'strong_sell')
+
+
+def generate_ohlcv(bars, seed=0, market='HK', start='1990-01-01'):
+    """
+    生成一只股票的合成K线（几何随机游走，成交量对数正态分布，偶有放量）
+
+    参数:
+        bars: K线数量
+        seed: 随机种子
+        market: 市场（决定佣金配置）
+        start: 起始日期
+
+    返回:
+        以date为索引的DataFrame，列与数据获取模块保存的CSV一致
+    """
+    rng = np.random.default_rng(seed)
+    if bars <= MAX_DAILY_BARS:
+        dates = pd.bdate_range(start, periods=bars, name='date')
+    else:
+        dates = pd.date_range(start, periods=bars, freq='min', name='date')
+    returns = rng.normal(0.0002, 0.02, bars)
+    close = 100 * np.exp(np.cumsum(returns))
+    open_ = close * (1 + rng.normal(0, 0.005, bars))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, bars)))
+    volume = rng.lognormal(14, 0.5, bars)
+    # 约2%的K线放量，触发量能类信号
+    spikes = rng.random(bars) < 0.02
+    volume[spikes] *= rng.uniform(2, 5, spikes.sum())
+    volume = volume.astype(np.int64)
+    df = pd.DataFrame({
+        'open': open_.round(2),
+        'high': high.round(2),
+        'low': low.round(2),
+        'close': close.round(2),
+        'volume': volume,
+        'amount': (volume * close).round(2),
+        'stock_code': f'HK.{seed:05d}',
+        'stock_name': f'合成{seed}',
+        'market': market,
+    }, index=dates)
+    return df
+
+
+def write_symbol_csvs(output_dir, symbols, bars, seed=0):
+    """
+    生成多只股票的K线CSV，文件名格式与数据获取模块一致：<代码>_<名称>_<开始>_<结束>.csv
+
+    返回:
+        list: CSV文件路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for i in range(symbols):
+        df = generate_ohlcv(bars, seed=seed + i)
+        code, name = df['stock_code'].iloc[0], df['stock_name'].iloc[0]
+        file_name = f"{code}_{name}_{df.index[0]:%Y%m%d}_{df.index[-1]:%Y%m%d}.csv"
+        path = os.path.join(output_dir, file_name)
+        df.to_csv(path, index_label='date')
+        paths.append(path)
+    return paths
+
+
+def write_signal_files(signals_root, files, signals_per_file=200, seed=0, strategy='EnhancedVolumeStrategy'):
+    """
+    生成信号文件，目录结构与回测输出一致：<数据源>/<股票>/<策略>/stock_signals_<时间>.csv
+
+    返回:
+        list: 相对signals_root的信号文件路径
+    """
+    rng = np.random.default_rng(seed)
+    relative_paths = []
+    for i in range(files):
+        stock_info = f"HK.{i:05d}_合成{i}_19900101_20200101"
+        folder = os.path.join(signals_root, 'synthetic', stock_info, strategy)
+        os.makedirs(folder, exist_ok=True)
+        dates = pd.bdate_range('2015-01-01', periods=signals_per_file * 5)
+        picked = np.sort(rng.choice(len(dates), signals_per_file, replace=False))
+        df = pd.DataFrame({
+            'date': dates[picked].strftime('%Y-%m-%d'),
+            'signal_type': rng.choice(SIGNAL_TYPES, signals_per_file),
+            'signal_description': '合成信号',
+        })
+        file_name = f"stock_signals_20200101_{i % 1000000:06d}.csv"
+        df.to_csv(os.path.join(folder, file_name), index=False, encoding='utf-8-sig')
+        relative_paths.append(os.path.join('synthetic', stock_info, strategy, file_name))
+    return relative_paths
@@ -0,0 +1,168 @@
+"""
+本地企业微信webhook模拟服务（测试通知发送队列用，不访问外网）
+
+实现 /cgi-bin/webhook/send 与 /cgi-bin/webhook/upload_media 两个接口，收到的消息保存在内存中，
+可通过 GET /messages 查看；支持模拟频率限制（errcode 45009）和偶发失败（errcode -1）。
+
+用法（在项目根目录下）：
+    python -m test.wechat_webhook_stub --port 18080 --rate-limit 20 --fail-every 5
+    python -m test.wechat_webhook_stub --demo 20 --fail-every 5
+
+--demo 启动模拟服务后向发送队列（临时数据库）提交N个任务报告通知，等待发送完成并输出模拟服务收到的消息数；
+需要连接真实服务测试时，将环境变量WECHAT_WEBHOOK_QUANT设置为模拟服务的webhook地址。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+
+class StubWebhookServer:
+    """
+    用法:
+        server = StubWebhookServer(rate_limit=20).start()
+        os.environ['WECHAT_WEBHOOK_QUANT'] = server.webhook_url
+        ...
+        server.messages  # 收到的消息列表
+        server.stop()
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, rate_limit=20, fail_every=0):
+        self.rate_limit = rate_limit
+        self.fail_every = fail_every
+        self.messages = []
+        self.uploads = []
+        self.requests = 0
+        self._sent_times = deque()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def webhook_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/cgi-bin/webhook/send?key=test"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _check(self):
+        """返回错误结果或None（按请求顺序模拟偶发失败与频率限制）"""
+        with self._lock:
+            self.requests += 1
+            if self.fail_every and self.requests % self.fail_every == 0:
+                return {'errcode': -1, 'errmsg': 'system busy'}
+            now = time.time()
+            while self._sent_times and self._sent_times[0] <= now - 60:
+                self._sent_times.popleft()
+            if self.rate_limit and len(self._sent_times) >= self.rate_limit:
+                return {'errcode': 45009, 'errmsg': 'api freq out of limit'}
+            self._sent_times.append(now)
+        return None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, result):
+                body = json.dumps(result).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if urlsplit(self.path).path == '/messages':
+                    with stub._lock:
+                        self._reply({'messages': list(stub.messages), 'uploads': len(stub.uploads)})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                parts = urlsplit(self.path)
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if not parse_qs(parts.query).get('key'):
+                    self._reply({'errcode': 93000, 'errmsg': 'invalid webhook url'})
+                elif parts.path.endswith('/upload_media'):
+                    with stub._lock:
+                        stub.uploads.append(len(body))
+                        media_id = f"media_{len(stub.uploads)}"
+                    self._reply({'errcode': 0, 'errmsg': 'ok', 'type': 'file', 'media_id': media_id})
+                elif parts.path.endswith('/send'):
+                    error = stub._check()
+                    if error:
+                        self._reply(error)
+                        return
+                    with stub._lock:
+                        stub.messages.append(json.loads(body))
+                    self._reply({'errcode': 0, 'errmsg': 'ok'})
+                else:
+                    self.send_error(404)
+
+        return Handler
+
+
+def run_demo(server, count):
+    import tempfile
+    import settings
+    settings.NOTIFY_RETRY_BACKOFF = 0.5
+    folder = tempfile.mkdtemp()
+    from core.notification.notify_dispatcher import NotifyDispatcher
+    from core.notification.wechat_notifier import WechatNotifier
+
+    notifier = WechatNotifier()
+    notifier.webhook_url = server.webhook_url
+    dispatcher = NotifyDispatcher(notifier=notifier, db_path=os.path.join(folder, 'notify_outbox.db'))
+    pdf_path = os.path.join(folder, 'report.pdf')
+    with open(pdf_path, 'wb') as f:
+        f.write(b'%PDF-stub')
+    start = time.time()
+    ids = []
+    for i in range(count):
+        ids += dispatcher.send_pdf_report(pdf_path, title=f"定时任务{i}信号详情", description=f"任务{i}")
+    success = dispatcher.wait(ids, timeout=120)
+    kinds = [message.get('msgtype') for message in server.messages]
+    print(f"入队 {len(ids)} 条消息，全部发送成功: {success}，耗时 {time.time() - start:.1f} 秒")
+    print(f"模拟服务收到 {len(kinds)} 条消息（markdown {kinds.count('markdown')}，file {kinds.count('file')}），"
+          f"请求 {server.requests} 次")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地企业微信webhook模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--rate-limit', type=int, default=20, help='每分钟允许的消息数，0表示不限制')
+    parser.add_argument('--fail-every', type=int, default=0, help='每N次发送请求返回一次失败，0表示不失败')
+    parser.add_argument('--demo', type=int, nargs='?', const=20, default=None,
+                        help='启动后提交N个任务报告通知（默认20）并等待发送完成')
+    args = parser.parse_args()
+    stub_server = StubWebhookServer(args.host, args.port, args.rate_limit, args.fail_every).start()
+    print(f"webhook模拟服务已启动: {stub_server.webhook_url}")
+    if args.demo is not None:
+        run_demo(stub_server, args.demo)
+        stub_server.stop()
+    else:
+        try:
+            while True:
+                time.sleep(60)
+        except KeyboardInterrupt:
+            stub_server.stop()